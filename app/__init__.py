@@ -1,26 +1,54 @@
+import time
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from config import Config
+from app.engine import RoutingSession, configure_engines, init_engines
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 def create_app(config_class=Config):
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(config_class)
-    CORS(app, origins=['http://localhost:5173', 'http://127.0.0.1:5173'], supports_credentials=True)
+    CORS(app, origins=['http://localhost:5173', 'http://127.0.0.1:5173'], supports_credentials=True,
+         expose_headers=['X-Next-Cursor', 'X-Identity-Cache', 'ETag', 'Retry-After', 'Idempotent-Replayed'])
+    configure_engines(app)
     db.init_app(app)
+    init_engines(app)
 
-    from app.routes import auth_bp, flights_bp, bookings_bp, admin_bp
+    from app.admission import init_admission
+    from app.booking_pipeline import init_booking_pipeline
+    from app.cache import init_response_cache
+    from app.fare_calendar import init_fare_calendar
+    from app.hashing import init_hashing
+    from app.idempotency import init_idempotency
+    from app.metrics import init_metrics
+    from app.utils import init_identity_cache
+    init_metrics(app)
+    init_hashing(app)
+    init_identity_cache(app)
+    init_response_cache(app)
+    init_booking_pipeline(app)
+    init_fare_calendar(app)
+    init_idempotency(app)
+    init_admission(app)
+
+    from app.routes import auth_bp, flights_bp, bookings_bp, admin_bp, health_bp
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(flights_bp, url_prefix='/api/flights')
     app.register_blueprint(bookings_bp, url_prefix='/api/bookings')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(health_bp)
 
-    with app.app_context():
-        db.create_all()
-        from app.seed import seed_database
-        seed_database()
+    from app.cli import register_cli
+    register_cli(app)
 
+    # Schema and seed data are explicit CLI steps (flask init-db / seed); startup only pings the DB
+    with app.app_context():
+        db.session.execute(db.text('SELECT 1'))
+        db.session.remove()
+    app.extensions['startup_seconds'] = time.perf_counter() - started
+    app.logger.info('create_app finished in %.3fs', app.extensions['startup_seconds'])
     return app
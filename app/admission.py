@@ -0,0 +1,235 @@
+"""
+Admission control: per-endpoint concurrency limits and rate limits on auth routes.
+
+Every worker thread can be tied up by a few kinds of request: bcrypt in login and
+register, and full-table admin listings. A burst of any one of them would otherwise
+queue every other request behind it. ADMISSION_LIMITS gives such endpoints a
+concurrency cap and a queue depth, e.g.
+
+    auth.login=2:1,admin.list_users=1:2,bookings.list_bookings[admin]=1:2
+
+With `name[role]` the limit only applies to callers whose token carries that role.
+A request over the cap waits for a slot for up to ADMISSION_QUEUE_TIMEOUT_MS if the
+queue has room. When the queue is full or the wait times out, it is shed at once with
+503 and Retry-After. A waiting request still holds a server thread, so queues should
+stay short: the point is to fail fast, not to buffer.
+
+Auth routes also take a token from two buckets per route: one keyed by client IP
+(AUTH_RATE_PER_IP) and one by account, i.e. the username in the request or the token's
+user (AUTH_RATE_PER_ACCOUNT). Rates look like "60/60": a burst of 60, refilled at 60
+per 60 seconds. An empty bucket answers 429 with Retry-After set to the time until the
+next token. /healthz, /readyz and /metrics are never limited.
+
+When ADMISSION_LIMITS is unset, default_limits() sizes the caps from WEB_THREADS and
+the bcrypt pool (HASH_WORKERS). A capped endpoint may run and queue on all server
+threads but one, so a flood of it is shed only once it would take the last thread
+that search needs. Logins up to the pool size run at once and the rest wait their turn.
+
+Shed counts, queue time and slot usage are exported at /metrics.
+
+The caps and buckets live in each worker process and are not shared. With
+WEB_CONCURRENCY workers, a host admits up to that many times each cap, and a client
+gets that many rate-limit buckets. That is fine for the caps, which protect a
+worker's own threads, but divide a per-host rate among the workers when setting it.
+
+It is off unless ADMISSION_CONTROL=1.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import g, jsonify, request
+from app import hashing
+from app.utils import token_claims
+
+EXEMPT = frozenset({'health.healthz', 'health.readyz', 'metrics'})
+RATE_LIMITED = frozenset({'auth.login', 'auth.register', 'auth.forgot_password_questions',
+                          'auth.forgot_password', 'auth.change_password'})
+BCRYPT_ENDPOINTS = ('auth.login', 'auth.register', 'auth.forgot_password', 'auth.change_password')
+LISTING_ENDPOINTS = ('admin.list_users', 'bookings.list_bookings[admin]')
+MAX_BUCKETS = 100000  # keys kept per token-bucket table; least recently used go first
+
+
+class ConcurrencyLimit:
+    """At most `limit` requests at a time, with up to `queue` more waiting for a slot."""
+
+    def __init__(self, name, limit, queue):
+        self.name, self.limit, self.queue = name, limit, queue
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout):
+        """(True, seconds waited) once a slot is held, or (False, 'queue_full' / 'queue_timeout')."""
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return True, 0.0
+            if self.waiting >= self.queue:
+                return False, 'queue_full'
+            self.waiting += 1
+            start = time.monotonic()
+            deadline = start + timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False, 'queue_timeout'
+                    self._cond.wait(remaining)
+                self.active += 1
+                return True, time.monotonic() - start
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class TokenBuckets:
+    """Token buckets keyed by client: `burst` tokens, refilled at `rate` per second."""
+
+    def __init__(self, burst, rate):
+        self.burst, self.rate = burst, rate
+        self._data = OrderedDict()  # key -> (tokens, monotonic time of last update)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """0 if a token was taken, else the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._data.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._data[key] = (tokens, now)
+            self._data.move_to_end(key)
+            while len(self._data) > MAX_BUCKETS:
+                self._data.popitem(last=False)
+            return wait
+
+
+def parse_limits(spec):
+    """{'endpoint' or 'endpoint[role]': ConcurrencyLimit} from 'name=limit:queue,...'. Raises ValueError."""
+    limits = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, _, value = item.partition('=')
+        limit, _, queue = value.partition(':')
+        try:
+            limits[name.strip()] = ConcurrencyLimit(name.strip(), int(limit), int(queue or 0))
+        except ValueError:
+            raise ValueError(f'ADMISSION_LIMITS: expected name=limit:queue, got {item.strip()!r}')
+    return limits
+
+
+def default_limits(config):
+    """
+    The ADMISSION_LIMITS spec used when none is configured: each capped endpoint gets all
+    threads but one (WEB_THREADS - 1) between running and queued. bcrypt endpoints run up
+    to the hashing pool's size at once, full listings half the threads.
+    """
+    spare = max(1, config.get('WEB_THREADS', 4) - 1)
+    workers = hashing.pool_size(config.get('HASH_WORKERS'))
+    bcrypt = min(spare, workers) if workers else spare  # inline hashing runs on the request threads
+    listing = max(1, spare // 2)
+    return ','.join([f'{name}={bcrypt}:{spare - bcrypt}' for name in BCRYPT_ENDPOINTS] +
+                    [f'{name}={listing}:{spare - listing}' for name in LISTING_ENDPOINTS])
+
+
+def parse_rate(spec):
+    """TokenBuckets from 'count/seconds', or None when `spec` is empty. Raises ValueError."""
+    if not spec:
+        return None
+    count, _, seconds = spec.partition('/')
+    try:
+        count, seconds = int(count), float(seconds or 1)
+    except ValueError:
+        raise ValueError(f'Rate must look like count/seconds, got {spec!r}')
+    return TokenBuckets(count, count / seconds)
+
+
+class Admission:
+    def __init__(self, config, metrics=None):
+        spec = config.get('ADMISSION_LIMITS')
+        self.limits = parse_limits(default_limits(config) if spec is None else spec)
+        self.by_role = {name.partition('[')[0] for name in self.limits if '[' in name}
+        self.per_ip = parse_rate(config.get('AUTH_RATE_PER_IP'))
+        self.per_account = parse_rate(config.get('AUTH_RATE_PER_ACCOUNT'))
+        self.timeout = config.get('ADMISSION_QUEUE_TIMEOUT_MS', 1000) / 1000.0
+        self.retry_after = str(max(1, math.ceil(self.timeout)))
+        self.proxy_hops = config.get('ADMISSION_PROXY_HOPS', 0)
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.admission_active.read = lambda: {(n,): lim.active for n, lim in self.limits.items()}
+            metrics.admission_queued.read = lambda: {(n,): lim.waiting for n, lim in self.limits.items()}
+
+    def _client_ip(self):
+        if self.proxy_hops:
+            hops = [h.strip() for h in request.headers.get('X-Forwarded-For', '').split(',') if h.strip()]
+            if len(hops) >= self.proxy_hops:
+                return hops[-self.proxy_hops]
+        return request.remote_addr or ''
+
+    def _account(self):
+        if request.endpoint == 'auth.change_password':
+            return token_claims().get('sub')
+        data = request.get_json(silent=True) if request.method == 'POST' else None
+        username = data.get('username') if isinstance(data, dict) else request.args.get('username')
+        return str(username).strip().lower() if username else None
+
+    def _reject(self, endpoint, reason, status, retry_after):
+        if self.metrics is not None:
+            self.metrics.admission_rejected.inc((endpoint, reason))
+        message = 'Too many requests, please retry later' if status == 429 else 'Server busy, please retry'
+        return jsonify({'error': message}), status, {'Retry-After': retry_after}
+
+    def _rate_limit(self, endpoint):
+        for buckets, key in ((self.per_ip, self._client_ip), (self.per_account, self._account)):
+            if buckets is None:
+                continue
+            client = key()
+            wait = buckets.take((endpoint, client)) if client else 0
+            if wait:
+                return self._reject(endpoint, 'rate_limited', 429, str(math.ceil(wait)))
+        return None
+
+    def admit(self):
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in EXEMPT:
+            return None
+        if endpoint in RATE_LIMITED:
+            rejected = self._rate_limit(endpoint)
+            if rejected is not None:
+                return rejected
+        limit = self.limits.get(endpoint) or self.limits.get('*')
+        if endpoint in self.by_role:
+            limit = self.limits.get(f"{endpoint}[{token_claims().get('role')}]", limit)
+        if limit is None:
+            return None
+        admitted, detail = limit.acquire(self.timeout)
+        if not admitted:
+            return self._reject(endpoint, detail, 503, self.retry_after)
+        g.admission_limit = limit
+        if self.metrics is not None:
+            self.metrics.admission_wait.observe((endpoint,), detail)
+        return None
+
+    def release(self, exc):
+        # Streamed responses (stream_with_context) hold the slot until the body is sent
+        limit = g.pop('admission_limit', None)
+        if limit is not None:
+            limit.release()
+
+
+def init_admission(app):
+    if not app.config.get('ADMISSION_CONTROL'):
+        return
+    admission = app.extensions['admission'] = Admission(app.config, app.extensions.get('metrics'))
+    app.before_request(admission.admit)
+    app.teardown_request(admission.release)
@@ -0,0 +1,108 @@
+"""
+Hot/cold tiering of the schedule.
+
+Flights that departed more than ARCHIVE_AFTER_DAYS ago are moved into flights_archive,
+together with their bookings (into bookings_archive). After that, search, quotes,
+seat maps and inventory only see upcoming flights, and the indexes over flights and
+bookings stay the size of the live schedule.
+
+archive() works in chunks of ARCHIVE_CHUNK_SIZE flights, oldest first. Each chunk is
+one short transaction: INSERT ... SELECT into both archive tables, then DELETE the
+bookings, seat maps and flights. The chunk's flights are locked first (BEGIN IMMEDIATE
+on SQLite, SELECT ... FOR UPDATE elsewhere). A booking reserves seats on its flight row
+before it inserts, so none can land between the copy and the delete. Bookings and the
+API keep writing between chunks, and a run stopped part-way leaves every flight in
+exactly one tier. Run it from cron: flask --app run archive.
+
+Ledger entries stay where they are; reconcile() checks archived bookings like live
+ones. Booking history reads both tiers through booking_rows() and archived_booking().
+"""
+import heapq
+from datetime import datetime, timedelta
+from app import db, projection
+from app.engine import begin_write
+from app.models import Booking, Flight, SeatMap, bookings_archive, flights_archive
+from app.schedule import FlightRow, flights_changed, snapshot
+
+TIERS = ((Booking.__table__, Flight.__table__), (bookings_archive, flights_archive))  # (bookings, flights)
+
+
+def cutoff(config, now=None):
+    """Flights departing before this are archived."""
+    return (now or datetime.utcnow()) - timedelta(days=config.get('ARCHIVE_AFTER_DAYS', 1))
+
+
+def archive(before, chunk_size=500, progress=None):
+    """
+    Move flights that departed before `before`, and their bookings, to the archive tables.
+    Returns {'flights': n, 'bookings': n}; `progress(counts)` is called after each chunk.
+    """
+    flights = Flight.__table__
+    bookings = Booking.__table__
+    flight_cols = [c.name for c in flights.columns]
+    booking_cols = [c.name for c in bookings.columns]
+    counts = {'flights': 0, 'bookings': 0}
+    while True:
+        try:
+            begin_write(db.session)
+            rows = db.session.execute(
+                db.select(*(flights.c[k] for k in FlightRow._fields)).where(flights.c.departure_time < before)
+                .order_by(flights.c.departure_time).limit(chunk_size).with_for_update()).all()
+            if not rows:
+                db.session.rollback()
+                return counts
+            ids = [r.id for r in rows]
+            now = datetime.utcnow()
+            db.session.execute(flights_archive.insert().from_select(
+                flight_cols + ['archived_at'],
+                db.select(*flights.columns, db.literal(now)).where(flights.c.id.in_(ids))))
+            moved = db.session.execute(bookings_archive.insert().from_select(
+                booking_cols + ['archived_at'],
+                db.select(*bookings.columns, db.literal(now)).where(bookings.c.flight_id.in_(ids)))).rowcount
+            db.session.execute(bookings.delete().where(bookings.c.flight_id.in_(ids)))
+            db.session.execute(SeatMap.__table__.delete().where(SeatMap.__table__.c.flight_id.in_(ids)))
+            db.session.execute(flights.delete().where(flights.c.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        flights_changed([(snapshot(r), None) for r in rows])
+        counts['flights'] += len(rows)
+        counts['bookings'] += moved
+        if progress:
+            progress(counts)
+
+
+def tier_columns(table, columns):
+    """`table`'s columns with the names of `columns` (Flight or Booking attributes), for either tier."""
+    return [table.c[c.key] for c in columns]
+
+
+def booking_rows(stmt_for, limit):
+    """
+    Newest-first bookings over both tiers. stmt_for(bookings, flights) builds one tier's page
+    from those tables: ordered by created_at desc, id desc, at most `limit` rows, with created_at
+    and id as its last-but-one columns. Each page is read off its tier's (created_at, id) index
+    and the two are merged here, so the archive costs one small extra query per page.
+    """
+    hot, cold = (projection.rows(stmt_for(b, f)).all() for b, f in TIERS)
+    if not cold:
+        return hot
+    return list(heapq.merge(hot, cold, key=lambda row: (row[-3], row[-2]), reverse=True))[:limit]
+
+
+def archived_booking(booking_id):
+    """An archived booking as Booking.to_dict() would give it, flight included, or None."""
+    fields = [n for n in projection.BOOKING.fields if n != 'flight']
+    flight_fields = list(projection.FLIGHT.fields)
+    columns = tier_columns(bookings_archive, projection.BOOKING.columns(fields))
+    row = projection.rows(
+        db.select(*columns, *tier_columns(flights_archive, projection.FLIGHT.columns(flight_fields)))
+        .outerjoin(flights_archive, flights_archive.c.id == bookings_archive.c.flight_id)
+        .where(bookings_archive.c.id == booking_id)).first()
+    if row is None:
+        return None
+    d = projection.BOOKING.converter(fields)(row)
+    d['flight'] = projection.FLIGHT.converter(flight_fields, offset=len(columns))(row) \
+        if row[len(columns)] is not None else None
+    return d
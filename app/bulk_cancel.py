@@ -0,0 +1,176 @@
+"""
+Bulk booking cancellation.
+
+A selection (booking ids, flight ids or a departure date range) is cancelled in
+chunks of CANCEL_CHUNK_SIZE bookings, each in its own transaction. Per chunk, one
+SELECT reads the bookings in id order after the previous chunk. inventory.cancel_bookings
+then refunds them with one ledger INSERT, gives their seats back with one UPDATE per
+flight and deletes them with one DELETE. A chunk commits all of that or none of it,
+so the ledger always balances and a failure part-way leaves earlier chunks done.
+
+A selection that fits in one chunk is cancelled inside the request. A larger one
+becomes a CancelJob that runs on a background thread; its counters are updated in
+each chunk's transaction, so GET /api/admin/bookings/cancel/<id> shows exact progress.
+"""
+import json
+import logging
+import threading
+from datetime import datetime
+from flask import current_app
+from app import db, inventory
+from app.engine import begin_write
+from app.models import Booking, CancelJob, Flight
+from app.schedule import FlightRow, flights_changed, snapshot
+
+MAX_SELECTION_IDS = 10000
+
+log = logging.getLogger(__name__)
+
+
+def _ids(value, name):
+    if not isinstance(value, list) or not value:
+        raise ValueError(f'{name} must be a non-empty list')
+    if len(value) > MAX_SELECTION_IDS:
+        raise ValueError(f'At most {MAX_SELECTION_IDS} {name}')
+    try:
+        return sorted({int(v) for v in value})
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be integers')
+
+
+def _datetime(value, name):
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {name}')
+
+
+def parse_selection(data):
+    """
+    The selection from a request body: exactly one of booking_ids, flight_ids, or
+    departure_from + departure_to (ISO datetimes, to exclusive). Raises ValueError.
+    """
+    given = [k for k in ('booking_ids', 'flight_ids', 'departure_from') if k in data]
+    if len(given) != 1:
+        raise ValueError('Give one of booking_ids, flight_ids or departure_from/departure_to')
+    if given[0] != 'departure_from':
+        return {given[0]: _ids(data[given[0]], given[0])}
+    start = _datetime(data.get('departure_from'), 'departure_from')
+    end = _datetime(data.get('departure_to'), 'departure_to')
+    if end <= start:
+        raise ValueError('departure_to must be after departure_from')
+    return {'departure_from': start.isoformat(), 'departure_to': end.isoformat()}
+
+
+def criteria(selection):
+    """WHERE clauses on Booking for a parsed selection."""
+    if 'booking_ids' in selection:
+        return [Booking.id.in_(selection['booking_ids'])]
+    if 'flight_ids' in selection:
+        return [Booking.flight_id.in_(selection['flight_ids'])]
+    flights = db.select(Flight.id).where(
+        Flight.departure_time >= datetime.fromisoformat(selection['departure_from']),
+        Flight.departure_time < datetime.fromisoformat(selection['departure_to']))
+    return [Booking.flight_id.in_(flights)]
+
+
+def count(where):
+    return db.session.scalar(db.select(db.func.count(Booking.id)).where(*where))
+
+
+def _flight_rows(flight_ids):
+    flights = Flight.__table__
+    stmt = db.select(*(flights.c[k] for k in FlightRow._fields)).where(flights.c.id.in_(flight_ids))
+    return [snapshot(row) for row in db.session.execute(stmt)]
+
+
+def cancel_matching(where, chunk_size, restore_seats=True, on_chunk=None, finish=None):
+    """
+    Cancel every booking matching `where`, chunk by chunk; returns (cancelled, refunded paise).
+    on_chunk(rows, paise) runs inside each chunk's transaction; finish() inside the last one
+    (also when nothing matched). With restore_seats=False seat counts and seat maps are left
+    alone and no schedule change is published: the caller is deleting the flights.
+    """
+    cancelled, refunded, last_id = 0, 0, 0
+    while True:
+        try:
+            begin_write(db.session)
+            rows = db.session.execute(
+                db.select(*inventory.CANCEL_COLUMNS).where(*where, Booking.id > last_id)
+                .order_by(Booking.id).limit(chunk_size).with_for_update()).all()
+            flight_ids = sorted({r.flight_id for r in rows})
+            before = _flight_rows(flight_ids) if restore_seats and rows else []
+            paise = inventory.cancel_bookings(rows, restore_seats=restore_seats)
+            if on_chunk is not None:
+                on_chunk(rows, paise)
+            done = len(rows) < chunk_size
+            if done and finish is not None:
+                finish()
+            after = _flight_rows(flight_ids) if before else []
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if before:
+            flights_changed(list(zip(before, after)))
+        cancelled += len(rows)
+        refunded += paise
+        if rows:
+            last_id = rows[-1].id
+        if done:
+            return cancelled, refunded
+
+
+def _record(job_id):
+    """on_chunk callback adding a chunk's counts to the job in the same transaction."""
+    def record(rows, paise):
+        db.session.execute(db.update(CancelJob).where(CancelJob.id == job_id).values(
+            cancelled=CancelJob.cancelled + len(rows), refunded_paise=CancelJob.refunded_paise + paise,
+            updated_at=datetime.utcnow()))
+    return record
+
+
+def _finish(job_id, status, error=None):
+    now = datetime.utcnow()
+    db.session.execute(db.update(CancelJob).where(CancelJob.id == job_id).values(
+        status=status, error=error, updated_at=now, finished_at=now))
+    db.session.commit()
+
+
+def run(job_id, chunk_size):
+    """Run a queued job to completion in this thread's app context."""
+    job = db.session.get(CancelJob, job_id)
+    job.status = 'running'
+    db.session.commit()
+    try:
+        cancel_matching(criteria(json.loads(job.selection)), chunk_size, on_chunk=_record(job_id))
+    except Exception as e:
+        log.exception('cancel job %s failed', job_id)
+        _finish(job_id, 'failed', str(e))
+    else:
+        _finish(job_id, 'done')
+
+
+def start(selection, user_id):
+    """
+    Create a job for `selection` and cancel it: now if it fits in one chunk, otherwise on a
+    background thread. Returns the job; call job.to_dict() to report it.
+    """
+    chunk_size = current_app.config.get('CANCEL_CHUNK_SIZE', 500)
+    job = CancelJob(selection=json.dumps(selection), total=count(criteria(selection)), created_by=user_id)
+    db.session.add(job)
+    db.session.commit()
+    if job.total <= chunk_size:
+        run(job.id, chunk_size)
+        db.session.refresh(job)
+        return job
+    app, job_id = current_app._get_current_object(), job.id
+
+    def work():
+        with app.app_context():
+            try:
+                run(job_id, chunk_size)
+            finally:
+                db.session.remove()
+    threading.Thread(target=work, name=f'cancel-job-{job_id}', daemon=True).start()
+    return job
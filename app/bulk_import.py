@@ -0,0 +1,212 @@
+"""
+Bulk flight schedule import.
+
+Rows come from a streamed NDJSON or CSV body, or are generated from a recurrence rule
+(one route flown at fixed times on chosen weekdays over a date range, like app/seed.py).
+They are validated and inserted in chunks: one set-based query per chunk to find
+flight numbers that already exist, one executemany INSERT and one commit per chunk.
+Bad rows are skipped and reported with their row number; good rows still go in. A
+chunk that loses a race with a concurrent insert of the same flight number is rolled
+back and retried without it, so the report always covers every row.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Flight, normalize_place
+from app.schedule import FlightRow, flights_changed
+
+MAX_REPORTED_ERRORS = 1000
+MAX_RECURRENCE_FLIGHTS = 100000
+INSERT_ATTEMPTS = 3  # per chunk, when flight numbers race a concurrent insert
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+class RowError(ValueError):
+    """A row (or the rule generating rows) is invalid; the message goes into the report."""
+
+
+def _parse_dt(value, field):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (ValueError, TypeError):
+        raise RowError(f'Invalid {field}')
+
+
+def _given(raw, key, default):
+    """raw[key], or `default` when it is missing or None (or an empty CSV cell); 0 is kept."""
+    value = raw.get(key)
+    return default if value is None or value == '' else value
+
+
+def validate(raw):
+    """Column values for one Flight from a raw dict, as admin.create_flight would accept them."""
+    if not isinstance(raw, dict):
+        raise RowError('Row must be an object')
+    flight_number = str(raw.get('flight_number') or '').strip()
+    source = str(raw.get('source') or '').strip()
+    destination = str(raw.get('destination') or '').strip()
+    if not all([flight_number, source, destination, raw.get('departure_time'), raw.get('arrival_time')]):
+        raise RowError('Missing required fields')
+    dep = _parse_dt(raw['departure_time'], 'departure_time')
+    arr = _parse_dt(raw['arrival_time'], 'arrival_time')
+    if arr <= dep:
+        raise RowError('arrival_time must be after departure_time')
+    try:
+        row = {
+            'economy_price': float(_given(raw, 'economy_price', 0)),
+            'business_price': float(_given(raw, 'business_price', 0)),
+            'economy_seats': int(_given(raw, 'economy_seats', 60)),
+            'business_seats': int(_given(raw, 'business_seats', 20)),
+        }
+    except (TypeError, ValueError):
+        raise RowError('Prices and seat counts must be numbers')
+    if row['economy_seats'] < 0 or row['business_seats'] < 0:
+        raise RowError('Seat counts must not be negative')
+    row.update(flight_number=flight_number, source=source, destination=destination,
+               source_key=normalize_place(source), destination_key=normalize_place(destination),
+               departure_time=dep, arrival_time=arr)
+    return row
+
+
+# --- Row sources: each yields (row number, raw dict or RowError) ----------------
+
+def ndjson_rows(stream):
+    for n, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), 1):
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError:
+            yield n, RowError('Invalid JSON')
+
+
+def csv_rows(stream):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    for n, raw in enumerate(reader, 1):
+        yield n, raw
+
+
+def recurrence_rows(rule):
+    """
+    Rows for one route from a rule like
+    {"source", "destination", "departure": "06:30", "arrival": "09:00" | "duration_minutes": 150,
+     "days_of_week": ["mon", "wed"] or [0, 2], "start_date", "end_date",
+     "flight_number_prefix": "SA", "start_number": 1000, plus optional prices and seat counts}.
+    """
+    if not isinstance(rule, dict):
+        raise RowError('recurrence must be an object')
+    try:
+        start = date.fromisoformat(rule['start_date'])
+        end = date.fromisoformat(rule['end_date'])
+        dep_t = time.fromisoformat(rule['departure'])
+        if rule.get('duration_minutes') is not None:
+            duration = timedelta(minutes=int(rule['duration_minutes']))
+        else:
+            arr_t = time.fromisoformat(rule['arrival'])
+            duration = datetime.combine(start, arr_t) - datetime.combine(start, dep_t)
+            if duration <= timedelta(0):
+                duration += timedelta(days=1)  # overnight
+        days = {WEEKDAYS.index(str(d).lower()[:3]) if not isinstance(d, int) else d
+                for d in rule.get('days_of_week') or range(7)}
+        number = int(rule.get('start_number', 1))
+    except (KeyError, TypeError, ValueError) as e:
+        raise RowError(f'Invalid recurrence: {e}')
+    if end < start or (end - start).days * len(days) / 7 > MAX_RECURRENCE_FLIGHTS:
+        raise RowError('Invalid recurrence date range')
+    prefix = str(rule.get('flight_number_prefix') or 'SA')
+    extra = {k: rule[k] for k in ('economy_price', 'business_price', 'economy_seats', 'business_seats') if k in rule}
+
+    def generate(number):
+        n = 0
+        day = start
+        while day <= end:
+            if day.weekday() in days:
+                n += 1
+                dep = datetime.combine(day, dep_t)
+                yield n, dict(extra, flight_number=f'{prefix}{number:03d}', source=rule.get('source'),
+                              destination=rule.get('destination'), departure_time=dep, arrival_time=dep + duration)
+                number += 1
+            day += timedelta(days=1)
+    return generate(number)
+
+
+# --- Import ----------------------------------------------------------------------
+
+def _chunks(records, size):
+    chunk = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(valid, reject):
+    """
+    Insert the (row number, row) pairs whose flight number is not taken, in one transaction;
+    returns [(id, row)]. A flight number inserted concurrently after the check fails the
+    INSERT: the chunk is rolled back, checked again and retried without it.
+    """
+    for _ in range(INSERT_ATTEMPTS):
+        numbers = [row['flight_number'] for _, row in valid]
+        existing = set(db.session.scalars(db.select(Flight.flight_number).where(Flight.flight_number.in_(numbers))))
+        for n, row in valid:
+            if row['flight_number'] in existing:
+                reject(n, 'Flight number already exists', row['flight_number'])
+        valid = [(n, row) for n, row in valid if row['flight_number'] not in existing]
+        if not valid:
+            return []
+        rows = [dict(row, created_at=datetime.utcnow()) for _, row in valid]
+        try:
+            ids = db.session.scalars(db.insert(Flight).returning(Flight.id, sort_by_parameter_order=True),
+                                     rows).all()
+            db.session.commit()
+            return list(zip(ids, rows))
+        except IntegrityError:
+            db.session.rollback()
+    for n, row in valid:
+        reject(n, 'Insert kept conflicting with concurrent writes; import the row again', row['flight_number'])
+    return []
+
+
+def import_flights(records, chunk_size=1000):
+    """Validate and insert (row number, raw) records; returns the per-row report."""
+    report = {'inserted': 0, 'rejected': 0, 'errors': []}
+    seen = set()
+
+    def reject(n, msg, flight_number=None):
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': n, 'flight_number': flight_number, 'error': msg})
+
+    for chunk in _chunks(records, chunk_size):
+        valid = []
+        for n, raw in chunk:
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                row = validate(raw)
+            except RowError as e:
+                reject(n, str(e), raw.get('flight_number') if isinstance(raw, dict) else None)
+                continue
+            if row['flight_number'] in seen:
+                reject(n, 'Duplicate flight number in import', row['flight_number'])
+                continue
+            seen.add(row['flight_number'])
+            valid.append((n, row))
+        if not valid:
+            continue
+        inserted = _insert(valid, reject)
+        report['inserted'] += len(inserted)
+        if inserted:
+            flights_changed([(None, FlightRow(**dict(row, id=fid))) for fid, row in inserted])
+    report['errors'].sort(key=lambda e: e['row'])
+    report['errors_truncated'] = report['rejected'] > len(report['errors'])
+    return report
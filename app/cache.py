@@ -0,0 +1,118 @@
+"""
+Versioned response cache for the flight read endpoints.
+
+Every cached body is stored with the version of the data it was built from:
+per-flight counters for /api/flights/<id>, per-route counters for exact route
+searches and a catalog counter for every other search. Writes bump the counters
+(via app.schedule), which makes exactly the affected entries stale without scanning
+the cache. Bodies carry a strong ETag, so a client revalidating an unchanged result
+gets 304 without the DB being touched.
+
+Entries live in process memory. Under the prefork server, the counters move into
+shared memory (app.prefork), so a flight write makes the affected entries stale in
+every worker, and only those.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import current_app, jsonify, request
+from app.schedule import on_flight_change
+
+
+class VersionCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._routes = {}
+        self.catalog = 0
+
+    def flight(self, flight_id):
+        return self._flights.get(flight_id, 0)
+
+    def route(self, source_key, destination_key):
+        return self._routes.get((source_key, destination_key), 0)
+
+    def bump(self, flight_ids, routes):
+        with self._lock:
+            for flight_id in flight_ids:
+                self._flights[flight_id] = self._flights.get(flight_id, 0) + 1
+            for route in routes:
+                self._routes[route] = self._routes.get(route, 0) + 1
+            self.catalog += 1
+
+
+class ResponseCache:
+    """LRU of key -> (version, etag, body bytes)."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.versions = VersionCounters()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def put(self, key, version, etag, body):
+        with self._lock:
+            self._data[key] = (version, etag, body)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+def init_response_cache(app):
+    app.extensions['response_cache'] = ResponseCache(app.config.get('SEARCH_CACHE_SIZE', 2048))
+
+
+def _cache():
+    return current_app.extensions['response_cache']
+
+
+def flight_version(flight_id):
+    return ('flight', _cache().versions.flight(flight_id))
+
+
+def search_version(source_key, destination_key, match):
+    """Exact route searches depend only on their route; anything broader on the whole catalog."""
+    versions = _cache().versions
+    if match == 'exact' and source_key and destination_key:
+        return ('route', versions.route(source_key, destination_key))
+    return ('catalog', versions.catalog)
+
+
+@on_flight_change
+def _bump_versions(changes):
+    flights = [f for pair in changes for f in pair if f is not None]
+    _cache().versions.bump({f.id for f in flights}, {(f.source_key, f.destination_key) for f in flights})
+
+
+def cached_json(key, version, build):
+    """
+    JSON response for `build()`, served from the cache while `version` is current.
+    Answers 304 when the client's If-None-Match still matches.
+    """
+    cache = _cache()
+    entry = cache.get(key, version)
+    if entry is None:
+        resp = jsonify(build())
+        etag = hashlib.sha1(resp.get_data()).hexdigest()[:24]
+        cache.put(key, version, etag, resp.get_data())
+    else:
+        etag = entry[1]
+        resp = current_app.response_class(entry[2], mimetype='application/json')
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
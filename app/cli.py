@@ -0,0 +1,115 @@
+"""
+Database maintenance commands, run explicitly instead of on every create_app():
+
+    flask --app run schema-migrate      (once, on a database from before the place keys and archive)
+    flask --app run init-db
+    flask --app run seed
+    flask --app run seed-synthetic --flights 1000000 --users 100000 --bookings 2000000
+    flask --app run ledger-migrate      (once, on a database from before the balance ledger)
+    flask --app run ledger-snapshot     (periodically, e.g. every few minutes from cron)
+    flask --app run ledger-reconcile
+    flask --app run archive             (periodically, e.g. nightly from cron)
+    flask --app run fare-calendar-rebuild
+
+seed, seed-synthetic and archive add or remove flights behind the server's back, so
+they also bump the generation that running workers poll (app.prefork).
+"""
+import time
+import click
+from app import db
+from app.prefork import publish_stored
+
+
+def register_cli(app):
+    @app.cli.command('init-db')
+    def init_db():
+        """Create any missing tables."""
+        db.create_all()
+        click.echo('Tables created.')
+
+    @app.cli.command('schema-migrate')
+    def schema_migrate():
+        """Bring flights and bookings tables from an older schema up to date (safe to re-run)."""
+        from app.migrations import migrate
+        for step in migrate():
+            click.echo(f'  {step}')
+        click.echo('Schema up to date.')
+
+    @app.cli.command('seed')
+    def seed():
+        """Add the admin user and the demo schedule (no-op if already seeded)."""
+        from app.seed import seed_database
+        seed_database()
+        publish_stored()
+        click.echo('Seed data loaded.')
+
+    @app.cli.command('ledger-migrate')
+    def ledger_migrate():
+        """Open ledger accounts from the old users.balance column."""
+        from app.ledger import import_legacy_balances
+        click.echo(f'Opened {import_legacy_balances()} accounts from users.balance.')
+
+    @app.cli.command('ledger-snapshot')
+    def ledger_snapshot():
+        """Roll balance snapshots forward over the ledger."""
+        from app.ledger import snapshot
+        start = time.perf_counter()
+        updated = snapshot()
+        click.echo(f'Updated {updated} balance snapshots in {time.perf_counter() - start:.2f}s.')
+
+    @app.cli.command('ledger-reconcile')
+    def ledger_reconcile():
+        """Check snapshots, booking payments and balances against the ledger; exits 1 on problems."""
+        from app.ledger import reconcile
+        report = reconcile()
+        click.echo(f"{report['entries']} entries, {report['users']} users, {report['bookings']} bookings checked.")
+        for problem in report['problems']:
+            click.echo(f'  {problem}')
+        if report['problems']:
+            raise SystemExit(1)
+        click.echo('Ledger OK.')
+
+    @app.cli.command('archive')
+    @click.option('--days', type=int, default=None, help='Archive flights that departed this many days ago '
+                                                         '(default ARCHIVE_AFTER_DAYS).')
+    def archive_flights(days):
+        """Move departed flights and their bookings to the archive tables."""
+        from app.archive import archive, cutoff
+        config = dict(app.config, ARCHIVE_AFTER_DAYS=days) if days is not None else app.config
+        start = time.perf_counter()
+        counts = archive(cutoff(config), app.config.get('ARCHIVE_CHUNK_SIZE', 500),
+                         progress=lambda c: click.echo(f"  flights: {c['flights']}"))
+        app.extensions['fare_calendar'].flush()
+        if counts['flights']:
+            publish_stored()
+        click.echo(f"Archived {counts['flights']} flights and {counts['bookings']} bookings "
+                   f'in {time.perf_counter() - start:.1f}s.')
+
+    @app.cli.command('fare-calendar-rebuild')
+    def fare_calendar_rebuild():
+        """Recompute the fare calendar from the flights table."""
+        from app.fare_calendar import rebuild
+        start = time.perf_counter()
+        rows = rebuild()
+        click.echo(f'Fare calendar rebuilt: {rows} route-days in {time.perf_counter() - start:.1f}s.')
+
+    @app.cli.command('seed-synthetic')
+    @click.option('--flights', default=100000, show_default=True)
+    @click.option('--users', default=10000, show_default=True)
+    @click.option('--bookings', default=100000, show_default=True)
+    @click.option('--days', default=365, show_default=True, help='Spread departures over this many days.')
+    @click.option('--history-days', default=0, show_default=True, help='Also spread them this many days back.')
+    @click.option('--chunk-size', default=20000, show_default=True)
+    @click.option('--seed', 'rng_seed', type=int, default=None, help='Random seed for a repeatable dataset.')
+    def seed_synthetic(flights, users, bookings, days, history_days, chunk_size, rng_seed):
+        """Bulk-generate a large synthetic dataset for load tests."""
+        from app.seed import seed_synthetic as generate
+        start = time.perf_counter()
+        counts = generate(flights=flights, users=users, bookings=bookings, days=days, history_days=history_days,
+                          chunk_size=chunk_size, seed=rng_seed, progress=lambda kind, done: click.echo(f'  {kind}: {done}'))
+        if counts['flights']:
+            publish_stored()
+        elapsed = time.perf_counter() - start
+        total = sum(counts.values())
+        click.echo(f"Inserted {counts['flights']} flights, {counts['users']} users, {counts['bookings']} bookings "
+                   f'in {elapsed:.1f}s ({total / elapsed:.0f} rows/s).')
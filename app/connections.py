@@ -0,0 +1,227 @@
+"""
+Multi-leg itinerary search over an in-memory timetable.
+
+The timetable is a time-expanded view of upcoming flights: for every route
+(source_key, destination_key) and every origin, departures sorted by time, so "flights
+leaving X between t1 and t2" is a bisect. A search walks at most MAX_LEGS legs from
+the origin, only continues through airports that still have a route to the
+destination within the remaining legs, keeps each layover within
+[min_layover, max_layover], and prunes partial itineraries that can no longer beat
+the current top k on fare or duration.
+
+Seat counts are kept current through app.schedule events (bookings publish the new
+counts); the seats of the returned legs are re-checked in one query before answering.
+"""
+import heapq
+import math
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import Flight
+from app.schedule import FlightRow, on_flight_change
+
+MAX_LEGS = 3
+REBUILD_THRESHOLD = 5000  # bulk changes larger than this drop the index instead
+
+
+class Departures:
+    """Flights sorted by (departure_time, id), with a parallel key list for bisect."""
+
+    def __init__(self):
+        self.keys = []
+        self.rows = []
+
+    def add(self, row):
+        key = (row.departure_time, row.id)
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.rows.insert(i, row)
+
+    def remove(self, row):
+        key = (row.departure_time, row.id)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+            del self.rows[i]
+
+    def between(self, start, end, include_end=False):
+        """Rows departing in [start, end), or [start, end] with include_end."""
+        lo = bisect_left(self.keys, (start, -1))
+        hi = bisect_right(self.keys, (end, math.inf)) if include_end else bisect_left(self.keys, (end, -1))
+        return self.rows[lo:hi]
+
+
+class ConnectionIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.by_origin = {}     # source key -> Departures
+        self.by_route = {}      # (source key, destination key) -> Departures
+        self.predecessors = {}  # destination key -> {source key: flights on that route}
+
+    def add(self, row):
+        with self._lock:
+            self.by_origin.setdefault(row.source_key, Departures()).add(row)
+            self.by_route.setdefault((row.source_key, row.destination_key), Departures()).add(row)
+            preds = self.predecessors.setdefault(row.destination_key, {})
+            preds[row.source_key] = preds.get(row.source_key, 0) + 1
+
+    def remove(self, row):
+        with self._lock:
+            self.by_origin.get(row.source_key, Departures()).remove(row)
+            self.by_route.get((row.source_key, row.destination_key), Departures()).remove(row)
+            preds = self.predecessors.get(row.destination_key, {})
+            if row.source_key in preds:
+                preds[row.source_key] -= 1
+                if preds[row.source_key] <= 0:
+                    del preds[row.source_key]
+
+    def update(self, before, after):
+        with self._lock:
+            if before is not None:
+                self.remove(before)
+            if after is not None:
+                self.add(after)
+
+    @classmethod
+    def build(cls, rows):
+        index = cls()
+        by_origin, by_route = {}, {}
+        for row in rows:
+            by_origin.setdefault(row.source_key, []).append(row)
+            by_route.setdefault((row.source_key, row.destination_key), []).append(row)
+        for target, groups in ((index.by_origin, by_origin), (index.by_route, by_route)):
+            for key, group in groups.items():
+                group.sort(key=lambda r: (r.departure_time, r.id))
+                d = target[key] = Departures()
+                d.rows = group
+                d.keys = [(r.departure_time, r.id) for r in group]
+        for (src, dst), d in index.by_route.items():
+            index.predecessors.setdefault(dst, {})[src] = len(d.rows)
+        return index
+
+    def _within(self, key, legs):
+        """Place keys that reach `key` in at most `legs` legs (including `key` itself)."""
+        reach = {key}
+        frontier = {key}
+        for _ in range(legs):
+            frontier = {p for k in frontier for p in self.predecessors.get(k, ())} - reach
+            reach |= frontier
+        return reach
+
+    def search(self, origin, destination, day, max_legs=2, min_layover=timedelta(minutes=45),
+               max_layover=timedelta(hours=8), travel_class='economy', passengers=1,
+               sort='price', limit=10):
+        """Top `limit` itineraries as lists of FlightRow, cheapest (or shortest) first."""
+        price_of = (lambda r: r.economy_price) if travel_class == 'economy' else (lambda r: r.business_price)
+        seats_of = (lambda r: r.economy_seats or 0) if travel_class == 'economy' else (lambda r: r.business_seats or 0)
+        start = datetime(day.year, day.month, day.day)
+        best = []  # heap of (-cost, seq, legs), holds the current top `limit`
+        seq = 0
+
+        def cost(legs, fare):
+            if sort == 'duration':
+                return (legs[-1].arrival_time - legs[0].departure_time).total_seconds()
+            return fare * passengers
+
+        def bound():
+            return -best[0][0] if len(best) >= limit else float('inf')
+
+        with self._lock:
+            # reach[n] = airports that can still get to the destination in n more legs
+            reach = [self._within(destination, n) for n in range(max_legs + 1)]
+
+            def extend(legs, fare, visited):
+                nonlocal seq
+                last = legs[-1]
+                if last.destination_key == destination:
+                    c = cost(legs, fare)
+                    if c < bound():
+                        seq += 1
+                        heapq.heappush(best, (-c, seq, list(legs)))
+                        if len(best) > limit:
+                            heapq.heappop(best)
+                    return
+                left = max_legs - len(legs)
+                if left <= 0:
+                    return
+                window = (last.arrival_time + min_layover, last.arrival_time + max_layover)
+                if left == 1:
+                    departures = self.by_route.get((last.destination_key, destination), Departures())
+                else:
+                    departures = self.by_origin.get(last.destination_key, Departures())
+                # Both layover bounds are inclusive
+                candidates = departures.between(*window, include_end=True)
+                for nxt in candidates:
+                    if nxt.destination_key in visited or nxt.destination_key not in reach[left - 1]:
+                        continue
+                    if seats_of(nxt) < passengers:
+                        continue
+                    legs.append(nxt)
+                    if cost(legs, fare + price_of(nxt)) < bound():
+                        visited.add(nxt.destination_key)
+                        extend(legs, fare + price_of(nxt), visited)
+                        visited.discard(nxt.destination_key)
+                    legs.pop()
+
+            for first in self.by_origin.get(origin, Departures()).between(start, start + timedelta(days=1)):
+                if first.destination_key not in reach[max_legs - 1] or seats_of(first) < passengers:
+                    continue
+                extend([first], price_of(first), {origin, first.destination_key})
+        return [legs for _, _, legs in sorted(best, key=lambda e: (-e[0], e[1]))]
+
+
+_build_lock = threading.Lock()
+
+
+def load_rows(since):
+    cols = [getattr(Flight, k) for k in FlightRow._fields]
+    result = db.session.execute(db.select(*cols).where(Flight.departure_time >= since)
+                                .execution_options(yield_per=10000))
+    return (FlightRow(*r) for r in result)
+
+
+def get_connection_index():
+    index = current_app.extensions.get('connection_index')
+    if index is None:
+        with _build_lock:
+            index = current_app.extensions.get('connection_index')
+            if index is None:
+                since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+                index = current_app.extensions['connection_index'] = ConnectionIndex.build(load_rows(since))
+    return index
+
+
+def available_seats(flight_ids, travel_class):
+    """Current seat counts from the DB for the given flights, in one query."""
+    col = Flight.economy_seats if travel_class == 'economy' else Flight.business_seats
+    return dict(db.session.execute(db.select(Flight.id, col).where(Flight.id.in_(flight_ids))).all())
+
+
+def itinerary_dict(legs, travel_class, passengers):
+    fare = sum(r.economy_price if travel_class == 'economy' else r.business_price for r in legs) * passengers
+    return {
+        'legs': [{
+            'id': r.id, 'flight_number': r.flight_number, 'source': r.source, 'destination': r.destination,
+            'departure_time': r.departure_time.isoformat(), 'arrival_time': r.arrival_time.isoformat(),
+            'economy_price': r.economy_price, 'business_price': r.business_price,
+        } for r in legs],
+        'total_fare': fare,
+        'duration_minutes': int((legs[-1].arrival_time - legs[0].departure_time).total_seconds() // 60),
+        'layover_minutes': [int((b.departure_time - a.arrival_time).total_seconds() // 60)
+                            for a, b in zip(legs, legs[1:])],
+    }
+
+
+@on_flight_change
+def _update_index(changes):
+    index = current_app.extensions.get('connection_index')
+    if index is None:
+        return
+    if len(changes) > REBUILD_THRESHOLD:
+        # Cheaper to rebuild on next use than to insert one by one into the sorted lists
+        current_app.extensions.pop('connection_index', None)
+        return
+    for before, after in changes:
+        index.update(before, after)
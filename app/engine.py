@@ -0,0 +1,132 @@
+"""
+Database engine profile: connection pool settings, SQLite pragmas and read routing.
+
+configure_engines(app) runs before db.init_app. It derives SQLALCHEMY_ENGINE_OPTIONS
+from the DB_POOL_* settings and adds a 'replica' bind when READ_DATABASE_URL is set.
+Pool options are skipped for in-memory SQLite, which uses a single static connection.
+init_engines(app) runs after db.init_app. It applies the SQLITE_* pragmas to every
+new SQLite connection. WAL lets readers run alongside the one writer, busy_timeout
+makes a writer wait for the lock instead of failing at once, synchronous=NORMAL is
+durable enough under WAL, and mmap_size serves reads from the page cache.
+
+Endpoints decorated with @read_only run their SELECTs on the replica engine when one
+is configured. For SQLite that can be the same file opened read-only
+(sqlite:///file:speed_airlines.db?mode=ro&uri=true), which gives reads their own pool.
+Anything flushed or executed that is not a SELECT still goes to the primary.
+"""
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from flask_sqlalchemy.session import Session
+
+JOURNAL_MODES = {'delete', 'truncate', 'persist', 'memory', 'wal', 'off'}
+SYNCHRONOUS_LEVELS = {'off', 'normal', 'full', 'extra'}
+
+
+def _is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def _is_memory(url):
+    url = make_url(url)
+    return _is_sqlite(url) and (url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory')
+
+
+def _pool_options(config, url):
+    if _is_memory(url):
+        return {}
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': not _is_sqlite(url),  # a local file can't drop the connection
+    }
+
+
+def configure_engines(app):
+    config = app.config
+    for key in ('SQLITE_JOURNAL_MODE', 'SQLITE_SYNCHRONOUS'):
+        value = (config.get(key) or '').lower()
+        allowed = JOURNAL_MODES if key == 'SQLITE_JOURNAL_MODE' else SYNCHRONOUS_LEVELS
+        if value and value not in allowed:
+            raise ValueError(f"{key} must be one of {', '.join(sorted(allowed))}")
+    options = _pool_options(config, config['SQLALCHEMY_DATABASE_URI'])
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    read_url = config.get('READ_DATABASE_URL')
+    if read_url:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds['replica'] = dict(_pool_options(config, read_url), url=read_url)
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_engines(app):
+    from app import db
+    config = app.config
+    pragmas = []
+    if config.get('SQLITE_JOURNAL_MODE'):
+        pragmas.append(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE'].lower()}")
+    if config.get('SQLITE_BUSY_TIMEOUT_MS') is not None:
+        pragmas.append(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    if config.get('SQLITE_SYNCHRONOUS'):
+        pragmas.append(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS'].lower()}")
+    if config.get('SQLITE_MMAP_SIZE') is not None:
+        pragmas.append(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+    if not pragmas:
+        return
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name != 'sqlite':
+            continue
+        # journal_mode is a property of the file; a read-only connection can't set it
+        engine_pragmas = [p for p in pragmas if engine.url.query.get('mode') != 'ro' or 'journal_mode' not in p]
+        event.listen(engine, 'connect', _pragma_setter(engine_pragmas))
+
+
+def _pragma_setter(pragmas):
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return apply_pragmas
+
+
+def begin_write(session):
+    """
+    Start the session's transaction holding the write lock, for read-then-write work that must not
+    interleave with other writers. Only SQLite needs this: pysqlite opens a transaction lazily on
+    the first DML (so a first RELEASE SAVEPOINT would commit), and reads before it see no lock.
+    Other databases rely on the caller's row locks (SELECT ... FOR UPDATE).
+    """
+    conn = session.connection()
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+class RoutingSession(Session):
+    """db.session class that sends SELECTs to the 'replica' bind inside @read_only endpoints."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('read_only') and not self._flushing \
+                and getattr(clause, 'is_select', False):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(fn):
+    """Mark a view as read-only so its queries may be served by the read replica."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        from app import db
+        session = db.session()
+        session.info['read_only'] = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            session.info.pop('read_only', None)
+    return wrapper
@@ -0,0 +1,155 @@
+"""
+Fare calendar: the cheapest fare and seats left per route per departure day.
+
+The fare_calendar table holds one row per (route, day) with flights on it: the
+lowest economy and business fare among flights that still have seats in that cabin,
+and the seats left across them. GET /api/flights/calendar reads a window of days
+with one range scan of its primary key, instead of one flight search per day.
+
+Rows are derived from the flights table and never edited by hand. After any flight
+write, the app.schedule listener below queues the (route, day) buckets the change
+touched. A refresher thread recomputes them from the route index, in one short
+transaction. It waits FARE_CALENDAR_REFRESH_MS after the first change so a burst of
+bookings costs one write instead of a second write transaction per booking on the
+request path. The calendar therefore trails flight writes by about that long. A
+recompute is the same query as a full build, so a failed one is retried with the next
+batch, and anything lost with the process is put right by the next write to that day
+or by `flask --app run fare-calendar-rebuild`. Fares are base fares; with
+DYNAMIC_FARES on, POST /api/flights/quote gives the exact price.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.engine import begin_write
+from app.models import FareCalendarDay, Flight
+from app.schedule import on_flight_change
+
+MAX_DAYS = 90
+REFRESH_CHUNK = 200  # buckets per recompute statement
+
+log = logging.getLogger(__name__)
+
+_COLUMNS = ['source_key', 'destination_key', 'day', 'flights', 'economy_min_fare', 'business_min_fare',
+            'economy_seats', 'business_seats']
+
+
+def _aggregate(*criteria):
+    """The calendar rows for the flights matching `criteria`, in _COLUMNS order."""
+    day = db.func.date(Flight.departure_time)
+    return db.select(
+        Flight.source_key, Flight.destination_key, day, db.func.count(),
+        db.func.min(db.case((Flight.economy_seats > 0, Flight.economy_price))),
+        db.func.min(db.case((Flight.business_seats > 0, Flight.business_price))),
+        db.func.coalesce(db.func.sum(Flight.economy_seats), 0),
+        db.func.coalesce(db.func.sum(Flight.business_seats), 0),
+    ).where(*criteria).group_by(Flight.source_key, Flight.destination_key, day)
+
+
+def _insert(stmt):
+    db.session.execute(db.insert(FareCalendarDay).from_select(_COLUMNS, stmt))
+
+
+def rebuild():
+    """Recompute the whole table from the flights table; returns the number of rows."""
+    begin_write(db.session)
+    db.session.execute(db.delete(FareCalendarDay))
+    _insert(_aggregate())
+    db.session.commit()
+    return db.session.query(db.func.count()).select_from(FareCalendarDay).scalar()
+
+
+def refresh(buckets):
+    """Recompute the given (source_key, destination_key, day) rows, in one transaction."""
+    buckets = sorted(buckets)
+    if not buckets:
+        return
+    try:
+        begin_write(db.session)
+        for lo in range(0, len(buckets), REFRESH_CHUNK):
+            chunk = buckets[lo:lo + REFRESH_CHUNK]
+            db.session.execute(db.delete(FareCalendarDay).where(db.or_(*(
+                db.and_(FareCalendarDay.source_key == s, FareCalendarDay.destination_key == d,
+                        FareCalendarDay.day == day) for s, d, day in chunk))))
+            # Half-open ranges on the route index, as in flight search
+            _insert(_aggregate(db.or_(*(
+                db.and_(Flight.source_key == s, Flight.destination_key == d, Flight.departure_time >= day,
+                        Flight.departure_time < day + timedelta(days=1)) for s, d, day in chunk))))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def window(source_key, destination_key, start, days):
+    """Calendar rows for the route from `start` (a date) for `days` days, in day order."""
+    return db.session.execute(
+        db.select(FareCalendarDay.day, FareCalendarDay.flights, FareCalendarDay.economy_min_fare,
+                  FareCalendarDay.business_min_fare, FareCalendarDay.economy_seats, FareCalendarDay.business_seats)
+        .where(FareCalendarDay.source_key == source_key, FareCalendarDay.destination_key == destination_key,
+               FareCalendarDay.day >= start, FareCalendarDay.day < start + timedelta(days=days))
+        .order_by(FareCalendarDay.day)).all()
+
+
+class CalendarRefresher:
+    """Buckets waiting to be recomputed, drained by one thread per process (started on first use)."""
+
+    def __init__(self, app, delay):
+        self.app = app
+        self.delay = delay
+        self._pending = set()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, buckets):
+        if not buckets:
+            return
+        with self._lock:
+            self._pending.update(buckets)
+            self._idle.clear()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='fare-calendar', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def flush(self, timeout=None):
+        """Wait until every queued bucket has been recomputed; False on timeout."""
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                self._wake.wait()
+                time.sleep(self.delay)
+                with self._lock:
+                    self._wake.clear()
+                    buckets, self._pending = self._pending, set()
+                try:
+                    refresh(buckets)
+                except SQLAlchemyError:
+                    # The flight writes are committed; try these days again with the next batch
+                    log.exception('fare calendar refresh failed for %d day(s)', len(buckets))
+                    with self._lock:
+                        self._pending.update(buckets)
+                    self._wake.set()
+                finally:
+                    db.session.remove()
+                with self._lock:
+                    if not self._pending:
+                        self._idle.set()
+
+
+def init_fare_calendar(app):
+    app.extensions['fare_calendar'] = CalendarRefresher(app, app.config.get('FARE_CALENDAR_REFRESH_MS', 250) / 1000.0)
+
+
+@on_flight_change
+def _refresh_days(changes):
+    current_app.extensions['fare_calendar'].add(
+        {(f.source_key, f.destination_key, f.departure_time.date()) for pair in changes for f in pair if f is not None})
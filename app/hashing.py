@@ -0,0 +1,79 @@
+"""
+bcrypt on a dedicated, bounded thread pool.
+
+bcrypt releases the GIL, so running it on HASH_WORKERS pool threads caps how many
+cores password work can take at once and leaves the rest of the request workers
+free for cheap endpoints like flight search. HASH_WORKERS = 0 hashes inline on the
+request thread. BCRYPT_ROUNDS sets the cost for new hashes; hashes made at another
+cost are upgraded on the next successful login (see needs_rehash).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from app.metrics import span
+
+DEFAULT_ROUNDS = 12
+
+_lock = threading.Lock()
+_executor = None
+_rounds = DEFAULT_ROUNDS
+
+
+def pool_size(workers):
+    """Pool threads for a HASH_WORKERS setting: None is half the CPUs, 0 hashes inline."""
+    return max(1, (os.cpu_count() or 2) // 2) if workers is None else workers
+
+
+def init_hashing(app):
+    global _executor, _rounds
+    workers = pool_size(app.config.get('HASH_WORKERS'))
+    with _lock:
+        old, _executor = _executor, (ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+                                     if workers > 0 else None)
+        _rounds = app.config.get('BCRYPT_ROUNDS', DEFAULT_ROUNDS)
+    if old:
+        old.shutdown(wait=False)
+
+
+def _hash(secret, rounds):
+    return bcrypt.hashpw(secret.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(secret, hashed):
+    return bcrypt.checkpw(secret.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def _run_all(fn, arg_lists):
+    executor = _executor
+    with span('password_hashing'):
+        if executor is None:
+            return [fn(*args) for args in arg_lists]
+        return [f.result() for f in [executor.submit(fn, *args) for args in arg_lists]]
+
+
+def hash_secret(secret):
+    return hash_many([secret])[0]
+
+
+def hash_many(secrets):
+    """Hash several secrets concurrently on the pool; results keep input order."""
+    rounds = _rounds
+    return _run_all(_hash, [(s, rounds) for s in secrets])
+
+
+def verify_secret(secret, hashed):
+    return verify_many([(secret, hashed)])[0]
+
+
+def verify_many(pairs):
+    """Check several (secret, hash) pairs concurrently on the pool; results keep input order."""
+    return _run_all(_verify, pairs)
+
+
+def needs_rehash(hashed):
+    """True if `hashed` was made at a different cost than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed.split('$')[2]) != _rounds
+    except (AttributeError, IndexError, ValueError):
+        return True
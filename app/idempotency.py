@@ -0,0 +1,169 @@
+"""
+Idempotency-Key support for write endpoints (POST /api/bookings/).
+
+A client that retries after a timeout cannot tell whether the first attempt went
+through. If it sends the same Idempotency-Key header with each attempt, an endpoint
+decorated with @idempotent runs only once per (user, key). Repeats get the first
+response back, status and body, with Idempotent-Replayed: true, and the DB is not
+touched: the user comes from the token's claims, not a SELECT.
+
+A repeat that arrives while the first attempt is still running waits for it, up to
+IDEMPOTENCY_WAIT_MS, instead of racing it for the same seats. If the wait runs out
+it gets 409 with Retry-After. Responses below 500 are stored. A 5xx or an exception
+means nothing was written (e.g. a lock timeout), so the key is released and the next
+attempt runs for real. Reusing a key with a different body is answered with 422.
+
+Keys expire IDEMPOTENCY_TTL seconds after the first attempt. At most
+IDEMPOTENCY_MAX_KEYS are kept, and the oldest go first. Requests without the header
+are not affected.
+
+The store is in memory, not in the DB, so keys are lost when the server restarts. A
+single process keeps it itself. Under the prefork server it lives in the manager
+process that also holds seat holds (app.prefork), so a retry that lands on another
+worker still finds its key. There, each request with a key costs two round trips to
+the manager.
+"""
+import hashlib
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, request
+from app.utils import token_claims
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class _Entry:
+    __slots__ = ('token', 'fingerprint', 'expires', 'done', 'response')
+
+    def __init__(self, token, fingerprint, expires):
+        self.token = token
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.done = threading.Event()
+        self.response = None  # (status, body bytes, mimetype) once the first attempt finished
+
+
+class IdempotencyStore:
+    """
+    Keys in first-seen order, so the oldest (and first to expire) is always at the front.
+    Arguments and results are plain values, so it works the same through a manager proxy.
+    """
+
+    def __init__(self, maxsize, ttl, wait):
+        self.maxsize, self.ttl, self.wait = maxsize, ttl, wait
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._tokens = itertools.count(1)
+
+    def claim(self, key, fingerprint):
+        """
+        What to do with a request for `key`: ('run', token) when the caller now runs it,
+        ('replay', response), ('mismatch', None) for a different body under the same key, or
+        ('in_progress', None) when the first attempt is still running after `wait` seconds.
+        """
+        deadline = time.monotonic() + self.wait
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is None or entry.expires <= now:
+                    return 'run', self._start(key, fingerprint, now)
+                if entry.fingerprint != fingerprint:
+                    return 'mismatch', None
+                if entry.response is not None:
+                    return 'replay', entry.response
+            # Finished or abandoned either way once it is set; look again
+            if not entry.done.wait(max(0.0, deadline - now)):
+                return 'in_progress', None
+
+    def _start(self, key, fingerprint, now):
+        self._data.pop(key, None)
+        entry = self._data[key] = _Entry(next(self._tokens), fingerprint, now + self.ttl)
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if len(self._data) <= self.maxsize and oldest.expires > now:
+                break
+            self._data.popitem(last=False)
+        return entry.token
+
+    def _owned(self, key, token):
+        entry = self._data.get(key)
+        return entry if entry is not None and entry.token == token else None
+
+    def finish(self, key, token, response):
+        with self._lock:
+            entry = self._owned(key, token)
+            if entry is not None:
+                entry.response = response
+                entry.done.set()
+
+    def abandon(self, key, token):
+        """Forget `key` without a result; waiting repeats then compete to run it again."""
+        with self._lock:
+            entry = self._owned(key, token)
+            if entry is not None:
+                del self._data[key]
+                entry.done.set()
+
+
+def settings(config):
+    """IdempotencyStore arguments from the app config."""
+    return (config.get('IDEMPOTENCY_MAX_KEYS', 20000), config.get('IDEMPOTENCY_TTL', 3600),
+            config.get('IDEMPOTENCY_WAIT_MS', 5000) / 1000.0)
+
+
+def init_idempotency(app):
+    app.extensions['idempotency'] = IdempotencyStore(*settings(app.config))
+
+
+def _count(outcome):
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.idempotency.inc((request.endpoint, outcome))
+
+
+def idempotent(fn):
+    """Run the view once per (user, Idempotency-Key) and replay its response to repeats."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        store = current_app.extensions.get('idempotency')
+        key = request.headers.get(HEADER)
+        if store is None or key is None:
+            return fn(*args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+        sub = token_claims().get('sub')
+        if sub is None:
+            return fn(*args, **kwargs)  # the view answers 401
+        scope = (request.endpoint, str(sub), key)
+        fingerprint = hashlib.sha256(request.get_data()).digest()
+        state, result = store.claim(scope, fingerprint)
+        if state == 'mismatch':
+            _count('mismatch')
+            return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+        if state == 'in_progress':
+            _count('in_progress')
+            return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409, \
+                {'Retry-After': '1'}
+        if state == 'replay':
+            _count('replayed')
+            status, body, mimetype = result
+            return current_app.response_class(body, status=status, mimetype=mimetype,
+                                              headers={'Idempotent-Replayed': 'true'})
+        try:
+            resp = current_app.make_response(fn(*args, **kwargs))
+        except BaseException:
+            store.abandon(scope, result)
+            raise
+        if resp.status_code >= 500 or resp.is_streamed:
+            store.abandon(scope, result)
+        else:
+            store.finish(scope, result, (resp.status_code, resp.get_data(), resp.mimetype))
+            _count('stored')
+        return resp
+    return wrapper
@@ -0,0 +1,100 @@
+"""
+Seat inventory as conditional UPDATEs, and balance movements through the ledger.
+
+Each seat write re-checks its own precondition (enough seats) in the WHERE clause, and
+debits check the balance under the user's lock (app.ledger), so two concurrent bookings
+can never both pass a check made in Python and oversell a flight or overdraw a
+customer. Callers own the transaction: run these inside one and commit or roll back
+as a unit.
+"""
+import json
+from collections import defaultdict
+from app import db, ledger
+from app.models import Booking, Flight
+
+TRAVEL_CLASSES = ('economy', 'business')
+
+
+class InventoryConflict(Exception):
+    """Seats or balance ran out between reading and writing. `details` is merged into the 409 body."""
+
+    def __init__(self, message, **details):
+        super().__init__(message)
+        self.message = message
+        self.details = details
+
+    def to_dict(self):
+        return {'error': self.message, **self.details}
+
+
+def _seat_column(travel_class):
+    return Flight.economy_seats if travel_class == 'economy' else Flight.business_seats
+
+
+def _update(stmt):
+    return db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount
+
+
+def reserve_seats(flight_id, travel_class, count):
+    col = _seat_column(travel_class)
+    if _update(db.update(Flight).where(Flight.id == flight_id, col >= count).values({col: col - count})) != 1:
+        avail = db.session.query(col).filter(Flight.id == flight_id).scalar() or 0
+        raise InventoryConflict(f'Not enough seats. Only {avail} available.', available=avail)
+
+
+def debit_balance(user_id, amount, booking_id=None):
+    """Returns the new balance in INR."""
+    try:
+        return ledger.from_paise(ledger.debit(user_id, ledger.to_paise(amount), ledger.BOOKING, booking_id))
+    except ledger.InsufficientBalance as e:
+        raise InventoryConflict('Insufficient balance', required=amount, balance=ledger.from_paise(e.balance_paise))
+
+
+def book(booking, seats=None, hold=None):
+    """
+    Reserve seats, assign them on the seat map, debit the customer and add `booking`,
+    all in the caller's transaction, and return the customer's new balance.
+    `seats`/`hold` pick specific seats (see seatmap.assign).
+    """
+    from app import seatmap
+    reserve_seats(booking.flight_id, booking.travel_class, booking.num_passengers)
+    labels = seatmap.assign(booking.flight_id, booking.travel_class, booking.num_passengers, seats, hold)
+    booking.seats = json.dumps(labels)
+    db.session.add(booking)
+    db.session.flush()  # the ledger entry records the booking's id
+    return debit_balance(booking.user_id, booking.total_amount, booking.id)
+
+
+CANCEL_COLUMNS = (Booking.id, Booking.user_id, Booking.flight_id, Booking.travel_class, Booking.num_passengers,
+                  Booking.total_amount, Booking.seats)
+
+
+def cancel_bookings(rows, restore_seats=True):
+    """
+    Refund and delete bookings (rows of CANCEL_COLUMNS), in the caller's transaction, and
+    return the amount refunded in paise. The work is set-based: one ledger insert for all
+    the refunds, one UPDATE per flight for the seat counts, one seat map write per cabin
+    and one DELETE. Pass restore_seats=False when the flights are being deleted anyway.
+    """
+    from app import seatmap
+    if not rows:
+        return 0
+    refunds = [(r.user_id, ledger.to_paise(r.total_amount), r.id) for r in rows]
+    ledger.post_many(refunds, ledger.REFUND)
+    if restore_seats:
+        seats, labels = defaultdict(lambda: {'economy': 0, 'business': 0}), defaultdict(list)
+        for r in rows:
+            cabin = 'economy' if r.travel_class == 'economy' else 'business'
+            seats[r.flight_id][cabin] += r.num_passengers
+            labels[(r.flight_id, cabin)].append(r.seats)
+        flights = Flight.__table__
+        db.session.execute(
+            db.update(flights).where(flights.c.id == db.bindparam('fid'))
+            .values(economy_seats=flights.c.economy_seats + db.bindparam('economy'),
+                    business_seats=flights.c.business_seats + db.bindparam('business')),
+            [{'fid': fid, **counts} for fid, counts in seats.items()])
+        for (fid, cabin), seat_lists in labels.items():
+            seatmap.release(fid, cabin, *seat_lists)
+    db.session.execute(db.delete(Booking).where(Booking.id.in_([r.id for r in rows])),
+                       execution_options={'synchronize_session': False})
+    return sum(paise for _, paise, _ in refunds)
@@ -0,0 +1,241 @@
+"""
+Customer balances as an append-only ledger.
+
+Every movement of money is a LedgerEntry in integer paise. The kinds are 'opening'
+when an account is created, 'booking' (negative) and 'refund' for bookings,
+'adjustment' for admin edits and 'closing', which zeroes a deleted user's balance. No
+row is ever updated or deleted, so the history is complete and exact, and a booking
+inserts one row instead of rewriting the customer's users row. User ids are never
+reused (sqlite_autoincrement), so a new account can't inherit an old one's entries.
+
+A balance is the user's BalanceSnapshot plus the entries after its last_entry_id,
+which is one range scan on (user_id, id). snapshot() rolls the snapshots forward;
+run it periodically (flask --app run ledger-snapshot) so that scan stays short.
+reconcile() (flask --app run ledger-reconcile) checks three things:
+- each snapshot against the entries it covers
+- each booking's entries against its amount (live or archived)
+- that no balance is negative
+
+debit() checks the balance and inserts in the caller's transaction. It first locks the
+user row with SELECT ... FOR UPDATE (a lock, not a write), so two debits for one user
+can't both pass the check. Every other write path takes the same lock, so a user's
+entries commit in id order. SQLite has no row locks, but it runs one writer at a time,
+and bookings hold the write lock by the time they debit (inventory.book reserves seats
+first).
+"""
+from datetime import datetime
+from app import db
+from app.engine import begin_write
+from app.models import BalanceSnapshot, Booking, LedgerEntry, User, bookings_archive
+
+OPENING, BOOKING, REFUND, ADJUSTMENT, CLOSING = 'opening', 'booking', 'refund', 'adjustment', 'closing'
+SNAPSHOT_CHUNK = 1000  # users per snapshot transaction
+
+
+class InsufficientBalance(Exception):
+    def __init__(self, balance_paise):
+        super().__init__('Insufficient balance')
+        self.balance_paise = balance_paise
+
+
+def to_paise(amount):
+    return int(round(amount * 100))
+
+
+def from_paise(paise):
+    return paise / 100
+
+
+def balance_paise(user_id):
+    snap = db.select(BalanceSnapshot).where(BalanceSnapshot.user_id == user_id)
+    after = db.func.coalesce(snap.with_only_columns(BalanceSnapshot.last_entry_id).scalar_subquery(), 0)
+    delta = db.select(db.func.sum(LedgerEntry.amount_paise)) \
+        .where(LedgerEntry.user_id == user_id, LedgerEntry.id > after).scalar_subquery()
+    base = snap.with_only_columns(BalanceSnapshot.balance_paise).scalar_subquery()
+    return int(db.session.scalar(db.select(db.func.coalesce(base, 0) + db.func.coalesce(delta, 0))))
+
+
+def balances_paise(user_ids):
+    """{user_id: balance in paise} for many users in two queries; users with no entries are left out."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    result = {uid: int(b) for uid, b in db.session.execute(
+        db.select(BalanceSnapshot.user_id, BalanceSnapshot.balance_paise)
+        .where(BalanceSnapshot.user_id.in_(user_ids)))}
+    deltas = db.session.execute(
+        db.select(LedgerEntry.user_id, db.func.sum(LedgerEntry.amount_paise))
+        .outerjoin(BalanceSnapshot, BalanceSnapshot.user_id == LedgerEntry.user_id)
+        .where(LedgerEntry.user_id.in_(user_ids),
+               LedgerEntry.id > db.func.coalesce(BalanceSnapshot.last_entry_id, 0))
+        .group_by(LedgerEntry.user_id))
+    for uid, delta in deltas:
+        result[uid] = result.get(uid, 0) + int(delta)
+    return result
+
+
+def post(user_id, paise, kind, booking_id=None):
+    """Append an entry in the caller's transaction."""
+    db.session.add(LedgerEntry(user_id=user_id, amount_paise=paise, kind=kind, booking_id=booking_id))
+
+
+def post_many(entries, kind):
+    """Append (user_id, paise, booking_id) entries of one kind with a single INSERT, under the users' locks."""
+    lock_many({uid for uid, _, _ in entries})
+    now = datetime.utcnow()
+    db.session.execute(db.insert(LedgerEntry), [
+        {'user_id': uid, 'amount_paise': paise, 'kind': kind, 'booking_id': booking_id, 'created_at': now}
+        for uid, paise, booking_id in entries])
+
+
+def lock(user_id):
+    """Hold the user's row lock until the transaction ends (no-op on SQLite, see above)."""
+    if db.session.get_bind().dialect.name != 'sqlite':
+        db.session.execute(db.select(User.id).where(User.id == user_id).with_for_update())
+
+
+def lock_many(user_ids):
+    """lock() for several users, taken in id order so two callers can't deadlock."""
+    if user_ids and db.session.get_bind().dialect.name != 'sqlite':
+        db.session.execute(db.select(User.id).where(User.id.in_(sorted(user_ids)))
+                           .order_by(User.id).with_for_update())
+
+
+def debit(user_id, paise, kind=BOOKING, booking_id=None):
+    """Take `paise` from the user, or raise InsufficientBalance. Returns the new balance in paise."""
+    lock(user_id)
+    balance = balance_paise(user_id)
+    if balance < paise:
+        raise InsufficientBalance(balance)
+    post(user_id, -paise, kind, booking_id)
+    return balance - paise
+
+
+def open_account(user, amount):
+    """Opening balance for a new user, in the caller's transaction (flushes to get the user's id)."""
+    if user.id is None:
+        db.session.flush()
+    post(user.id, to_paise(amount), OPENING)
+
+
+def set_balance(user_id, amount):
+    """
+    Adjust the user's balance to `amount` INR with one adjustment entry. Starts the caller's
+    transaction with the write lock, so no debit can commit between the read and the entry.
+    """
+    begin_write(db.session)
+    lock(user_id)
+    diff = to_paise(amount) - balance_paise(user_id)
+    if diff:
+        post(user_id, diff, ADJUSTMENT)
+
+
+def close_account(user_id):
+    """Zero a deleted user's balance with a closing entry, in the caller's transaction; the history stays."""
+    lock(user_id)
+    balance = balance_paise(user_id)
+    if balance:
+        post(user_id, -balance, CLOSING)
+
+
+def snapshot(chunk_size=SNAPSHOT_CHUNK):
+    """
+    Roll each user's snapshot forward to their newest entry and return how many were
+    updated. Users are done `chunk_size` at a time, one transaction each, from after that
+    user's own last_entry_id. Entries are only posted under their user's lock (held to
+    commit) and the chunk takes the same locks first (on SQLite, the write lock), so no
+    entry of theirs is still in flight: none can commit later with an id below the new
+    last_entry_id and be skipped.
+    """
+    users = User.__table__
+    updated, after = 0, 0
+    while True:
+        try:
+            begin_write(db.session)
+            user_ids = db.session.scalars(db.select(users.c.id).where(users.c.id > after)
+                                          .order_by(users.c.id).limit(chunk_size)).all()
+            lock_many(user_ids)
+            # A range rather than IN, so the entries of deleted users in between are covered too
+            last = user_ids[-1] if len(user_ids) == chunk_size else None
+            in_range = LedgerEntry.user_id > after if last is None else LedgerEntry.user_id.between(after + 1, last)
+            rows = db.session.execute(
+                db.select(LedgerEntry.user_id, db.func.sum(LedgerEntry.amount_paise), db.func.max(LedgerEntry.id))
+                .outerjoin(BalanceSnapshot, BalanceSnapshot.user_id == LedgerEntry.user_id)
+                .where(in_range, LedgerEntry.id > db.func.coalesce(BalanceSnapshot.last_entry_id, 0))
+                .group_by(LedgerEntry.user_id)).all()
+            snaps = {s.user_id: s for s in BalanceSnapshot.query.filter(
+                BalanceSnapshot.user_id.in_([uid for uid, _, _ in rows]))} if rows else {}
+            now = datetime.utcnow()
+            for uid, delta, top in rows:
+                snap = snaps.get(uid)
+                if snap is None:
+                    db.session.add(BalanceSnapshot(user_id=uid, balance_paise=int(delta), last_entry_id=top,
+                                                   taken_at=now))
+                else:
+                    snap.balance_paise, snap.last_entry_id, snap.taken_at = \
+                        int(snap.balance_paise) + int(delta), top, now
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        updated += len(rows)
+        if last is None:
+            return updated
+        after = last
+
+
+def reconcile():
+    """Check the ledger; returns counts and a list of problems (empty when everything adds up)."""
+    problems = []
+    covered = db.session.execute(
+        db.select(BalanceSnapshot.user_id, BalanceSnapshot.balance_paise,
+                  db.func.coalesce(db.func.sum(LedgerEntry.amount_paise), 0))
+        .outerjoin(LedgerEntry, db.and_(LedgerEntry.user_id == BalanceSnapshot.user_id,
+                                        LedgerEntry.id <= BalanceSnapshot.last_entry_id))
+        .group_by(BalanceSnapshot.user_id, BalanceSnapshot.balance_paise))
+    for uid, snap, total in covered:
+        if int(snap) != int(total):
+            problems.append(f'user {uid}: snapshot {from_paise(int(snap))} != entries {from_paise(int(total))}')
+
+    # An archived booking (app.archive) was paid for like a live one
+    total_amount = db.func.coalesce(Booking.total_amount, bookings_archive.c.total_amount)
+    per_booking = db.session.execute(
+        db.select(LedgerEntry.booking_id, db.func.sum(LedgerEntry.amount_paise), total_amount)
+        .outerjoin(Booking, Booking.id == LedgerEntry.booking_id)
+        .outerjoin(bookings_archive, bookings_archive.c.id == LedgerEntry.booking_id)
+        .where(LedgerEntry.booking_id.isnot(None))
+        .group_by(LedgerEntry.booking_id, total_amount))
+    bookings = 0
+    for booking_id, net, total in per_booking:
+        bookings += 1
+        # A live booking has been paid for; a cancelled (deleted) one has been refunded in full
+        expected = -to_paise(total) if total is not None else 0
+        if int(net) != expected:
+            problems.append(f'booking {booking_id}: entries net {from_paise(int(net))}, expected {from_paise(expected)}')
+
+    per_user = db.session.execute(db.select(LedgerEntry.user_id, db.func.sum(LedgerEntry.amount_paise))
+                                  .group_by(LedgerEntry.user_id)).all()
+    for uid, total in per_user:
+        if int(total) < 0:
+            problems.append(f'user {uid}: negative balance {from_paise(int(total))}')
+    entries = db.session.query(db.func.count(LedgerEntry.id)).scalar()
+    return {'entries': entries, 'users': len(per_user), 'bookings': bookings, 'problems': problems}
+
+
+def import_legacy_balances():
+    """
+    Opening entries from the users.balance column of a database created before the ledger,
+    for customers that have none yet. Returns the number of accounts opened.
+    """
+    if 'balance' not in {c['name'] for c in db.inspect(db.engine).get_columns('users')}:
+        return 0
+    rows = db.session.execute(db.text(
+        "SELECT id, balance FROM users WHERE role = 'customer' "
+        'AND id NOT IN (SELECT DISTINCT user_id FROM ledger_entries)')).all()
+    if rows:
+        now = datetime.utcnow()
+        db.session.execute(db.insert(LedgerEntry), [
+            {'user_id': uid, 'amount_paise': to_paise(balance or 0), 'kind': OPENING, 'created_at': now}
+            for uid, balance in rows])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,278 @@
+"""
+Request-level performance metrics, served as Prometheus text at /metrics.
+
+For every request it records the wall time, the number of SQL statements and the time
+spent in them, labelled by blueprint and endpoint. It also records time in named
+spans such as password hashing (see app.hashing), so a slow login can be split into
+bcrypt, SQL and everything else. SQL timing comes from before/after_cursor_execute
+listeners on the app's engines. Statements slower than SLOW_QUERY_MS are logged with
+their first application call site. Lock timeouts and other DB errors are counted.
+
+Per-request state lives in a thread-local. Recording costs a few perf_counter() calls
+and one short lock per request or statement.
+
+The numbers are not shared between worker processes. Under the prefork server each
+worker counts only the requests it served, and a scrape of /metrics is answered by
+whichever worker accepts the connection. A scrape therefore shows one worker's share,
+and since consecutive scrapes can come from different workers, counters jump back and
+forth, which Prometheus reads as resets. Run a single worker (WEB_CONCURRENCY=1) when
+the metrics are needed.
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+from flask import current_app, request
+from sqlalchemy import event
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+PREFIX = 'speed_'
+
+_local = threading.local()
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_LIB_DIR = os.path.dirname(os.__file__)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = PREFIX + name, help, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}{_labels(self.labels, labels)} {_num(value)}'
+
+
+class Histogram:
+    """Fixed-bucket histogram per label set; bucket counts are kept non-cumulative and summed on render."""
+
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = PREFIX + name, help, labels, buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = sorted((labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items())
+        for labels, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _num(bound)
+                yield f'{self.name}_bucket{_labels(self.labels + ("le",), labels + (le,))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {_num(total)}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {n}'
+
+
+class Gauge:
+    """Current values read at render time from `read()`, a function returning {label values: number}."""
+
+    def __init__(self, name, help, labels=(), read=None):
+        self.name, self.help, self.labels = PREFIX + name, help, labels
+        self.read = read or dict
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} gauge'
+        for labels, value in sorted(self.read().items()):
+            yield f'{self.name}{_labels(self.labels, labels)} {_num(value)}'
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(names, escaped)) + '}'
+
+
+class Metrics:
+    def __init__(self, slow_query_seconds):
+        self.slow_query_seconds = slow_query_seconds
+        self.requests = Counter('http_requests_total', 'Requests served.', ('blueprint', 'endpoint', 'method', 'status'))
+        self.duration = Histogram('http_request_duration_seconds', 'Request wall time.', ('blueprint', 'endpoint'))
+        self.sql_per_request = Histogram('http_request_sql_statements', 'SQL statements executed per request.',
+                                         ('blueprint', 'endpoint'), COUNT_BUCKETS)
+        self.sql_time_per_request = Histogram('http_request_sql_duration_seconds', 'Time in SQL per request.',
+                                              ('blueprint', 'endpoint'))
+        self.span_per_request = Counter('http_request_span_seconds_total',
+                                        'Time in named spans (e.g. password_hashing) by endpoint.',
+                                        ('blueprint', 'endpoint', 'span'))
+        self.spans = Histogram('span_duration_seconds', 'Duration of named spans.', ('span',))
+        self.sql_statements = Counter('sql_statements_total', 'SQL statements executed, in or out of requests.')
+        self.sql_seconds = Counter('sql_seconds_total', 'Time spent executing SQL statements.')
+        self.slow_queries = Counter('sql_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.')
+        self.db_errors = Counter('sql_errors_total', 'DB errors by kind (locked = lock wait timed out).', ('kind',))
+        self.booking_batches = Histogram('booking_batch_size', 'Bookings per group commit (BOOKING_PIPELINE).',
+                                         buckets=COUNT_BUCKETS)
+        self.admission_rejected = Counter('admission_rejected_total', 'Requests shed by admission control.',
+                                          ('endpoint', 'reason'))
+        self.admission_wait = Histogram('admission_queue_seconds', 'Time admitted requests waited for a slot.',
+                                        ('endpoint',))
+        self.admission_active = Gauge('admission_active', 'Requests holding a concurrency slot.', ('limit',))
+        self.admission_queued = Gauge('admission_queued', 'Requests waiting for a concurrency slot.', ('limit',))
+        self.idempotency = Counter('idempotency_requests_total',
+                                   'Requests with an Idempotency-Key by outcome (stored, replayed, ...).',
+                                   ('endpoint', 'outcome'))
+        self.all = [self.requests, self.duration, self.sql_per_request, self.sql_time_per_request,
+                    self.span_per_request, self.spans, self.sql_statements, self.sql_seconds,
+                    self.slow_queries, self.db_errors, self.booking_batches, self.admission_rejected,
+                    self.admission_wait, self.admission_active, self.admission_queued, self.idempotency]
+
+    def render(self, startup_seconds):
+        lines = [f'# HELP {PREFIX}startup_seconds Time create_app() took.',
+                 f'# TYPE {PREFIX}startup_seconds gauge',
+                 f'{PREFIX}startup_seconds {_num(float(startup_seconds))}']
+        for metric in self.all:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class _RequestStats:
+    __slots__ = ('start', 'sql_count', 'sql_time', 'spans', 'status')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.spans = {}
+        self.status = 500
+
+
+class span:
+    """Time a block as a named span: `with metrics.span('password_hashing'): ...`."""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        m = getattr(_local, 'metrics', None) or _default
+        if m is not None:
+            m.spans.observe((self.name,), elapsed)
+        stats = getattr(_local, 'request', None)
+        if stats is not None:
+            stats.spans[self.name] = stats.spans.get(self.name, 0.0) + elapsed
+        return False
+
+
+_default = None  # Metrics of the most recently created app, for spans outside a request
+
+
+def _call_site():
+    """
+    First frame in application code outside this module, as 'path:line in function';
+    failing that (scripts, CLI), the innermost frame outside the stdlib and site-packages.
+    """
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and filename != __file__:
+            return f'{os.path.relpath(filename, os.path.dirname(_APP_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}'
+        if fallback is None and not filename.startswith(_LIB_DIR) and 'site-packages' not in filename:
+            fallback = f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+
+def init_metrics(app):
+    global _default
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    m = _default = app.extensions['metrics'] = Metrics(app.config.get('SLOW_QUERY_MS', 100) / 1000.0)
+    logger = app.logger
+
+    from app import db
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        m.sql_statements.inc()
+        m.sql_seconds.inc(amount=elapsed)
+        stats = getattr(_local, 'request', None)
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_time += elapsed
+        if elapsed >= m.slow_query_seconds:
+            m.slow_queries.inc()
+            logger.warning('Slow query (%.1f ms) at %s: %s', elapsed * 1000, _call_site(), ' '.join(statement.split())[:500])
+
+    def _db_error(context):
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+        message = str(context.original_exception).lower()
+        m.db_errors.inc(('locked' if 'locked' in message else type(context.original_exception).__name__,))
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_execute)
+        event.listen(engine, 'after_cursor_execute', _after_execute)
+        event.listen(engine, 'handle_error', _db_error)
+
+    @app.before_request
+    def _start_request():
+        _local.metrics = m
+        _local.request = _RequestStats()
+
+    @app.after_request
+    def _record_status(response):
+        stats = getattr(_local, 'request', None)
+        if stats is not None:
+            stats.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        stats = getattr(_local, 'request', None)
+        _local.request = None
+        if stats is None:
+            return
+        labels = (request.blueprint or '', request.endpoint or 'unmatched')
+        m.duration.observe(labels, time.perf_counter() - stats.start)
+        m.requests.inc(labels + (request.method, str(stats.status)))
+        m.sql_per_request.observe(labels, stats.sql_count)
+        m.sql_time_per_request.observe(labels, stats.sql_time)
+        for name, seconds in stats.spans.items():
+            m.span_per_request.inc(labels + (name,), seconds)
+
+    @app.route('/metrics')
+    def metrics():
+        return current_app.response_class(m.render(current_app.extensions.get('startup_seconds', 0)),
+                                          mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,135 @@
+"""
+In-place upgrade for databases created before the current flights, bookings and users schema.
+
+db.create_all() (flask --app run init-db) adds missing tables, but it never changes a
+table that already exists. migrate() brings the original tables up to the models:
+
+- flights.source_key / destination_key are added and backfilled in chunks with
+  models.normalize_place, the normalizer the app writes them with.
+- Flight, Booking and User use sqlite_autoincrement, so ids are never reused after
+  archiving, cancelling or deleting (SQLite only). That is part of CREATE TABLE, so each
+  table is rebuilt from the model's DDL in one transaction. Its id sequence then starts
+  after the highest id in use: in either tier, or for users, in the ledger. The users
+  rebuild drops the old users.balance column, so ledger accounts are opened from it
+  first (what ledger-migrate does).
+- Indexes declared on flights and bookings are created where missing.
+
+Every step checks the live schema first, so a second run (or one after an interrupted
+run) only does what is left. Run it before anything else touches such a database:
+
+    flask --app run schema-migrate
+    flask --app run ledger-migrate
+"""
+from sqlalchemy.schema import CreateTable
+from app import db, ledger
+from app.engine import begin_write
+from app.models import Booking, Flight, LedgerEntry, User, bookings_archive, flights_archive, normalize_place
+
+BACKFILL_CHUNK = 5000
+PLACE_KEYS = (('source', 'source_key'), ('destination', 'destination_key'))
+
+
+def _is_sqlite():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def _columns(table):
+    return {c['name'] for c in db.inspect(db.engine).get_columns(table.name)}
+
+
+def add_place_keys():
+    """Add and backfill flights.source_key / destination_key; returns the number of flights backfilled."""
+    flights = Flight.__table__
+    missing = [key for _, key in PLACE_KEYS if key not in _columns(flights)]
+    for key in missing:
+        column_type = flights.c[key].type.compile(db.engine.dialect)
+        # SQLite only adds a NOT NULL column with a default; the autoincrement rebuild drops it again
+        default = " NOT NULL DEFAULT ''" if _is_sqlite() else ''
+        db.session.execute(db.text(f'ALTER TABLE flights ADD COLUMN {key} {column_type}{default}'))
+    db.session.commit()
+
+    unset = db.or_(*(db.func.coalesce(flights.c[key], '') == '' for _, key in PLACE_KEYS))
+    update = flights.update().where(flights.c.id == db.bindparam('b_id')) \
+        .values({key: db.bindparam(f'b_{key}') for _, key in PLACE_KEYS})
+    done, last_id = 0, 0
+    while True:
+        rows = db.session.execute(
+            db.select(flights.c.id, *(flights.c[name] for name, _ in PLACE_KEYS))
+            .where(flights.c.id > last_id, unset).order_by(flights.c.id).limit(BACKFILL_CHUNK)).all()
+        if not rows:
+            break
+        db.session.execute(update, [
+            {'b_id': row.id, **{f'b_{key}': normalize_place(getattr(row, name)) for name, key in PLACE_KEYS}}
+            for row in rows])
+        db.session.commit()
+        done += len(rows)
+        last_id = rows[-1].id
+    if missing and not _is_sqlite():
+        for key in missing:
+            db.session.execute(db.text(f'ALTER TABLE flights ALTER COLUMN {key} SET NOT NULL'))
+        db.session.commit()
+    return done
+
+
+def rebuild_autoincrement(table, used):
+    """
+    Recreate `table` with AUTOINCREMENT (SQLite) and copy its rows over; False if there was
+    nothing to do. The sequence continues after the highest id in `table` or column `used`.
+    """
+    if not _is_sqlite():
+        return False
+    sql = db.session.execute(db.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                             {'name': table.name}).scalar()
+    if sql is None or 'AUTOINCREMENT' in sql.upper():
+        return False
+    new = f'{table.name}_new'
+    ddl = str(CreateTable(table).compile(dialect=db.engine.dialect)).strip()
+    ddl = ddl.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE {new} ', 1)
+    columns = ', '.join(c.name for c in table.columns)
+    try:
+        begin_write(db.session)
+        db.session.execute(db.text(f'DROP TABLE IF EXISTS {new}'))
+        db.session.execute(db.text(ddl))
+        db.session.execute(db.text(f'INSERT INTO {new} ({columns}) SELECT {columns} FROM {table.name}'))
+        # Foreign keys from other tables name the table, so they hold again after the rename
+        db.session.execute(db.text(f'DROP TABLE {table.name}'))
+        db.session.execute(db.text(f'ALTER TABLE {new} RENAME TO {table.name}'))
+        top = max(db.session.scalar(db.select(db.func.coalesce(db.func.max(c), 0))) for c in (table.c.id, used))
+        db.session.execute(db.text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table.name})
+        db.session.execute(db.text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                           {'name': table.name, 'seq': top})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return True
+
+
+def create_indexes():
+    """Create the indexes declared on flights and bookings that the database lacks; returns their names."""
+    created = []
+    for table in (Flight.__table__, Booking.__table__):
+        existing = {ix['name'] for ix in db.inspect(db.engine).get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+
+def migrate():
+    """Run every step; returns a line per step that changed something."""
+    done = []
+    db.create_all()
+    backfilled = add_place_keys()
+    if backfilled:
+        done.append(f'flights: place keys backfilled on {backfilled} rows')
+    opened = ledger.import_legacy_balances()
+    if opened:
+        done.append(f'ledger: {opened} accounts opened from users.balance')
+    for table, used in ((Flight.__table__, flights_archive.c.id), (Booking.__table__, bookings_archive.c.id),
+                        (User.__table__, LedgerEntry.user_id)):
+        if rebuild_autoincrement(table, used):
+            done.append(f'{table.name}: rebuilt with AUTOINCREMENT ids')
+    done.extend(f'index {name} created' for name in create_indexes())
+    return done
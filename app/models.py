@@ -1,6 +1,13 @@
+import json
 from datetime import datetime
-from app import db
-import bcrypt
+from sqlalchemy.orm import validates
+from app import db, hashing
+
+
+def normalize_place(name):
+    """Search key for a city/airport name: trimmed, single-spaced, lower-case."""
+    return ' '.join((name or '').split()).lower()
+
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -8,7 +15,6 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # 'admin' or 'customer'
-    balance = db.Column(db.Float, default=0)  # INR for customers
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Security questions (for customers)
@@ -18,15 +24,27 @@ class User(db.Model):
     a1_hash = db.Column(db.String(128))
     a2_hash = db.Column(db.String(128))
     a3_hash = db.Column(db.String(128))
+
+    # Ids are never reused, so a new account can't pick up a deleted one's ledger history
+    __table_args__ = {'sqlite_autoincrement': True}
     
+    @property
+    def balance(self):
+        """Current balance in INR, from the ledger (app.ledger). Change it through the ledger too."""
+        from app import ledger
+        return ledger.from_paise(ledger.balance_paise(self.id)) if self.id is not None else 0.0
+
     def set_password(self, password):
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = hashing.hash_secret(password)
     
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return hashing.verify_secret(password, self.password_hash)
+
+    def password_needs_rehash(self):
+        return hashing.needs_rehash(self.password_hash)
     
     def set_answer(self, idx, answer):
-        h = bcrypt.hashpw(answer.strip().lower().encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        h = hashing.hash_secret(answer.strip().lower())
         if idx == 1: self.a1_hash = h
         elif idx == 2: self.a2_hash = h
         else: self.a3_hash = h
@@ -34,7 +52,19 @@ class User(db.Model):
     def check_answer(self, idx, answer):
         h = getattr(self, f'a{idx}_hash')
         if not h: return False
-        return bcrypt.checkpw(answer.strip().lower().encode('utf-8'), h.encode('utf-8'))
+        return hashing.verify_secret(answer.strip().lower(), h)
+
+    def set_credentials(self, password, answers):
+        """Hash the password and the three security answers in parallel."""
+        hashes = hashing.hash_many([password] + [a.strip().lower() for a in answers])
+        self.password_hash, self.a1_hash, self.a2_hash, self.a3_hash = hashes
+
+    def check_answers(self, answers):
+        """True if all three security answers match; the checks run in parallel."""
+        stored = [self.a1_hash, self.a2_hash, self.a3_hash]
+        if not all(stored):
+            return False
+        return all(hashing.verify_many([(a.strip().lower(), h) for a, h in zip(answers, stored)]))
     
     def to_dict(self):
         d = {'id': self.id, 'username': self.username, 'role': self.role, 'created_at': self.created_at.isoformat() if self.created_at else None}
@@ -59,6 +89,21 @@ class Flight(db.Model):
     economy_seats = db.Column(db.Integer, default=60)
     business_seats = db.Column(db.Integer, default=20)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Normalized copies of source/destination so searches can use an index instead of ilike scans
+    source_key = db.Column(db.String(100), nullable=False)
+    destination_key = db.Column(db.String(100), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_flights_route_departure', 'source_key', 'destination_key', 'departure_time'),
+        db.Index('ix_flights_departure_time', 'departure_time'),
+        # Ids are never reused, so an archived flight's id stays unique across both tiers
+        {'sqlite_autoincrement': True},
+    )
+
+    @validates('source', 'destination')
+    def _sync_place_key(self, key, value):
+        setattr(self, f'{key}_key', normalize_place(value))
+        return value
     
     def to_dict(self):
         return {
@@ -90,8 +135,17 @@ class Booking(db.Model):
     
     user = db.relationship('User', backref=db.backref('bookings', lazy=True))
     flight = db.relationship('Flight', backref=db.backref('bookings', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_bookings_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_bookings_created', 'created_at', 'id'),
+        db.Index('ix_bookings_flight', 'flight_id'),
+        # Ids are never reused: ledger entries and the archive refer to cancelled and archived ids
+        {'sqlite_autoincrement': True},
+    )
     
-    def to_dict(self):
+    def to_dict(self, with_flight=True):
+        """with_flight=False leaves 'flight' as None without loading the relationship."""
         return {
             'id': self.id, 'user_id': self.user_id, 'flight_id': self.flight_id,
             'trip_type': self.trip_type, 'travel_class': self.travel_class,
@@ -101,5 +155,109 @@ class Booking(db.Model):
             'seats': self.seats, 'meal_preference': self.meal_preference,
             'extra_baggage_kg': self.extra_baggage_kg, 'total_amount': self.total_amount,
             'status': self.status, 'created_at': self.created_at.isoformat() if self.created_at else None,
-            'flight': self.flight.to_dict() if self.flight else None
+            'flight': self.flight.to_dict() if with_flight and self.flight else None
         }
+
+
+def _archive_table(name, hot, *indexes):
+    """Cold-tier copy of `hot` (same columns, no foreign keys) plus archived_at. See app/archive.py."""
+    columns = [db.Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, autoincrement=False)
+               for c in hot.columns]
+    return db.Table(name, db.metadata, *columns,
+                    db.Column('archived_at', db.DateTime, nullable=False, default=datetime.utcnow), *indexes)
+
+
+flights_archive = _archive_table('flights_archive', Flight.__table__,
+                                 db.Index('ix_flights_archive_departure', 'departure_time'))
+bookings_archive = _archive_table('bookings_archive', Booking.__table__,
+                                  db.Index('ix_bookings_archive_user_created', 'user_id', 'created_at', 'id'),
+                                  db.Index('ix_bookings_archive_created', 'created_at', 'id'),
+                                  db.Index('ix_bookings_archive_flight', 'flight_id'))
+
+
+class FareCalendarDay(db.Model):
+    """Cheapest fares and seats left on one route on one departure day. Derived from flights; see app/fare_calendar.py."""
+    __tablename__ = 'fare_calendar'
+    source_key = db.Column(db.String(100), primary_key=True)
+    destination_key = db.Column(db.String(100), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    flights = db.Column(db.Integer, nullable=False)
+    economy_min_fare = db.Column(db.Float, nullable=True)  # over flights with seats left in the cabin; None if sold out
+    business_min_fare = db.Column(db.Float, nullable=True)
+    economy_seats = db.Column(db.Integer, nullable=False)
+    business_seats = db.Column(db.Integer, nullable=False)
+
+
+class SeatMap(db.Model):
+    """Packed seat bitmap for one cabin of one flight (bit set = seat taken). See app/seatmap.py."""
+    __tablename__ = 'seat_maps'
+    flight_id = db.Column(db.Integer, db.ForeignKey('flights.id', ondelete='CASCADE'), primary_key=True)
+    cabin = db.Column(db.String(20), primary_key=True)  # economy or business
+    first_row = db.Column(db.Integer, nullable=False)
+    letters = db.Column(db.String(10), nullable=False)  # seat letters across one row, e.g. ABCDEF
+    capacity = db.Column(db.Integer, nullable=False)
+    bitmap = db.Column(db.LargeBinary, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class LedgerEntry(db.Model):
+    """One balance movement, in integer paise (negative = debit). Rows are never updated. See app/ledger.py."""
+    __tablename__ = 'ledger_entries'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    amount_paise = db.Column(db.BigInteger, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # opening / booking / refund / adjustment / closing
+    booking_id = db.Column(db.Integer, nullable=True)  # no FK: cancelled bookings are deleted, entries stay
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_ledger_user_entry', 'user_id', 'id'),
+        db.Index('ix_ledger_booking', 'booking_id'),
+    )
+
+    def to_dict(self):
+        return {'id': self.id, 'user_id': self.user_id, 'amount': self.amount_paise / 100, 'kind': self.kind,
+                'booking_id': self.booking_id, 'created_at': self.created_at.isoformat() if self.created_at else None}
+
+
+class BalanceSnapshot(db.Model):
+    """A user's balance as of ledger entry `last_entry_id`; the balance is this plus later entries."""
+    __tablename__ = 'balance_snapshots'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    balance_paise = db.Column(db.BigInteger, nullable=False)
+    last_entry_id = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CancelJob(db.Model):
+    """Progress of one bulk cancellation (app/bulk_cancel.py), updated in each chunk's transaction."""
+    __tablename__ = 'cancel_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    selection = db.Column(db.Text, nullable=False)  # JSON: flight_ids, departure range or booking_ids
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / done / failed
+    total = db.Column(db.Integer, nullable=False, default=0)  # matching bookings when the job started
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    refunded_paise = db.Column(db.BigInteger, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id, 'selection': json.loads(self.selection), 'status': self.status,
+            'total': self.total, 'cancelled': self.cancelled, 'refunded': self.refunded_paise / 100,
+            'progress': round(self.cancelled / self.total, 4) if self.total else 1.0, 'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ScheduleVersion(db.Model):
+    """One row: bumped by flight writes made outside the server (flask commands); workers poll it (app/prefork.py)."""
+    __tablename__ = 'schedule_version'
+    id = db.Column(db.Integer, primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,191 @@
+"""
+Keeping preforked workers consistent (see gunicorn.conf.py).
+
+The app is created once in the server's master process and forked into workers, and
+each worker keeps its own response cache, route graph and connection index. Before
+forking, share_state() sets up what the workers have in common:
+
+- The response cache's version counters (app.cache), in shared memory. A flight
+  write in any worker bumps that flight's, its route's and the catalog counter for
+  all workers, which makes exactly the affected entries stale everywhere. Flight and
+  route counters are hashed into VERSION_SLOTS slots each; keys sharing a slot only
+  invalidate each other's entries now and then.
+- A `schedule` counter in shared memory, bumped when routes, times or fares change
+  (or flights come and go). At the start of each request, a worker that sees a bump
+  from another worker drops its route graph, connection index and place index. They
+  are rebuilt lazily from the DB.
+- Seat holds and Idempotency-Keys, which move into a manager process. A hold made
+  through one worker blocks those seats on all of them, and a retried booking is
+  deduplicated whichever worker it lands on.
+
+Flights written by another process, i.e. flask commands such as archive and
+seed-synthetic, can't reach shared memory. Those commands call publish_stored(),
+which bumps a generation stored in the DB (ScheduleVersion). Each worker reads it at
+most every SCHEDULE_POLL_MS and, when it moved, drops its response cache along with
+the indexes.
+
+after_fork() then gives each worker its own DB connections and bcrypt threads. The
+identity cache stays per worker; it is already bounded by IDENTITY_CACHE_TTL.
+"""
+import multiprocessing
+import time
+import zlib
+from datetime import datetime
+from multiprocessing.managers import BaseManager
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from app import db, idempotency, seatmap
+from app.engine import begin_write
+from app.models import ScheduleVersion
+from app.schedule import on_flight_change
+
+INVENTORY_FIELDS = {'economy_seats', 'business_seats'}
+VERSION_SLOTS = 65536  # shared response-cache counters, each for flights and for routes
+
+
+class SharedVersions:
+    """app.cache.VersionCounters in shared memory, for all workers at once."""
+
+    def __init__(self, slots=VERSION_SLOTS):
+        self._slots = slots
+        self._counts = multiprocessing.RawArray('q', 2 * slots + 1)  # flights, routes, catalog
+        self._lock = multiprocessing.Lock()
+
+    def _route_slot(self, route):
+        return self._slots + zlib.crc32('\0'.join(route).encode()) % self._slots
+
+    def flight(self, flight_id):
+        return self._counts[flight_id % self._slots]
+
+    def route(self, source_key, destination_key):
+        return self._counts[self._route_slot((source_key, destination_key))]
+
+    @property
+    def catalog(self):
+        return self._counts[-1]
+
+    def bump(self, flight_ids, routes):
+        slots = {flight_id % self._slots for flight_id in flight_ids} | {self._route_slot(r) for r in routes}
+        with self._lock:
+            for slot in slots:
+                self._counts[slot] += 1
+            self._counts[-1] += 1
+
+
+class _SharedManager(BaseManager):
+    pass
+
+
+_SharedManager.register('SeatHolds', seatmap.SeatHolds)
+_SharedManager.register('IdempotencyStore', idempotency.IdempotencyStore)
+
+_schedule = None  # shared Value: the schedule generation, created before fork
+_seen = 0         # schedule generation this worker has caught up with
+_stored = 0       # stored generation (ScheduleVersion) this worker has caught up with
+_poll_interval = 1.0
+_next_poll = 0.0
+_manager = None
+
+
+def share_state(app):
+    """Call in the master after loading the app and before forking workers."""
+    global _schedule, _manager, _poll_interval
+    _schedule = multiprocessing.Value('q', 0)
+    _poll_interval = app.config.get('SCHEDULE_POLL_MS', 1000) / 1000.0
+    app.extensions['response_cache'].versions = SharedVersions()
+    _manager = _SharedManager()
+    _manager.start()
+    seatmap.holds = _manager.SeatHolds()
+    app.extensions['idempotency'] = _manager.IdempotencyStore(*idempotency.settings(app.config))
+    app.before_request(_catch_up)
+
+
+def warm(app):
+    """Build the route graph, connection index and place index in the master so workers start with a copy."""
+    global _stored
+    from app.autocomplete import get_place_index
+    from app.connections import get_connection_index
+    from app.route_graph import get_route_graph
+    with app.app_context():
+        _stored = stored_generation()
+        get_route_graph()
+        get_connection_index()
+        get_place_index()
+        db.session.remove()
+
+
+def after_fork(app):
+    """Call first thing in each forked worker."""
+    from app.hashing import init_hashing
+    if _manager is not None:
+        # The holds manager is the master's child; without this the worker tries to join it on exit
+        multiprocessing.process._children.discard(_manager._process)
+    with app.app_context():
+        for engine in db.engines.values():
+            # Connections opened by the master must not be shared; drop them without closing
+            engine.dispose(close=False)
+    init_hashing(app)
+
+
+def shutdown():
+    if _manager is not None:
+        _manager.shutdown()
+
+
+def stored_generation():
+    return db.session.scalar(db.select(ScheduleVersion.generation).where(ScheduleVersion.id == 1)) or 0
+
+
+def publish_stored():
+    """Tell running workers that flights changed outside the server; they catch up within SCHEDULE_POLL_MS."""
+    try:
+        begin_write(db.session)
+        bumped = db.session.execute(
+            db.update(ScheduleVersion).where(ScheduleVersion.id == 1)
+            .values(generation=ScheduleVersion.generation + 1, updated_at=datetime.utcnow())).rowcount
+        if not bumped:
+            db.session.add(ScheduleVersion(id=1, generation=1))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+@on_flight_change
+def _publish(changes):
+    global _seen
+    if _schedule is None:
+        return
+    for before, after in changes:
+        if before is None or after is None or any(
+                getattr(before, k) != getattr(after, k) for k in before._fields if k not in INVENTORY_FIELDS):
+            break
+    else:
+        return  # seat counts only: the shared cache versions already cover them
+    with _schedule.get_lock():
+        # Stay caught up with our own write unless another worker wrote in between
+        if _schedule.value == _seen:
+            _seen += 1
+        _schedule.value += 1
+
+
+def _catch_up():
+    global _seen, _stored, _next_poll
+    schedule, stored = _schedule.value, _stored
+    now = time.monotonic()
+    if now >= _next_poll:
+        _next_poll = now + _poll_interval
+        try:
+            stored = stored_generation()
+        except SQLAlchemyError:
+            db.session.rollback()  # e.g. the table is not created yet; try again at the next poll
+    if schedule == _seen and stored == _stored:
+        return
+    extensions = current_app.extensions
+    if stored != _stored:
+        # The shared versions never saw those writes
+        extensions['response_cache'].clear()
+    extensions.pop('route_graph', None)
+    extensions.pop('connection_index', None)
+    extensions.pop('place_index', None)
+    _seen, _stored = schedule, stored
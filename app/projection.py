@@ -0,0 +1,110 @@
+"""
+Column-projected JSON for the list endpoints.
+
+Building a list from ORM objects costs an identity-map entry, attribute
+instrumentation and a to_dict() call per row. Booking.to_dict() also builds the nested
+flight dict for every booking. The list endpoints instead select only the columns the
+response needs with a Core query and turn each row tuple straight into a dict, with
+the same keys and values as to_dict().
+
+A Projection names the fields of one resource, each with its column and, for dates,
+an encoder. ?fields=a,b picks a sparse fieldset. stream() writes a large result as
+a chunked JSON array while it is still being read, so the whole body is never built.
+"""
+from flask import current_app, stream_with_context
+from app import db
+from app.models import Booking, Flight, User
+
+STREAM_CHUNK = 1000  # rows per DB fetch and per chunk written by stream()
+
+
+def _iso(value):
+    return value.isoformat()
+
+
+class Projection:
+    """The fields of one resource: name -> (column, encoder or None). A field with no column is filled in by the caller."""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def parse(self, arg):
+        """Field names from a ?fields= value (all fields when empty); ValueError names unknown ones."""
+        if not arg:
+            return list(self.fields)
+        names = list(dict.fromkeys(n.strip() for n in arg.split(',') if n.strip()))
+        unknown = [n for n in names if n not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown {self.name} field(s): {', '.join(unknown)}")
+        return names
+
+    def columns(self, names):
+        return [self.fields[n][0] for n in names if self.fields[n][0] is not None]
+
+    def converter(self, names, offset=0):
+        """Row -> dict for `names`, reading their columns from position `offset` of the row on."""
+        plain, encoded = [], []
+        for i, name in enumerate(n for n in names if self.fields[n][0] is not None):
+            encode = self.fields[name][1]
+            (encoded if encode else plain).append((offset + i, name, encode))
+
+        def convert(row):
+            d = {name: row[i] for i, name, _ in plain}
+            for i, name, encode in encoded:
+                value = row[i]
+                d[name] = encode(value) if value is not None else None
+            return d
+        return convert
+
+
+FLIGHT = Projection('flight', {
+    'id': (Flight.id, None), 'flight_number': (Flight.flight_number, None),
+    'source': (Flight.source, None), 'destination': (Flight.destination, None),
+    'departure_time': (Flight.departure_time, _iso), 'arrival_time': (Flight.arrival_time, _iso),
+    'economy_price': (Flight.economy_price, None), 'business_price': (Flight.business_price, None),
+    'economy_seats': (Flight.economy_seats, None), 'business_seats': (Flight.business_seats, None),
+})
+
+BOOKING = Projection('booking', {
+    'id': (Booking.id, None), 'user_id': (Booking.user_id, None), 'flight_id': (Booking.flight_id, None),
+    'trip_type': (Booking.trip_type, None), 'travel_class': (Booking.travel_class, None),
+    'num_passengers': (Booking.num_passengers, None),
+    'date_depart': (Booking.date_depart, _iso), 'date_return': (Booking.date_return, _iso),
+    'seats': (Booking.seats, None), 'meal_preference': (Booking.meal_preference, None),
+    'extra_baggage_kg': (Booking.extra_baggage_kg, None), 'total_amount': (Booking.total_amount, None),
+    'status': (Booking.status, None), 'created_at': (Booking.created_at, _iso),
+    'flight': (None, None),  # nested flight, or by reference with ?flights=ref
+})
+
+USER = Projection('user', {
+    'id': (User.id, None), 'username': (User.username, None), 'role': (User.role, None),
+    'created_at': (User.created_at, _iso),
+    'balance': (None, None),  # from the ledger; customers only, like q1-q3
+    'q1': (User.q1, None), 'q2': (User.q2, None), 'q3': (User.q3, None),
+})
+CUSTOMER_ONLY = ('balance', 'q1', 'q2', 'q3')
+
+
+def rows(stmt, stream=False):
+    """
+    Plain row tuples for a Core select, off the session's connection. get_bind still sees the
+    clause, so @read_only views read from the replica. `stream` fetches STREAM_CHUNK rows at a time.
+    """
+    if stream:
+        stmt = stmt.execution_options(yield_per=STREAM_CHUNK)
+    return db.session.connection(bind_arguments={'clause': stmt}).execute(stmt)
+
+
+def stream(chunks):
+    """Response writing `chunks` (an iterable of lists of dicts) as one JSON array."""
+    dumps = current_app.json.dumps
+
+    def generate():
+        sep = '['
+        for chunk in chunks:
+            if chunk:
+                yield sep + dumps(chunk)[1:-1]
+                sep = ','
+        yield ']\n' if sep == ',' else '[]\n'
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
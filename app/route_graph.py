@@ -0,0 +1,143 @@
+"""
+In-memory graph of the routes that actually exist in the schedule.
+
+Nodes are normalized place keys; each edge (source_key, destination_key) carries the
+number of flights on it, overall and per departure date. The graph is built once per
+app on first use from one GROUP BY over the flights table (a row per route per day)
+and then kept in step by app.schedule change events, so /destinations and route
+lookups never touch the DB. Memory is O(routes x days), not O(flights).
+"""
+import threading
+from collections import Counter
+from datetime import date
+from flask import current_app
+from app import db
+from app.models import Flight
+from app.schedule import on_flight_change
+
+
+def _date(dt):
+    return dt.date() if dt is not None else None
+
+
+class RouteGraph:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.names = {}          # place key -> display name
+        self.out = {}            # source key -> Counter(destination key -> flights)
+        self.by_date = {}        # departure date -> Counter((source key, destination key) -> flights)
+        self.source_counts = Counter()
+        self.destination_counts = Counter()
+
+    def _apply(self, source, destination, source_key, destination_key, day, delta):
+        route = (source_key, destination_key)
+        out = self.out.setdefault(source_key, Counter())
+        out[destination_key] += delta
+        if out[destination_key] <= 0:
+            del out[destination_key]
+            if not out:
+                del self.out[source_key]
+        on_day = self.by_date.setdefault(day, Counter())
+        on_day[route] += delta
+        if on_day[route] <= 0:
+            del on_day[route]
+            if not on_day:
+                del self.by_date[day]
+        for counts, key, name in ((self.source_counts, source_key, source),
+                                  (self.destination_counts, destination_key, destination)):
+            counts[key] += delta
+            if counts[key] <= 0:
+                del counts[key]
+            if delta > 0:
+                self.names.setdefault(key, name)
+        for key in route:
+            if key not in self.source_counts and key not in self.destination_counts:
+                self.names.pop(key, None)
+
+    def add(self, f):
+        with self._lock:
+            self._apply(f.source, f.destination, f.source_key, f.destination_key, _date(f.departure_time), 1)
+
+    def remove(self, f):
+        with self._lock:
+            self._apply(f.source, f.destination, f.source_key, f.destination_key, _date(f.departure_time), -1)
+
+    def update(self, before, after):
+        if before is not None and after is not None and \
+                (before.source_key, before.destination_key, _date(before.departure_time)) == \
+                (after.source_key, after.destination_key, _date(after.departure_time)):
+            return
+        with self._lock:
+            if before is not None:
+                self.remove(before)
+            if after is not None:
+                self.add(after)
+
+    @classmethod
+    def build(cls, rows):
+        """From (source, destination, source_key, destination_key, day, flights) aggregate rows."""
+        graph = cls()
+        for source, destination, source_key, destination_key, day, n in rows:
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            graph._apply(source, destination, source_key, destination_key, day, n)
+        return graph
+
+    # --- Queries ------------------------------------------------------------------
+
+    def _named(self, keys):
+        return sorted(self.names[k] for k in keys)
+
+    def sources(self):
+        with self._lock:
+            return self._named(self.source_counts)
+
+    def destinations(self):
+        with self._lock:
+            return self._named(self.destination_counts)
+
+    def reachable(self, source_key):
+        """Destinations with a direct flight from `source_key`, busiest first."""
+        with self._lock:
+            out = self.out.get(source_key, Counter())
+            return [{'destination': self.names[k], 'flights': n} for k, n in out.most_common()]
+
+    def routes(self, day=None):
+        """All routes with their flight counts, or only those with departures on `day`."""
+        with self._lock:
+            if day is None:
+                pairs = ((s, d, n) for s, out in self.out.items() for d, n in out.items())
+            else:
+                pairs = ((s, d, n) for (s, d), n in self.by_date.get(day, Counter()).items())
+            return sorted(({'source': self.names[s], 'destination': self.names[d], 'flights': n}
+                           for s, d, n in pairs), key=lambda r: (r['source'], r['destination']))
+
+
+_build_lock = threading.Lock()
+
+
+def load_rows():
+    """Flight counts per route per departure day, aggregated in the DB."""
+    day = db.func.date(Flight.departure_time)
+    return db.session.execute(
+        db.select(db.func.min(Flight.source), db.func.min(Flight.destination),
+                  Flight.source_key, Flight.destination_key, day, db.func.count())
+        .group_by(Flight.source_key, Flight.destination_key, day))
+
+
+def get_route_graph():
+    graph = current_app.extensions.get('route_graph')
+    if graph is None:
+        with _build_lock:
+            graph = current_app.extensions.get('route_graph')
+            if graph is None:
+                graph = current_app.extensions['route_graph'] = RouteGraph.build(load_rows())
+    return graph
+
+
+@on_flight_change
+def _update_graph(changes):
+    graph = current_app.extensions.get('route_graph')
+    if graph is not None:
+        for before, after in changes:
+            graph.update(before, after)
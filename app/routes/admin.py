@@ -1,20 +1,46 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime
 from app import db
-from app.models import User, Flight, Booking
-from app.utils import require_user
+from app.models import User, Flight, Booking, CancelJob, LedgerEntry
+from app.utils import require_user, invalidate_identity
+from app import bulk_cancel, bulk_import, ledger, projection, seatmap
+from app.schedule import flight_changed, snapshot
 
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/users', methods=['GET'])
 def list_users():
+    """All users, streamed as they are read; ?fields=id,username,... returns only those fields."""
     user, payload, err = require_user()
     if err:
         return err[0], err[1]
     if payload.get('role') != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
-    users = User.query.all()
-    return jsonify([u.to_dict() for u in users])
+    try:
+        fields = projection.USER.parse(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    columns = projection.USER.columns(fields)
+    convert = projection.USER.converter(fields)
+    with_balance = 'balance' in fields
+    result = projection.rows(db.select(*columns, User.id, User.role).order_by(User.id), stream=True)
+
+    def chunks():
+        for part in result.partitions():
+            balances = ledger.balances_paise(row[-2] for row in part if row[-1] == 'customer') \
+                if with_balance else {}
+            out = []
+            for row in part:
+                d = convert(row)
+                if row[-1] == 'customer':
+                    if with_balance:
+                        d['balance'] = ledger.from_paise(balances.get(row[-2], 0))
+                else:
+                    for key in projection.CUSTOMER_ONLY:
+                        d.pop(key, None)
+                out.append(d)
+            yield out
+    return projection.stream(chunks())
 
 @admin_bp.route('/users/<int:user_id>', methods=['GET', 'PUT', 'DELETE'])
 def user_ops(user_id):
@@ -29,17 +55,37 @@ def user_ops(user_id):
     if request.method == 'DELETE':
         if target.role == 'admin':
             return jsonify({'error': 'Cannot delete admin'}), 400
+        ledger.close_account(target.id)
         db.session.delete(target)
         db.session.commit()
+        invalidate_identity(user_id)
         return jsonify({'message': 'User deleted'})
     data = request.get_json() or {}
     if 'balance' in data and target.role == 'customer':
-        target.balance = float(data['balance'])
+        ledger.set_balance(target.id, float(data['balance']))
     if 'username' in data:
         target.username = str(data['username']).strip()
     db.session.commit()
+    invalidate_identity(user_id)
     return jsonify(target.to_dict())
 
+@admin_bp.route('/users/<int:user_id>/ledger', methods=['GET'])
+def user_ledger(user_id):
+    """A customer's balance history, newest first; ?before=<entry id> pages back, ?limit= (max 500)."""
+    user, payload, err = require_user()
+    if err:
+        return err[0], err[1]
+    if payload.get('role') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    target = User.query.get_or_404(user_id)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    q = LedgerEntry.query.filter_by(user_id=target.id)
+    before = request.args.get('before', type=int)
+    if before:
+        q = q.filter(LedgerEntry.id < before)
+    entries = q.order_by(LedgerEntry.id.desc()).limit(limit).all()
+    return jsonify({'user_id': target.id, 'balance': target.balance, 'entries': [e.to_dict() for e in entries]})
+
 @admin_bp.route('/flights', methods=['POST'])
 def create_flight():
     user, payload, err = require_user()
@@ -71,8 +117,36 @@ def create_flight():
                business_price=business_price, economy_seats=economy_seats, business_seats=business_seats)
     db.session.add(f)
     db.session.commit()
+    flight_changed(None, snapshot(f))
     return jsonify(f.to_dict()), 201
 
+@admin_bp.route('/flights/import', methods=['POST'])
+def import_flights():
+    """
+    Bulk-create flights from a streamed application/x-ndjson or text/csv body (token in a header
+    or ?token=), or from JSON {"recurrence": {...}} (see app.bulk_import). Returns a per-row report.
+    """
+    user, payload, err = require_user()
+    if err:
+        return err[0], err[1]
+    if payload.get('role') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    mimetype = request.mimetype
+    try:
+        if mimetype in ('application/x-ndjson', 'application/jsonl'):
+            records = bulk_import.ndjson_rows(request.stream)
+        elif mimetype == 'text/csv':
+            records = bulk_import.csv_rows(request.stream)
+        else:
+            data = request.get_json(silent=True) or {}
+            if 'recurrence' not in data:
+                return jsonify({'error': 'Send NDJSON or CSV rows, or a JSON recurrence rule'}), 400
+            records = bulk_import.recurrence_rows(data['recurrence'])
+    except bulk_import.RowError as e:
+        return jsonify({'error': str(e)}), 400
+    report = bulk_import.import_flights(records, current_app.config.get('IMPORT_CHUNK_SIZE', 1000))
+    return jsonify(report), 200
+
 @admin_bp.route('/flights/<int:flight_id>', methods=['PUT', 'DELETE'])
 def flight_ops(flight_id):
     user, payload, err = require_user()
@@ -81,19 +155,31 @@ def flight_ops(flight_id):
     if payload.get('role') != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
     flight = Flight.query.get_or_404(flight_id)
+    before = snapshot(flight)
     if request.method == 'DELETE':
-        db.session.delete(flight)
-        db.session.commit()
-        return jsonify({'message': 'Flight deleted'})
+        # The flight's bookings are refunded first; the flight goes with the last chunk
+        def delete_flight():
+            seatmap.reset(flight_id)
+            db.session.execute(db.delete(Flight).where(Flight.id == flight_id))
+        cancelled, refunded = bulk_cancel.cancel_matching(
+            [Booking.flight_id == flight_id], current_app.config.get('CANCEL_CHUNK_SIZE', 500),
+            restore_seats=False, finish=delete_flight)
+        flight_changed(before, None)
+        return jsonify({'message': 'Flight deleted', 'bookings_cancelled': cancelled,
+                        'refunded': ledger.from_paise(refunded)})
     data = request.get_json() or {}
     for key in ['source', 'destination', 'economy_price', 'business_price', 'economy_seats', 'business_seats']:
         if key in data:
             setattr(flight, key, data[key])
+    if 'economy_seats' in data or 'business_seats' in data:
+        # Cabin sizes changed; the seat map is rebuilt from bookings on next use
+        seatmap.reset(flight.id)
     if 'departure_time' in data:
         flight.departure_time = datetime.fromisoformat(data['departure_time'].replace('Z', '+00:00'))
     if 'arrival_time' in data:
         flight.arrival_time = datetime.fromisoformat(data['arrival_time'].replace('Z', '+00:00'))
     db.session.commit()
+    flight_changed(before, snapshot(flight))
     return jsonify(flight.to_dict())
 
 @admin_bp.route('/bookings/<int:booking_id>', methods=['PUT', 'DELETE'])
@@ -103,22 +189,48 @@ def booking_ops(booking_id):
         return err[0], err[1]
     if payload.get('role') != 'admin':
         return jsonify({'error': 'Admin access required'}), 403
-    b = Booking.query.get_or_404(booking_id)
     if request.method == 'DELETE':
-        u = User.query.get(b.user_id)
-        if u:
-            u.balance += b.total_amount
-        fl = Flight.query.get(b.flight_id)
-        if fl:
-            if b.travel_class == 'economy':
-                fl.economy_seats += b.num_passengers
-            else:
-                fl.business_seats += b.num_passengers
-        db.session.delete(b)
-        db.session.commit()
-        return jsonify({'message': 'Booking cancelled'})
+        cancelled, refunded = bulk_cancel.cancel_matching(
+            [Booking.id == booking_id], current_app.config.get('CANCEL_CHUNK_SIZE', 500))
+        if not cancelled:
+            return jsonify({'error': 'Booking not found'}), 404
+        return jsonify({'message': 'Booking cancelled', 'refunded': ledger.from_paise(refunded)})
+    b = Booking.query.get_or_404(booking_id)
     data = request.get_json() or {}
     if 'status' in data:
         b.status = data['status']
     db.session.commit()
     return jsonify(b.to_dict())
+
+@admin_bp.route('/bookings/cancel', methods=['POST'])
+def cancel_bookings():
+    """
+    Cancel and refund the bookings in {"booking_ids": [...]}, {"flight_ids": [...]} or
+    {"departure_from": ..., "departure_to": ...}. Up to CANCEL_CHUNK_SIZE bookings are done
+    before responding (200); a larger job returns 202 and runs on, see cancel_job below.
+    """
+    user, payload, err = require_user()
+    if err:
+        return err[0], err[1]
+    if payload.get('role') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    data = request.get_json(silent=True)
+    try:
+        selection = bulk_cancel.parse_selection(data if isinstance(data, dict) else {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    job = bulk_cancel.start(selection, user.id)
+    body = job.to_dict()
+    if body['status'] in ('done', 'failed'):
+        return jsonify(body), 200
+    return jsonify(body), 202, {'Location': f'/api/admin/bookings/cancel/{job.id}'}
+
+@admin_bp.route('/bookings/cancel/<int:job_id>', methods=['GET'])
+def cancel_job(job_id):
+    """Progress of a bulk cancellation."""
+    user, payload, err = require_user()
+    if err:
+        return err[0], err[1]
+    if payload.get('role') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify(CancelJob.query.get_or_404(job_id).to_dict())
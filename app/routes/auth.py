@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
-from app import db
+from app import db, ledger
 from app.models import User
-from app.utils import create_token, require_user
+from app.utils import create_token, require_user, invalidate_identity
 from config import Config
 
 auth_bp = Blueprint('auth', __name__)
@@ -33,13 +33,11 @@ def register():
         return jsonify({'error': 'All 3 security questions and answers required'}), 400
     if User.query.filter_by(username=username).first():
         return jsonify({'error': 'Username already exists'}), 409
-    user = User(username=username, role='customer', balance=Config.DEFAULT_CUSTOMER_BALANCE)
-    user.set_password(password)
+    user = User(username=username, role='customer')
     user.q1, user.q2, user.q3 = SECURITY_QUESTIONS[int(q1)], SECURITY_QUESTIONS[int(q2)], SECURITY_QUESTIONS[int(q3)]
-    user.set_answer(1, a1)
-    user.set_answer(2, a2)
-    user.set_answer(3, a3)
+    user.set_credentials(password, [a1, a2, a3])
     db.session.add(user)
+    ledger.open_account(user, Config.DEFAULT_CUSTOMER_BALANCE)
     db.session.commit()
     token = create_token(user)
     return jsonify({'message': 'Account created', 'token': token, 'user': user.to_dict()}), 201
@@ -54,6 +52,11 @@ def login():
     user = User.query.filter_by(username=username).first()
     if not user or not user.check_password(password):
         return jsonify({'error': 'Invalid credentials'}), 401
+    if user.password_needs_rehash():
+        # BCRYPT_ROUNDS changed since this hash was made; upgrade it while we have the password
+        user.set_password(password)
+        db.session.commit()
+        invalidate_identity(user.id)
     token = create_token(user)
     return jsonify({'token': token, 'user': user.to_dict()})
 
@@ -78,7 +81,7 @@ def forgot_password():
     user = User.query.filter_by(username=username, role='customer').first()
     if not user:
         return jsonify({'error': 'User not found'}), 404
-    if not (user.check_answer(1, a1) and user.check_answer(2, a2) and user.check_answer(3, a3)):
+    if not user.check_answers([a1, a2, a3]):
         return jsonify({'error': 'Incorrect answers to security questions'}), 401
     token = create_token(user, extra={'reset': True})
     return jsonify({'message': 'Answers verified. Use this token to set new password.', 'token': token, 'user': user.to_dict()})
@@ -96,6 +99,7 @@ def change_password():
             return jsonify({'error': 'New password required'}), 400
         user.set_password(new_pass)
         db.session.commit()
+        invalidate_identity(user.id)
         return jsonify({'message': 'Password updated. You can now sign in.'})
     if payload.get('role') == 'admin' and target_username:
         target = User.query.filter_by(username=target_username).first()
@@ -105,12 +109,14 @@ def change_password():
             return jsonify({'error': 'New password required'}), 400
         target.set_password(new_pass)
         db.session.commit()
+        invalidate_identity(target.id)
         return jsonify({'message': f'Password updated for {target_username}'})
     # Changing own password: only new password required (no current password)
     if not new_pass:
         return jsonify({'error': 'New password required'}), 400
     user.set_password(new_pass)
     db.session.commit()
+    invalidate_identity(user.id)
     return jsonify({'message': 'Password updated'})
 
 @auth_bp.route('/me', methods=['GET', 'POST'])
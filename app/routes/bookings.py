@@ -1,24 +1,111 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime, date
-import json
+from flask import Blueprint, current_app, request, jsonify
+from datetime import datetime
+import base64
+from sqlalchemy.exc import OperationalError
 from app import db
-from app.models import Booking, Flight, User
+from app.models import Booking, Flight, flights_archive
+from app.engine import read_only
+from app.idempotency import idempotent
 from app.utils import require_user
+from app import archive, inventory, pricing, projection, seatmap
+from app.schedule import flight_changed, snapshot
 
 bookings_bp = Blueprint('bookings', __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at, booking_id):
+    raw = f'{created_at.isoformat()}|{booking_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from an opaque cursor, or raise ValueError."""
+    try:
+        created, bid = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created), int(bid)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
 @bookings_bp.route('/', methods=['GET'])
+@read_only
 def list_bookings():
+    """
+    Newest-first page of bookings, keyset-paginated on (created_at, id).
+    Pass ?limit= (max MAX_PAGE_SIZE) and the X-Next-Cursor header of the previous page as ?cursor=.
+    ?fields=id,flight,... returns only those fields. With ?flights=ref, each flight is sent once:
+    the body is {"bookings": [...], "flights": [...]} and bookings refer to them by flight_id.
+    """
     user, payload, err = require_user()
     if err:
         return err[0], err[1]
-    if payload.get('role') == 'admin':
-        bookings = Booking.query.order_by(Booking.created_at.desc()).all()
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        limit = DEFAULT_PAGE_SIZE
+    limit = max(1, min(MAX_PAGE_SIZE, limit))
+    try:
+        fields = projection.BOOKING.parse(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    by_ref = request.args.get('flights') == 'ref'
+    nested = 'flight' in fields and not by_ref
+    if by_ref:
+        fields = [f for f in fields if f != 'flight']
+
+    columns = projection.BOOKING.columns(fields)
+    flight_fields = list(projection.FLIGHT.fields)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            c_created, c_id = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    def page(bookings, flights):
+        """One tier's page; the cursor and the flight reference are read from the last columns."""
+        stmt = db.select(*archive.tier_columns(bookings, columns),
+                         *(archive.tier_columns(flights, projection.FLIGHT.columns(flight_fields)) if nested else ()),
+                         bookings.c.created_at, bookings.c.id, bookings.c.flight_id)
+        if nested:
+            stmt = stmt.outerjoin(flights, flights.c.id == bookings.c.flight_id)
+        if payload.get('role') != 'admin':
+            stmt = stmt.where(bookings.c.user_id == user.id)
+        if cursor:
+            stmt = stmt.where(db.or_(bookings.c.created_at < c_created,
+                                     db.and_(bookings.c.created_at == c_created, bookings.c.id < c_id)))
+        return stmt.order_by(bookings.c.created_at.desc(), bookings.c.id.desc()).limit(limit + 1)
+    # Past trips live in the archive tier (app.archive); a page is merged from both
+    rows = archive.booking_rows(page, limit + 1)
+
+    convert = projection.BOOKING.converter(fields)
+    bookings = [convert(row) for row in rows[:limit]]
+    if nested:
+        convert_flight = projection.FLIGHT.converter(flight_fields, offset=len(columns))
+        for booking, row in zip(bookings, rows):
+            booking['flight'] = convert_flight(row) if row[len(columns)] is not None else None
+    if by_ref:
+        flight_ids = {row[-1] for row in rows[:limit]}
+        convert_flight = projection.FLIGHT.converter(flight_fields)
+        flights = []
+        for table in (Flight.__table__, flights_archive):
+            wanted = flight_ids - {f['id'] for f in flights}
+            if wanted:
+                flights += [convert_flight(row) for row in projection.rows(
+                    db.select(*archive.tier_columns(table, projection.FLIGHT.columns(flight_fields)))
+                    .where(table.c.id.in_(wanted)))]
+        resp = jsonify({'bookings': bookings, 'flights': flights})
     else:
-        bookings = Booking.query.filter_by(user_id=user.id).order_by(Booking.created_at.desc()).all()
-    return jsonify([b.to_dict() for b in bookings])
+        resp = jsonify(bookings)
+    if len(rows) > limit:
+        resp.headers['X-Next-Cursor'] = encode_cursor(rows[limit - 1][-3], rows[limit - 1][-2])
+    return resp
 
 @bookings_bp.route('/', methods=['POST'])
+@idempotent
 def create_booking():
     user, payload, err = require_user()
     if err:
@@ -29,27 +116,21 @@ def create_booking():
     if not isinstance(data, dict):
         return jsonify({'error': 'Invalid request body'}), 400
     flight_id = data.get('flight_id')
-    trip_type = data.get('trip_type', 'one_way') or 'one_way'
-    travel_class = data.get('travel_class', 'economy') or 'economy'
-    try:
-        num_passengers = int(data.get('num_passengers', 1))
-        num_passengers = max(1, min(9, num_passengers))
-    except (TypeError, ValueError):
-        num_passengers = 1
+    options = pricing.options_from(data)
+    trip_type, travel_class, num_passengers = options.trip_type, options.travel_class, options.num_passengers
     date_depart = data.get('date_depart')
     date_return = data.get('date_return') if trip_type == 'return' else None
     seats = data.get('seats', [])
     if not isinstance(seats, list):
         seats = []
-    meal_preference = data.get('meal_preference', 'veg') or 'veg'
-    try:
-        extra_baggage_kg = int(data.get('extra_baggage_kg', 0))
-        extra_baggage_kg = max(0, min(50, extra_baggage_kg))
-    except (TypeError, ValueError):
-        extra_baggage_kg = 0
+    hold_id = data.get('hold_id')
 
     if not flight_id or not date_depart:
         return jsonify({'error': 'flight_id and date_depart required'}), 400
+    if travel_class not in inventory.TRAVEL_CLASSES:
+        return jsonify({'error': 'travel_class must be economy or business'}), 400
+    if seats and len(seats) != num_passengers:
+        return jsonify({'error': f'Select exactly {num_passengers} seat(s)'}), 400
     flight = Flight.query.get(flight_id)
     if not flight:
         return jsonify({'error': 'Flight not found'}), 404
@@ -64,42 +145,55 @@ def create_booking():
         except ValueError:
             pass
 
-    price_per = flight.economy_price if travel_class == 'economy' else flight.business_price
-    base = price_per * num_passengers
-    meal_charge = 500 * num_passengers if meal_preference else 0
-    baggage_charge = 300 * extra_baggage_kg
-    total_amount = base + meal_charge + baggage_charge
-    if trip_type == 'return':
-        total_amount *= 2
-
-    if user.balance < total_amount:
-        return jsonify({'error': 'Insufficient balance', 'required': total_amount, 'balance': user.balance}), 400
-    avail = flight.economy_seats if travel_class == 'economy' else flight.business_seats
-    if avail < num_passengers:
-        return jsonify({'error': f'Not enough seats. Only {avail} available.'}), 400
-
-    seats_str = json.dumps(seats) if isinstance(seats, list) else json.dumps([])
+    hold = seatmap.holds.get(hold_id) if hold_id else None
+    if hold and hold.user_id != user.id:
+        hold = None
+    seatmap.ensure(flight)
+    total_amount = pricing.price(flight, options, current_app.config)
     booking = Booking(
         user_id=user.id, flight_id=flight.id, trip_type=trip_type, travel_class=travel_class,
         num_passengers=num_passengers, date_depart=d_depart, date_return=d_return,
-        seats=seats_str, meal_preference=meal_preference, extra_baggage_kg=extra_baggage_kg,
+        meal_preference=options.meal_preference, extra_baggage_kg=options.extra_baggage_kg,
         total_amount=total_amount, status='confirmed'
     )
-    user.balance -= total_amount
-    db.session.add(booking)
-    if travel_class == 'economy':
-        flight.economy_seats -= num_passengers
-    else:
-        flight.business_seats -= num_passengers
-    db.session.commit()
-    return jsonify({'message': 'Booking confirmed', 'booking': booking.to_dict(), 'new_balance': user.balance}), 201
+    pipeline = current_app.extensions.get('booking_pipeline')
+    try:
+        if pipeline is not None:
+            booking_dict, new_balance = pipeline.submit(booking, seats=seats, hold=hold)
+        else:
+            booking_dict, new_balance = _book_now(flight, user, booking, seats, hold)
+    except inventory.InventoryConflict as e:
+        return jsonify(e.to_dict()), 409
+    except OperationalError:
+        # Lock wait timed out (SQLite under heavy write load); nothing was written
+        return jsonify({'error': 'Booking service busy, please retry'}), 503, {'Retry-After': '1'}
+    if hold:
+        seatmap.holds.release(hold.id)
+    return jsonify({'message': 'Booking confirmed', 'booking': booking_dict, 'new_balance': new_balance}), 201
+
+
+def _book_now(flight, user, booking, seats, hold):
+    """Book in this request's own transaction; returns (booking dict, new balance)."""
+    before = snapshot(flight)
+    try:
+        balance = inventory.book(booking, seats=seats, hold=hold)
+        db.session.commit()
+    except (inventory.InventoryConflict, OperationalError):
+        db.session.rollback()
+        raise
+    flight_changed(before, snapshot(flight))
+    return booking.to_dict(), balance
 
 @bookings_bp.route('/<int:booking_id>', methods=['GET'])
+@read_only
 def get_booking(booking_id):
     user, payload, err = require_user()
     if err:
         return err[0], err[1]
-    b = Booking.query.get_or_404(booking_id)
-    if payload.get('role') != 'admin' and b.user_id != user.id:
+    b = Booking.query.get(booking_id)
+    d = b.to_dict() if b is not None else archive.archived_booking(booking_id)
+    if d is None:
+        return jsonify({'error': 'Booking not found'}), 404
+    if payload.get('role') != 'admin' and d['user_id'] != user.id:
         return jsonify({'error': 'Forbidden'}), 403
-    return jsonify(b.to_dict())
+    return jsonify(d)
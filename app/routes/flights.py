@@ -1,40 +1,265 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from datetime import datetime, date, timedelta
-from app import db
-from app.models import Flight, User
+from flask import Blueprint, current_app, request, jsonify
+from datetime import datetime, timedelta
+from app import db, fare_calendar, pricing, projection, seatmap
+from app.autocomplete import MAX_SUGGESTIONS, get_place_index
+from app.cache import cached_json, flight_version, search_version
+from app.connections import MAX_LEGS, available_seats, get_connection_index, itinerary_dict
+from app.inventory import InventoryConflict, TRAVEL_CLASSES
+from app.models import Flight, normalize_place
+from app.route_graph import get_route_graph
+from app.engine import read_only
+from app.utils import require_user
 
 flights_bp = Blueprint('flights', __name__)
 
+MATCH_MODES = ('contains', 'prefix', 'exact')
+
+
+def _place_filter(column, key, mode):
+    """Filter on a normalized place key. 'exact' and 'prefix' are index range scans; 'contains' is not."""
+    if mode == 'exact':
+        return column == key
+    if mode == 'prefix':
+        return db.and_(column >= key, column < key + '\uffff')
+    return column.contains(key, autoescape=True)
+
+
+def _search_criteria(source, destination, d, match):
+    criteria = []
+    if source:
+        criteria.append(_place_filter(Flight.source_key, source, match))
+    if destination:
+        criteria.append(_place_filter(Flight.destination_key, destination, match))
+    if d:
+        # Half-open range so the departure_time index (or the route index) can be used
+        criteria += [Flight.departure_time >= d, Flight.departure_time < d + timedelta(days=1)]
+    return criteria
+
+
 @flights_bp.route('/', methods=['GET'])
+@read_only
 def list_flights():
-    source = request.args.get('source', '').strip()
-    destination = request.args.get('destination', '').strip()
+    """Flight search; ?fields=id,departure_time,... returns only those fields."""
+    source = normalize_place(request.args.get('source'))
+    destination = normalize_place(request.args.get('destination'))
     date_str = request.args.get('date')
-    q = Flight.query
-    if source:
-        q = q.filter(Flight.source.ilike(f'%{source}%'))
-    if destination:
-        q = q.filter(Flight.destination.ilike(f'%{destination}%'))
+    match = (request.args.get('match') or 'contains').strip().lower()
+    if match not in MATCH_MODES:
+        return jsonify({'error': f"match must be one of {', '.join(MATCH_MODES)}"}), 400
+    try:
+        fields = projection.FLIGHT.parse(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    d = None
     if date_str:
         try:
-            d = datetime.strptime(date_str, '%Y-%m-%d').date()
-            q = q.filter(db.func.date(Flight.departure_time) == d)
+            d = datetime.strptime(date_str, '%Y-%m-%d')
         except ValueError:
             pass
-    flights = q.order_by(Flight.departure_time).all()
-    return jsonify([f.to_dict() for f in flights])
+
+    def build():
+        stmt = db.select(*projection.FLIGHT.columns(fields)) \
+            .where(*_search_criteria(source, destination, d, match)).order_by(Flight.departure_time)
+        convert = projection.FLIGHT.converter(fields)
+        return [convert(row) for row in projection.rows(stmt)]
+
+    key = ('search', source, destination, d, match, tuple(fields))
+    return cached_json(key, search_version(source, destination, match), build)
+
+@flights_bp.route('/quote', methods=['POST'])
+@read_only
+def quote():
+    """
+    Booking totals for many flights in one call. The body carries the booking options
+    (travel_class, num_passengers, extra_baggage_kg, meal_preference, trip_type) and
+    either flight_ids or the search filters of GET /api/flights/ (source, destination,
+    date, match).
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid request body'}), 400
+    options = pricing.options_from(data)
+    if options.travel_class not in TRAVEL_CLASSES:
+        return jsonify({'error': 'travel_class must be economy or business'}), 400
+    flight_ids = data.get('flight_ids')
+    if flight_ids is not None:
+        if not isinstance(flight_ids, list) or not all(isinstance(i, int) for i in flight_ids):
+            return jsonify({'error': 'flight_ids must be a list of flight ids'}), 400
+        if len(flight_ids) > pricing.MAX_QUOTE_FLIGHTS:
+            return jsonify({'error': f'At most {pricing.MAX_QUOTE_FLIGHTS} flights per quote'}), 400
+        columns = pricing.load_columns(options.travel_class, Flight.id.in_(flight_ids))
+    else:
+        match = (data.get('match') or 'contains').strip().lower()
+        if match not in MATCH_MODES:
+            return jsonify({'error': f"match must be one of {', '.join(MATCH_MODES)}"}), 400
+        source, destination = normalize_place(data.get('source')), normalize_place(data.get('destination'))
+        d = None
+        if data.get('date'):
+            try:
+                d = datetime.strptime(data['date'], '%Y-%m-%d')
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Invalid date'}), 400
+        if not (source or destination or d):
+            return jsonify({'error': 'flight_ids or a search filter (source, destination, date) required'}), 400
+        columns = pricing.load_columns(options.travel_class, *_search_criteria(source, destination, d, match),
+                                        order_by=(Flight.departure_time, Flight.id))
+    body = {'options': options._asdict(), 'quotes': pricing.quote(columns, options, current_app.config)}
+    if flight_ids is not None:
+        body['missing'] = sorted(set(flight_ids).difference(columns.ids))
+    return jsonify(body)
 
 @flights_bp.route('/<int:flight_id>', methods=['GET'])
+@read_only
 def get_flight(flight_id):
-    flight = Flight.query.get_or_404(flight_id)
-    return jsonify(flight.to_dict())
+    return cached_json(('flight', flight_id), flight_version(flight_id),
+                       lambda: Flight.query.get_or_404(flight_id).to_dict())
+
+@flights_bp.route('/calendar', methods=['GET'])
+@read_only
+def calendar():
+    """
+    Cheapest fare and seats left per day on a route (exact ?source= and ?destination=), for
+    ?days= days (default 30, max 90) from ?from= (default today). Days without flights are null.
+    """
+    source = normalize_place(request.args.get('source'))
+    destination = normalize_place(request.args.get('destination'))
+    if not source or not destination:
+        return jsonify({'error': 'source and destination required'}), 400
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') \
+            else datetime.utcnow().date()
+    except ValueError:
+        return jsonify({'error': 'Invalid from date'}), 400
+    days = max(1, min(fare_calendar.MAX_DAYS, request.args.get('days', 30, type=int)))
+    found = {row.day: row for row in fare_calendar.window(source, destination, start, days)}
+    out = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        row = found.get(day)
+        out.append({'date': day.isoformat(), 'flights': row.flights if row else 0,
+                    'economy': {'min_fare': row.economy_min_fare, 'seats': row.economy_seats} if row else None,
+                    'business': {'min_fare': row.business_min_fare, 'seats': row.business_seats} if row else None})
+    return jsonify({'source': request.args.get('source'), 'destination': request.args.get('destination'),
+                    'days': out})
+
+@flights_bp.route('/autocomplete', methods=['GET'])
+@read_only
+def autocomplete():
+    """Places matching a partial name or airport code in ?q= (typos allowed), busiest first; ?limit= up to 20."""
+    q = request.args.get('q', '')
+    limit = max(1, min(MAX_SUGGESTIONS, request.args.get('limit', 8, type=int)))
+    return jsonify({'query': q, 'suggestions': get_place_index().suggest(q, limit)})
 
 @flights_bp.route('/destinations', methods=['GET'])
+@read_only
 def destinations():
-    sources = db.session.query(Flight.source).distinct().all()
-    dests = db.session.query(Flight.destination).distinct().all()
+    graph = get_route_graph()
     return jsonify({
-        'sources': [s[0] for s in sources],
-        'destinations': [d[0] for d in dests]
+        'sources': graph.sources(),
+        'destinations': graph.destinations()
     })
+
+@flights_bp.route('/routes', methods=['GET'])
+@read_only
+def routes():
+    """Existing routes: all of them, those with departures on ?date=, or destinations reachable from ?source=."""
+    graph = get_route_graph()
+    source = normalize_place(request.args.get('source'))
+    if source:
+        return jsonify({'source': graph.names.get(source, request.args.get('source')),
+                        'destinations': graph.reachable(source)})
+    date_str = request.args.get('date')
+    if date_str:
+        try:
+            day = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date'}), 400
+        return jsonify({'date': date_str, 'routes': graph.routes(day)})
+    return jsonify({'routes': graph.routes()})
+
+@flights_bp.route('/connections', methods=['GET'])
+@read_only
+def connections():
+    """
+    Up to ?limit= itineraries of 1..?max_legs= legs from ?source= to ?destination= departing on ?date=,
+    with layovers between ?min_layover= and ?max_layover= minutes, ranked by ?sort=price|duration.
+    """
+    source = normalize_place(request.args.get('source'))
+    destination = normalize_place(request.args.get('destination'))
+    if not source or not destination:
+        return jsonify({'error': 'source and destination required'}), 400
+    try:
+        day = datetime.strptime(request.args.get('date') or '', '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'date (YYYY-MM-DD) required'}), 400
+    travel_class = request.args.get('travel_class', 'economy')
+    if travel_class not in TRAVEL_CLASSES:
+        return jsonify({'error': 'travel_class must be economy or business'}), 400
+    sort = request.args.get('sort', 'price')
+    if sort not in ('price', 'duration'):
+        return jsonify({'error': 'sort must be price or duration'}), 400
+    try:
+        max_legs = max(1, min(MAX_LEGS, int(request.args.get('max_legs', 2))))
+        min_layover = max(0, int(request.args.get('min_layover', 45)))
+        max_layover = max(min_layover, int(request.args.get('max_layover', 480)))
+        passengers = max(1, min(9, int(request.args.get('num_passengers', 1))))
+        limit = max(1, min(50, int(request.args.get('limit', 10))))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_legs, min_layover, max_layover, num_passengers and limit must be integers'}), 400
+    # Over-fetch so legs that sold out in another process can be dropped after the seat re-check
+    found = get_connection_index().search(
+        source, destination, day, max_legs=max_legs, min_layover=timedelta(minutes=min_layover),
+        max_layover=timedelta(minutes=max_layover), travel_class=travel_class, passengers=passengers,
+        sort=sort, limit=limit * 2)
+    seats = available_seats({r.id for legs in found for r in legs}, travel_class) if found else {}
+    itineraries = [itinerary_dict(legs, travel_class, passengers) for legs in found
+                   if all((seats.get(r.id) or 0) >= passengers for r in legs)][:limit]
+    return jsonify({'itineraries': itineraries})
+
+@flights_bp.route('/<int:flight_id>/seats', methods=['GET'])
+def seat_map(flight_id):
+    """Seat map per cabin: taken seats from the bitmap plus seats currently on hold."""
+    flight = Flight.query.get_or_404(flight_id)
+    maps = seatmap.current(flight)
+    cabins = {cabin: maps[cabin].to_dict(held=seatmap.holds.held_labels(flight_id, cabin))
+              for cabin in TRAVEL_CLASSES}
+    return jsonify({'flight_id': flight_id, 'cabins': cabins})
+
+@flights_bp.route('/<int:flight_id>/seats/hold', methods=['POST'])
+def hold_seats(flight_id):
+    """Hold specific seats ({"seats": [...]}) or N adjacent seats ({"count": N}) for SEAT_HOLD_TTL seconds."""
+    user, payload, err = require_user()
+    if err:
+        return err[0], err[1]
+    data = request.get_json(silent=True) or {}
+    travel_class = data.get('travel_class', 'economy') or 'economy'
+    if travel_class not in TRAVEL_CLASSES:
+        return jsonify({'error': 'travel_class must be economy or business'}), 400
+    seats = data.get('seats') or []
+    if not isinstance(seats, list):
+        return jsonify({'error': 'seats must be a list'}), 400
+    if len(seats) > seatmap.MAX_HOLD_SEATS:
+        return jsonify({'error': f'At most {seatmap.MAX_HOLD_SEATS} seats per hold'}), 400
+    try:
+        count = max(1, min(seatmap.MAX_HOLD_SEATS, int(data.get('count') or len(seats) or 1)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid count'}), 400
+    flight = Flight.query.get_or_404(flight_id)
+    seatmap.ensure(flight)
+    sm = seatmap.load(flight_id, travel_class)
+    try:
+        hold = seatmap.holds.hold(sm, flight_id, user.id, count=count, labels=seats,
+                                  ttl=current_app.config.get('SEAT_HOLD_TTL', 300),
+                                  max_per_user=current_app.config.get('SEAT_HOLDS_PER_USER', 3))
+    except InventoryConflict as e:
+        return jsonify(e.to_dict()), 409
+    return jsonify(hold.to_dict()), 201
+
+@flights_bp.route('/<int:flight_id>/seats/hold/<hold_id>', methods=['DELETE'])
+def release_hold(flight_id, hold_id):
+    user, payload, err = require_user()
+    if err:
+        return err[0], err[1]
+    if not seatmap.holds.release(hold_id, user_id=user.id):
+        return jsonify({'error': 'Hold not found'}), 404
+    return jsonify({'message': 'Hold released'})
@@ -0,0 +1,21 @@
+from flask import Blueprint, jsonify
+from app import db
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({'status': 'ok'})
+
+
+@health_bp.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: the database answers. 503 takes this worker out of rotation until it does."""
+    try:
+        db.session.execute(db.text('SELECT 1'))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'unavailable', 'error': type(e).__name__}), 503
+    return jsonify({'status': 'ready'})
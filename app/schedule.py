@@ -0,0 +1,36 @@
+"""
+Fan-out of flight schedule changes to the in-memory indexes built from the flights table.
+
+Write paths call flight_changed(before, after) once after committing, with snapshots of
+the flight as it was and as it is now (None for create/delete); bulk writers pass all
+their pairs to flights_changed at once. Indexes register a listener with
+@on_flight_change, which receives a list of (before, after) pairs, and update
+themselves incrementally from it.
+"""
+from collections import namedtuple
+from app.models import Flight
+
+FlightRow = namedtuple('FlightRow', [c.key for c in Flight.__table__.columns])
+
+_listeners = []
+
+
+def snapshot(flight):
+    """Immutable copy of a Flight (ORM object or Core row) that is safe to keep after commit."""
+    return FlightRow(*(getattr(flight, k) for k in FlightRow._fields)) if flight is not None else None
+
+
+def on_flight_change(fn):
+    _listeners.append(fn)
+    return fn
+
+
+def flight_changed(before, after):
+    flights_changed([(before, after)])
+
+
+def flights_changed(changes):
+    if not changes:
+        return
+    for fn in _listeners:
+        fn(changes)
@@ -0,0 +1,368 @@
+"""
+Per-flight seat maps and short-lived seat holds.
+
+Each cabin of a flight is a SeatMap row holding a packed bitmap (bit set = seat taken),
+so checking a seat is a bit test and the whole map is a few bytes. Business rows are
+numbered first (1A-1D, ...), economy rows continue after them (A-F).
+
+Bitmap writes are compare-and-swap on SeatMap.version and run inside the caller's
+booking transaction. Holds live in memory and expire after SEAT_HOLD_TTL seconds,
+so the booking UI can lock seats without a DB write per click. A hold covers at most
+MAX_HOLD_SEATS seats and a user has at most SEAT_HOLDS_PER_USER live holds, so no one
+account can block a cabin. Under the prefork server, `holds` is a proxy to one
+SeatHolds shared by all workers (app.prefork).
+"""
+import json
+import re
+import secrets
+import threading
+import time
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Booking, SeatMap
+from app.inventory import InventoryConflict
+
+CABIN_LETTERS = {'business': 'ABCD', 'economy': 'ABCDEF'}
+CAS_RETRIES = 3
+MAX_HOLD_SEATS = 9  # seats in one hold, like passengers in one booking
+
+_LABEL_RE = re.compile(r'^(\d+)([A-Z])$')
+
+
+class SeatBitmap:
+    """Bitmap view of one cabin. Indices run row by row from the front of the cabin."""
+
+    def __init__(self, cabin, first_row, letters, capacity, bitmap=None, version=0):
+        self.cabin = cabin
+        self.first_row = first_row
+        self.letters = letters
+        self.capacity = capacity
+        self.bits = bytearray(bitmap) if bitmap is not None else bytearray((capacity + 7) // 8)
+        self.version = version
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.cabin, row.first_row, row.letters, row.capacity, row.bitmap, row.version)
+
+    @property
+    def last_row(self):
+        return self.first_row + (self.capacity - 1) // len(self.letters)
+
+    def label(self, idx):
+        width = len(self.letters)
+        return f'{self.first_row + idx // width}{self.letters[idx % width]}'
+
+    def index(self, label):
+        """Seat index for a label like '12A'; ValueError if it is not a seat in this cabin."""
+        m = _LABEL_RE.match(str(label).strip().upper())
+        if not m or m.group(2) not in self.letters:
+            raise ValueError(f'{label} is not a {self.cabin} seat')
+        idx = (int(m.group(1)) - self.first_row) * len(self.letters) + self.letters.index(m.group(2))
+        if not 0 <= idx < self.capacity or int(m.group(1)) < self.first_row:
+            raise ValueError(f'{label} is not a {self.cabin} seat')
+        return idx
+
+    def is_taken(self, idx):
+        return self.bits[idx >> 3] >> (idx & 7) & 1
+
+    def take(self, idx):
+        self.bits[idx >> 3] |= 1 << (idx & 7)
+
+    def release(self, idx):
+        self.bits[idx >> 3] &= ~(1 << (idx & 7)) & 0xFF
+
+    def available(self):
+        return self.capacity - int.from_bytes(self.bits, 'little').bit_count()
+
+    def find_adjacent(self, count, blocked=frozenset()):
+        """
+        Indices of `count` free seats, preferring a contiguous block within one row and
+        falling back to the first free seats in row order. None if the cabin can't fit them.
+        """
+        width = len(self.letters)
+        free = [i for i in range(self.capacity) if not self.is_taken(i) and i not in blocked]
+        if len(free) < count:
+            return None
+        run = []
+        for i in free:
+            if run and (i != run[-1] + 1 or i // width != run[-1] // width):
+                run = []
+            run.append(i)
+            if len(run) == count:
+                return run
+        return free[:count]
+
+    def to_dict(self, held=()):
+        return {
+            'first_row': self.first_row, 'last_row': self.last_row, 'letters': self.letters,
+            'capacity': self.capacity, 'available': self.available(),
+            'taken': [self.label(i) for i in range(self.capacity) if self.is_taken(i)],
+            'held': sorted(held),
+        }
+
+
+# --- Persistence -----------------------------------------------------------------
+
+def _booked_passengers(flight_id):
+    rows = db.session.query(Booking.travel_class, db.func.sum(Booking.num_passengers)) \
+        .filter(Booking.flight_id == flight_id).group_by(Booking.travel_class).all()
+    booked = {'economy': 0, 'business': 0}
+    for cls, n in rows:
+        booked['economy' if cls == 'economy' else 'business'] += n or 0
+    return booked
+
+
+def _build(flight, write_back=True):
+    """
+    Seat maps for a flight that has none yet, replaying seats already sold on it. With
+    write_back=False the seats picked for older bookings are not stored on them.
+    """
+    booked = _booked_passengers(flight.id)
+    business_cap = (flight.business_seats or 0) + booked['business']
+    economy_cap = (flight.economy_seats or 0) + booked['economy']
+    business_rows = (business_cap + len(CABIN_LETTERS['business']) - 1) // len(CABIN_LETTERS['business'])
+    maps = {
+        'business': SeatBitmap('business', 1, CABIN_LETTERS['business'], business_cap),
+        'economy': SeatBitmap('economy', business_rows + 1, CABIN_LETTERS['economy'], economy_cap),
+    }
+    if booked['business'] or booked['economy']:
+        # One-off for flights booked before seat maps existed: keep valid labels,
+        # assign seats to everyone else and write them back onto the booking
+        for b in Booking.query.filter_by(flight_id=flight.id).order_by(Booking.id).all():
+            sm = maps['economy' if b.travel_class == 'economy' else 'business']
+            idxs = []
+            for label in _parse_seats(b.seats):
+                try:
+                    idx = sm.index(label)
+                except ValueError:
+                    continue
+                if not sm.is_taken(idx) and idx not in idxs:
+                    idxs.append(idx)
+            idxs = idxs[:b.num_passengers]
+            if len(idxs) < b.num_passengers:
+                idxs += sm.find_adjacent(b.num_passengers - len(idxs), blocked=frozenset(idxs)) or []
+            for idx in idxs:
+                sm.take(idx)
+            if write_back:
+                b.seats = json.dumps([sm.label(i) for i in idxs])
+    return maps
+
+
+def ensure(flight):
+    """Create the flight's seat maps if they don't exist yet (commits on its own)."""
+    if db.session.query(SeatMap.flight_id).filter_by(flight_id=flight.id).first():
+        return
+    for cabin, sm in _build(flight).items():
+        db.session.add(SeatMap(flight_id=flight.id, cabin=cabin, first_row=sm.first_row,
+                               letters=sm.letters, capacity=sm.capacity, bitmap=bytes(sm.bits), version=0))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request built them first
+        db.session.rollback()
+
+
+def current(flight):
+    """
+    {cabin: SeatBitmap} for reads. A flight with no seat maps yet gets them built in memory
+    and not saved; the first booking or hold on it stores them (ensure()).
+    """
+    rows = db.session.execute(db.select(*SeatMap.__table__.c).where(SeatMap.flight_id == flight.id)).all()
+    if rows:
+        return {row.cabin: SeatBitmap.from_row(row) for row in rows}
+    return _build(flight, write_back=False)
+
+
+def reset(flight_id):
+    """Drop a flight's seat maps (e.g. after its seat counts were edited); they are rebuilt on next use."""
+    SeatMap.query.filter_by(flight_id=flight_id).delete()
+
+
+def load(flight_id, cabin):
+    row = db.session.execute(db.select(*SeatMap.__table__.c)
+                             .where(SeatMap.flight_id == flight_id, SeatMap.cabin == cabin)).first()
+    return SeatBitmap.from_row(row) if row else None
+
+
+def _save(sm, flight_id):
+    """Compare-and-swap the bitmap; False if someone else wrote it since it was loaded."""
+    res = db.session.execute(
+        db.update(SeatMap)
+        .where(SeatMap.flight_id == flight_id, SeatMap.cabin == sm.cabin, SeatMap.version == sm.version)
+        .values(bitmap=bytes(sm.bits), version=sm.version + 1),
+        execution_options={'synchronize_session': False})
+    return res.rowcount == 1
+
+
+def _parse_seats(seats):
+    try:
+        labels = json.loads(seats) if isinstance(seats, str) else (seats or [])
+    except ValueError:
+        return []
+    return [str(s).strip().upper() for s in labels] if isinstance(labels, list) else []
+
+
+def assign(flight_id, cabin, count, requested=None, hold=None):
+    """
+    Mark seats taken for a booking, in the caller's transaction, and return their labels.
+    `requested` are explicit labels (must be free, or covered by `hold`); otherwise the
+    held seats are used, or adjacent seats are picked. Raises InventoryConflict.
+    """
+    if hold and (hold.flight_id != flight_id or hold.cabin != cabin):
+        hold = None
+    if not requested and hold:
+        requested = list(hold.seats)
+    requested = [str(s).strip().upper() for s in requested or []]
+    for _ in range(CAS_RETRIES):
+        sm = load(flight_id, cabin)
+        if sm is None:
+            raise InventoryConflict('Seat map not available for this flight')
+        blocked = holds.blocked(flight_id, cabin, sm, exclude=hold.id if hold else None)
+        if requested:
+            if len(requested) != count:
+                raise InventoryConflict(f'Select exactly {count} seat(s)', seats=requested)
+            try:
+                idxs = [sm.index(label) for label in requested]
+            except ValueError as e:
+                raise InventoryConflict(str(e), seats=requested)
+            taken = [sm.label(i) for i in idxs if sm.is_taken(i) or i in blocked]
+            if taken or len(set(idxs)) != len(idxs):
+                raise InventoryConflict('Seats no longer available', seats=taken or requested)
+        else:
+            idxs = sm.find_adjacent(count, blocked)
+            if idxs is None:
+                raise InventoryConflict(f'Not enough seats. Only {sm.available()} available.',
+                                        available=sm.available())
+        for i in idxs:
+            sm.take(i)
+        if _save(sm, flight_id):
+            return [sm.label(i) for i in idxs]
+    raise InventoryConflict('Seat map is busy, please retry')
+
+
+def release(flight_id, cabin, *seat_lists):
+    """Free the seats of one or more cancelled bookings (their `seats` values), in the caller's transaction."""
+    labels = [label for seats in seat_lists for label in _parse_seats(seats)]
+    for _ in range(CAS_RETRIES):
+        sm = load(flight_id, cabin)
+        if sm is None:
+            return
+        for label in labels:
+            try:
+                sm.release(sm.index(label))
+            except ValueError:
+                pass
+        if _save(sm, flight_id):
+            return
+
+
+# --- Holds -----------------------------------------------------------------------
+
+def _indexes(sm, labels):
+    """Bitmap indexes of held `labels`, skipping seats the map no longer has (its cabin was shrunk)."""
+    out = set()
+    for label in labels:
+        try:
+            out.add(sm.index(label))
+        except ValueError:
+            pass
+    return frozenset(out)
+
+
+class Hold:
+    __slots__ = ('id', 'flight_id', 'cabin', 'seats', 'user_id', 'expires')
+
+    def __init__(self, flight_id, cabin, seats, user_id, ttl):
+        self.id = secrets.token_urlsafe(12)
+        self.flight_id = flight_id
+        self.cabin = cabin
+        self.seats = tuple(seats)
+        self.user_id = user_id
+        self.expires = time.monotonic() + ttl
+
+    def to_dict(self):
+        return {'hold_id': self.id, 'flight_id': self.flight_id, 'travel_class': self.cabin,
+                'seats': list(self.seats), 'expires_in': max(0, round(self.expires - time.monotonic()))}
+
+
+class SeatHolds:
+    """In-process seat holds keyed by hold id; expired holds are dropped lazily on access."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._holds = {}
+        self._by_flight = {}
+        self._by_user = {}  # user id -> number of live holds
+
+    def _purge(self, now):
+        for hid in [h.id for h in self._holds.values() if h.expires <= now]:
+            self._drop(hid)
+
+    def _drop(self, hold_id):
+        h = self._holds.pop(hold_id, None)
+        if h:
+            ids = self._by_flight.get(h.flight_id)
+            if ids:
+                ids.discard(hold_id)
+                if not ids:
+                    del self._by_flight[h.flight_id]
+            self._by_user[h.user_id] -= 1
+            if not self._by_user[h.user_id]:
+                del self._by_user[h.user_id]
+        return h
+
+    def get(self, hold_id):
+        with self._lock:
+            h = self._holds.get(hold_id)
+            if h and h.expires <= time.monotonic():
+                self._drop(hold_id)
+                return None
+            return h
+
+    def held_labels(self, flight_id, cabin, exclude=None):
+        with self._lock:
+            self._purge(time.monotonic())
+            return {s for hid in self._by_flight.get(flight_id, ())
+                    for h in (self._holds[hid],) if h.cabin == cabin and hid != exclude for s in h.seats}
+
+    def blocked(self, flight_id, cabin, sm, exclude=None):
+        return _indexes(sm, self.held_labels(flight_id, cabin, exclude))
+
+    def hold(self, sm, flight_id, user_id, count=None, labels=None, ttl=300, max_per_user=None):
+        """
+        Hold `labels` (or `count` adjacent seats) for `user_id` for `ttl` seconds. Raises
+        InventoryConflict, also when the user already has `max_per_user` live holds.
+        """
+        with self._lock:
+            self._purge(time.monotonic())
+            if max_per_user is not None and self._by_user.get(user_id, 0) >= max_per_user:
+                raise InventoryConflict(f'At most {max_per_user} seat holds at a time; release one first')
+            blocked = _indexes(sm, (s for hid in self._by_flight.get(flight_id, ())
+                                    for h in (self._holds[hid],) if h.cabin == sm.cabin for s in h.seats))
+            if labels:
+                try:
+                    idxs = [sm.index(label) for label in labels]
+                except ValueError as e:
+                    raise InventoryConflict(str(e), seats=labels)
+                taken = [sm.label(i) for i in idxs if sm.is_taken(i) or i in blocked]
+                if taken or len(set(idxs)) != len(idxs):
+                    raise InventoryConflict('Seats no longer available', seats=taken or labels)
+            else:
+                idxs = sm.find_adjacent(count, blocked)
+                if idxs is None:
+                    raise InventoryConflict('Not enough seats available to hold', available=sm.available())
+            h = Hold(flight_id, sm.cabin, [sm.label(i) for i in idxs], user_id, ttl)
+            self._holds[h.id] = h
+            self._by_flight.setdefault(flight_id, set()).add(h.id)
+            self._by_user[user_id] = self._by_user.get(user_id, 0) + 1
+            return h
+
+    def release(self, hold_id, user_id=None):
+        with self._lock:
+            h = self._holds.get(hold_id)
+            if h and (user_id is None or h.user_id == user_id):
+                return self._drop(hold_id)
+            return None
+
+
+holds = SeatHolds()
@@ -1,6 +1,20 @@
+import random
 from datetime import datetime, timedelta
-from app import db
-from app.models import User, Flight
+from app import db, fare_calendar, hashing
+from app.models import User, Flight, Booking, LedgerEntry, bookings_archive, flights_archive, normalize_place
+
+SYNTHETIC_CITIES = ['Mumbai', 'Delhi', 'Bangalore', 'Chennai', 'Kolkata', 'Hyderabad', 'Pune', 'Goa',
+                    'Ahmedabad', 'Jaipur', 'Kochi', 'Lucknow', 'Dubai', 'London', 'Singapore', 'New York',
+                    'Paris', 'Tokyo', 'Sydney', 'Frankfurt', 'Bangkok', 'Doha', 'Colombo', 'Kathmandu']
+SYNTHETIC_MAX_BOOKING = 59900 * 2 * 3 + 500 * 3  # INR: 3 business seats at the top synthetic fare
+
+
+def _flight_row(**values):
+    values['source_key'] = normalize_place(values['source'])
+    values['destination_key'] = normalize_place(values['destination'])
+    values.setdefault('created_at', datetime.utcnow())
+    return values
+
 
 def seed_database():
     if User.query.filter_by(username='admin').first():
@@ -8,7 +22,7 @@ def seed_database():
     admin = User(username='admin', role='admin')
     admin.set_password('admin123')
     db.session.add(admin)
-    
+
     bases = [
         ('Mumbai', 'Delhi', 4500, 12000),
         ('Delhi', 'Bangalore', 5500, 14000),
@@ -23,18 +37,120 @@ def seed_database():
     ]
     t = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     flight_num = 1
+    rows = []
     # For each route, create a flight for each of the next 30 days so search always finds results
     for route_idx, (src, dest, ep, bp) in enumerate(bases):
         for day_offset in range(30):
             dep = t + timedelta(days=day_offset, hours=6 + (route_idx % 12), minutes=0)
             arr = dep + timedelta(hours=2 + (route_idx % 5))
-            f = Flight(
+            rows.append(_flight_row(
                 flight_number=f'SA{flight_num:03d}',
                 source=src, destination=dest,
                 departure_time=dep, arrival_time=arr,
                 economy_price=ep, business_price=bp,
                 economy_seats=60, business_seats=20
-            )
-            db.session.add(f)
+            ))
             flight_num += 1
+    db.session.execute(db.insert(Flight), rows)
     db.session.commit()
+    fare_calendar.rebuild()
+
+
+def _next_id(model, archive=None):
+    """First id after those in use, including ids moved to `archive` (see app/archive.py)."""
+    last = db.session.query(db.func.max(model.id)).scalar() or 0
+    if archive is not None:
+        last = max(last, db.session.query(db.func.max(archive.c.id)).scalar() or 0)
+    return last + 1
+
+
+def seed_synthetic(flights=0, users=0, bookings=0, days=365, chunk_size=20000, seed=None, progress=None,
+                   history_days=0):
+    """
+    Bulk-generate a synthetic schedule, customers and bookings for load tests.
+
+    Rows get explicit ids after the current maximum and are inserted with executemany in
+    chunks, one commit per chunk. All synthetic customers share one password ('password')
+    and answers ('a'), hashed once. Bookings are spread over the new flights and their seat
+    counts are reduced to match; `progress(kind, done)` is called after each chunk.
+    Departures are spread over the next `days` days and the `history_days` before today.
+    """
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    t0 = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    counts = {'flights': 0, 'users': 0, 'bookings': 0}
+
+    user_start = _next_id(User)
+    # Enough for twice a customer's share of the bookings at the highest fare, so no balance goes negative
+    opening = max(10000000, -(-bookings // max(users, 1)) * 2 * SYNTHETIC_MAX_BOOKING)
+    if users:
+        password_hash, answer_hash = hashing.hash_many(['password', 'a'])
+        for lo in range(0, users, chunk_size):
+            rows = [{'id': user_start + i, 'username': f'user{user_start + i}', 'password_hash': password_hash,
+                     'role': 'customer', 'created_at': now,
+                     'q1': "What is your mother's maiden name?", 'q2': 'What was the name of your first pet?',
+                     'q3': 'In which city were you born?',
+                     'a1_hash': answer_hash, 'a2_hash': answer_hash, 'a3_hash': answer_hash}
+                    for i in range(lo, min(users, lo + chunk_size))]
+            db.session.execute(db.insert(User), rows)
+            db.session.execute(db.insert(LedgerEntry), [
+                {'user_id': row['id'], 'amount_paise': opening * 100, 'kind': 'opening', 'created_at': now}
+                for row in rows])
+            db.session.commit()
+            counts['users'] += len(rows)
+            if progress:
+                progress('users', counts['users'])
+    customer_ids = (user_start, user_start + users - 1) if users else None
+    if bookings and not customer_ids:
+        first = db.session.query(db.func.min(User.id)).filter(User.role == 'customer').scalar()
+        last = db.session.query(db.func.max(User.id)).filter(User.role == 'customer').scalar()
+        customer_ids = (first, last) if first else None
+
+    flight_start = _next_id(Flight, flights_archive)
+    booking_id = _next_id(Booking, bookings_archive)
+    per_flight = bookings / flights if flights and customer_ids else 0
+    owed = 0.0
+    for lo in range(0, flights, chunk_size):
+        flight_rows, booking_rows = [], []
+        for i in range(lo, min(flights, lo + chunk_size)):
+            fid = flight_start + i
+            src, dest = rnd.sample(SYNTHETIC_CITIES, 2)
+            dep = t0 + timedelta(days=rnd.randrange(-history_days, days), minutes=rnd.randrange(5, 24 * 60, 5))
+            ep = rnd.randrange(3000, 60000, 100)
+            seats = {'economy': 60, 'business': 20}
+            owed += per_flight
+            while owed >= 1 and counts['bookings'] + len(booking_rows) < bookings:
+                owed -= 1
+                cls = 'economy' if rnd.random() < 0.8 else 'business'
+                n = min(rnd.randint(1, 3), seats[cls])
+                if not n:
+                    continue
+                seats[cls] -= n
+                booking_rows.append({
+                    'id': booking_id, 'user_id': rnd.randint(*customer_ids), 'flight_id': fid,
+                    'trip_type': 'one_way', 'travel_class': cls, 'num_passengers': n,
+                    'date_depart': dep.date(), 'seats': '[]', 'meal_preference': 'veg', 'extra_baggage_kg': 0,
+                    'total_amount': (ep if cls == 'economy' else ep * 2) * n + 500 * n,
+                    'status': 'confirmed', 'created_at': now - timedelta(minutes=rnd.randrange(60 * 24 * 90)),
+                })
+                booking_id += 1
+            flight_rows.append(_flight_row(
+                id=fid, flight_number=f'SY{fid:07d}', source=src, destination=dest,
+                departure_time=dep, arrival_time=dep + timedelta(minutes=rnd.randrange(60, 15 * 60, 5)),
+                economy_price=ep, business_price=ep * 2,
+                economy_seats=seats['economy'], business_seats=seats['business'], created_at=now))
+        db.session.execute(db.insert(Flight), flight_rows)
+        if booking_rows:
+            db.session.execute(db.insert(Booking), booking_rows)
+            # Paid for like a real booking, so cancelling one refunds what was charged
+            db.session.execute(db.insert(LedgerEntry), [
+                {'user_id': b['user_id'], 'amount_paise': -b['total_amount'] * 100, 'kind': 'booking',
+                 'booking_id': b['id'], 'created_at': now} for b in booking_rows])
+        db.session.commit()
+        counts['flights'] += len(flight_rows)
+        counts['bookings'] += len(booking_rows)
+        if progress:
+            progress('flights', counts['flights'])
+    if counts['flights']:
+        fare_calendar.rebuild()
+    return counts
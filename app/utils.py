@@ -1,11 +1,117 @@
 """
 Single auth layer: create tokens with PyJWT and require_user() that reads token
-from body, query, or header. No Flask-JWT-Extended so no proxy/header/sub issues.
+from header, query, or body. No Flask-JWT-Extended so no proxy/header/sub issues.
 """
-from flask import request, jsonify, current_app
+import threading
+import time
+from collections import OrderedDict
+from flask import request, jsonify, current_app, g
+from sqlalchemy.orm import make_transient_to_detached
 import jwt as pyjwt
+from app import db
 from app.models import User
 
+# Bodies that are streamed by their endpoint and must not be read looking for a token
+STREAMED_MIMETYPES = ('text/csv', 'application/x-ndjson', 'application/jsonl')
+
+# User.balance is not a column (it comes from the ledger on access), so all columns can be cached
+_CACHED_COLUMNS = [c.key for c in User.__table__.columns]
+
+
+class IdentityCache:
+    """Bounded LRU of User column snapshots keyed by user id, each valid for `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uid):
+        with self._lock:
+            entry = self._data.get(uid)
+            if entry and entry[0] > time.monotonic():
+                self._data.move_to_end(uid)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._data[uid]
+            self.misses += 1
+            return None
+
+    def put(self, uid, values):
+        with self._lock:
+            self._data[uid] = (time.monotonic() + self.ttl, values)
+            self._data.move_to_end(uid)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._data.pop(uid, None)
+
+
+def init_identity_cache(app):
+    app.extensions['identity_cache'] = IdentityCache(app.config.get('IDENTITY_CACHE_SIZE', 10000),
+                                                     app.config.get('IDENTITY_CACHE_TTL', 60))
+
+    @app.after_request
+    def _tag_identity_cache(response):
+        if 'identity_cache' in g:
+            response.headers['X-Identity-Cache'] = g.identity_cache
+        return response
+
+
+def invalidate_identity(user_id):
+    """Call after changing or deleting a user so require_user() stops serving the cached copy."""
+    current_app.extensions['identity_cache'].invalidate(user_id)
+
+
+def _load_user(uid):
+    """User attached to the current session, from the identity cache when possible (no SELECT)."""
+    cache = current_app.extensions['identity_cache']
+    values = cache.get(uid)
+    if values is not None:
+        g.identity_cache = 'hit'
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+    g.identity_cache = 'miss'
+    user = db.session.get(User, uid)
+    if user:
+        cache.put(uid, {k: getattr(user, k) for k in _CACHED_COLUMNS})
+    return user
+
+
+def _extract_token():
+    """Token from headers or query string; the body is only parsed when neither has one."""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        token = auth_header[7:].strip()
+        if token:
+            return token
+    token = (request.headers.get('X-Auth-Token') or request.args.get('token') or '').strip()
+    # A chunked body has no Content-Length but may still carry the token
+    has_body = request.content_length or 'chunked' in request.headers.get('Transfer-Encoding', '').lower()
+    if token or not has_body or request.mimetype in STREAMED_MIMETYPES:
+        return token
+    data = request.get_json(silent=True, force=True)
+    return (data.get('token') or '').strip() if isinstance(data, dict) else ''
+
+
+def token_claims():
+    """The request's verified JWT claims without loading the user ({} when there is no valid token)."""
+    token = _extract_token()
+    if not token:
+        return {}
+    try:
+        return pyjwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'],
+                            options={'verify_exp': False})
+    except pyjwt.InvalidTokenError:
+        return {}
+
 
 def create_token(user, extra=None):
     """Build JWT with sub=str(user.id) and role. No expiry for demo. Optional extra claims."""
@@ -21,20 +127,11 @@ def create_token(user, extra=None):
 
 def require_user():
     """
-    Get JWT from (1) JSON body 'token', (2) query ?token=, (3) Authorization Bearer, (4) X-Auth-Token.
+    Get JWT from (1) Authorization Bearer, (2) X-Auth-Token, (3) query ?token=, (4) JSON body 'token'.
     Decode with PyJWT, return (user, payload, None) or (None, None, error_response).
+    The user comes from the identity cache when possible; X-Identity-Cache says hit or miss.
     """
-    token = None
-    data = request.get_json(silent=True, force=True) or {}
-    token = (data.get('token') or '').strip()
-    if not token:
-        token = (request.args.get('token') or '').strip()
-    if not token:
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header[7:].strip()
-    if not token:
-        token = (request.headers.get('X-Auth-Token') or '').strip()
+    token = _extract_token()
     if not token:
         return None, None, (jsonify({'error': 'Authorization required. Please sign in again.'}), 401)
     try:
@@ -51,7 +148,7 @@ def require_user():
             uid = int(sub)
         except (TypeError, ValueError):
             return None, None, (jsonify({'error': 'Invalid token. Please sign in again.'}), 401)
-        user = User.query.get(uid)
+        user = _load_user(uid)
         if not user:
             return None, None, (jsonify({'error': 'User not found'}), 404)
         return user, payload, None
@@ -0,0 +1,97 @@
+"""
+Search latency under a login flood, with and without admission control.
+
+The app is served from a fixed pool of --server-threads threads, like one gunicorn
+gthread worker. Requests wait for a free server thread and that wait counts in their
+latency. For --seconds:
+- --flood client threads send logins back to back (bcrypt)
+- --searchers threads send exact route searches (response cache off)
+
+Each configuration runs on the same app settings:
+
+    off       admission control off (the default)
+    caps      ADMISSION_CONTROL=1 with the default (derived) limits, auth rate limits off
+    caps+rate ADMISSION_CONTROL=1 with the default limits and rate limits
+
+    python benchmarks/admission_bench.py [--seconds 8] [--flood 8] [--searchers 2] [--server-threads 4]
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from common import make_app
+from app.seed import SYNTHETIC_CITIES, seed_synthetic
+
+CONFIGS = [
+    ('off', {'ADMISSION_CONTROL': False}),
+    ('caps', {'ADMISSION_CONTROL': True, 'AUTH_RATE_PER_IP': '', 'AUTH_RATE_PER_ACCOUNT': ''}),
+    ('caps+rate', {'ADMISSION_CONTROL': True}),
+]
+
+
+def run(overrides, args):
+    app = make_app(SEARCH_CACHE_SIZE=0, BCRYPT_ROUNDS=args.rounds, WEB_THREADS=args.server_threads, **overrides)
+    with app.app_context():
+        seed_synthetic(flights=20000, users=args.users, days=30, seed=1)
+    client = app.test_client()
+    server = ThreadPoolExecutor(args.server_threads)
+    stop = time.monotonic() + args.seconds
+    search_ms, statuses = [], {'login': Counter(), 'search': Counter()}
+    lock = threading.Lock()
+
+    def call(kind, method, url, body=None):
+        t = time.perf_counter()
+        r = server.submit(lambda: client.open(url, method=method, json=body)).result()
+        with lock:
+            statuses[kind][r.status_code] += 1
+            if kind == 'search':
+                search_ms.append((time.perf_counter() - t) * 1000)
+
+    def flooder(n):
+        rnd = random.Random(n)
+        while time.monotonic() < stop:
+            user = f'user{rnd.randint(2, args.users + 1)}'
+            call('login', 'POST', '/api/auth/login', {'username': user, 'password': 'password'})
+
+    def searcher(n):
+        rnd = random.Random(1000 + n)
+        while time.monotonic() < stop:
+            src, dest = rnd.sample(SYNTHETIC_CITIES, 2)
+            day = date.today() + timedelta(days=rnd.randrange(30))
+            call('search', 'GET', f'/api/flights/?source={src}&destination={dest}&date={day}&match=exact')
+
+    threads = [threading.Thread(target=flooder, args=(i,)) for i in range(args.flood)] + \
+              [threading.Thread(target=searcher, args=(i,)) for i in range(args.searchers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    server.shutdown()
+    search_ms.sort()
+    pct = lambda p: search_ms[min(len(search_ms) - 1, int(len(search_ms) * p))] if search_ms else 0  # noqa: E731
+    return len(search_ms) / args.seconds, pct(0.5), pct(0.95), pct(0.99), statuses
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seconds', type=float, default=8)
+    ap.add_argument('--flood', type=int, default=8)
+    ap.add_argument('--searchers', type=int, default=2)
+    ap.add_argument('--server-threads', type=int, default=4)
+    ap.add_argument('--users', type=int, default=200)
+    ap.add_argument('--rounds', type=int, default=10, help='BCRYPT_ROUNDS for the seeded users and logins.')
+    args = ap.parse_args()
+
+    print(f"{'admission':<10} {'search/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)  login statuses")
+    for name, overrides in CONFIGS:
+        rate, p50, p95, p99, statuses = run(overrides, args)
+        logins = ' '.join(f'{code}:{n}' for code, n in sorted(statuses['login'].items()))
+        print(f'{name:<10} {rate:>8.1f} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}        {logins}')
+
+
+if __name__ == '__main__':
+    main()
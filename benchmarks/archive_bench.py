@@ -0,0 +1,81 @@
+"""
+Search and booking-history latency before and after archiving a multi-year history.
+
+Seeds --flights synthetic flights spread over the past --years and the next 90 days,
+with one booking per flight. It times these requests, archives every flight that
+departed more than a day ago (app.archive), and times them again:
+
+    search exact      GET /api/flights/?source=Mumbai&destination=Delhi&date=<today>&match=exact
+    route, no date    GET /api/flights/?source=<city>&destination=<city>&match=exact
+    route contains    the same with match=contains and partial names (a scan of the flights table)
+    history           GET /api/bookings/?limit=50 as a customer; reads both tiers after archiving
+
+    python benchmarks/archive_bench.py [--flights 300000] [--years 3] [--repeat 50]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from common import make_app
+from app import archive, db, ledger
+from app.models import Booking, Flight, User
+from app.seed import seed_synthetic
+from app.utils import create_token
+
+
+def timed(client, url, headers, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        r = client.get(url, headers=headers)
+        samples.append(time.perf_counter() - t)
+        assert r.status_code == 200, (url, r.status_code)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--flights', type=int, default=300000)
+    ap.add_argument('--years', type=int, default=3)
+    ap.add_argument('--repeat', type=int, default=50)
+    args = ap.parse_args()
+
+    app = make_app(SEARCH_CACHE_SIZE=0)
+    with app.app_context():
+        seed_synthetic(flights=args.flights, users=2000, bookings=args.flights, days=90,
+                       history_days=365 * args.years, seed=1)
+        customer = db.session.get(User, db.session.scalar(
+            db.select(Booking.user_id).group_by(Booking.user_id).order_by(db.func.count().desc()).limit(1)))
+        auth = {'Authorization': 'Bearer ' + create_token(customer)}
+        src, dest = db.session.execute(db.select(Flight.source, Flight.destination)
+                                       .where(Flight.flight_number.like('SY%')).limit(1)).one()
+    client = app.test_client()
+    day = datetime.utcnow().date().isoformat()
+    cases = [
+        ('search exact', f'/api/flights/?source=Mumbai&destination=Delhi&date={day}&match=exact', None, args.repeat),
+        ('route, no date', f'/api/flights/?source={src}&destination={dest}&match=exact', None, args.repeat),
+        ('route contains', f'/api/flights/?source={src[:4]}&destination={dest[:4]}&match=contains', None,
+         max(5, args.repeat // 10)),
+        ('history', '/api/bookings/?limit=50', auth, args.repeat),
+    ]
+    before = [timed(client, url, headers, n) for _, url, headers, n in cases]
+
+    with app.app_context():
+        t = time.perf_counter()
+        counts = archive.archive(archive.cutoff(app.config), app.config['ARCHIVE_CHUNK_SIZE'])
+        elapsed = time.perf_counter() - t
+        hot = db.session.query(db.func.count(Flight.id)).scalar()
+        problems = ledger.reconcile()['problems']
+    print(f"Archived {counts['flights']} flights and {counts['bookings']} bookings in {elapsed:.1f}s "
+          f"({counts['flights'] / elapsed:.0f} flights/s); {hot} flights left hot; "
+          f"ledger {'OK' if not problems else problems[:3]}")
+    after = [timed(client, url, headers, n) for _, url, headers, n in cases]
+
+    print(f"{'request':<16} {'before p50':>10} {'p95':>8} {'after p50':>10} {'p95':>8} {'speedup':>8}  (ms)")
+    for (name, *_), old, new in zip(cases, before, after):
+        print(f'{name:<16} {old[0]:>10.2f} {old[1]:>8.2f} {new[0]:>10.2f} {new[1]:>8.2f} {old[0] / new[0]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
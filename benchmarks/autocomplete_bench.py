@@ -0,0 +1,93 @@
+"""
+Autocomplete lookup latency.
+
+Builds a PlaceIndex over --places synthetic place names (one or two random words,
+random flight counts) and times suggest() for:
+
+    prefix    1 to 4 leading characters of a name or of a later word
+    full      a whole name
+    typo      a name of 6+ characters with one random edit (falls back to the fuzzy walk)
+    miss      random letters (walks the trie, then the fuzzy walk finds nothing)
+
+It then times GET /api/flights/autocomplete end to end on the demo app.
+
+    python benchmarks/autocomplete_bench.py [--places 5000] [--queries 20000]
+"""
+import argparse
+import random
+import string
+import time
+
+from common import make_app
+from app.autocomplete import PlaceIndex
+from app.models import normalize_place
+
+LETTERS = string.ascii_lowercase
+
+
+def word(rnd):
+    syllables = ['ba', 'la', 'pur', 'nag', 'ko', 'ta', 'ri', 'man', 'del', 'gar', 'hi', 'sa', 'vi', 'ran', 'go']
+    return ''.join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4))).capitalize()
+
+
+def typo(rnd, s):
+    i = rnd.randrange(len(s))
+    op = rnd.choice('sdi')
+    if op == 's':
+        return s[:i] + rnd.choice(LETTERS) + s[i + 1:]
+    if op == 'd':
+        return s[:i] + s[i + 1:]
+    return s[:i] + rnd.choice(LETTERS) + s[i:]
+
+
+def timed(index, queries):
+    samples = []
+    for q in queries:
+        t = time.perf_counter()
+        index.suggest(q)
+        samples.append(time.perf_counter() - t)
+    samples.sort()
+    return samples[len(samples) // 2] * 1e6, samples[int(len(samples) * 0.99)] * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--places', type=int, default=5000)
+    ap.add_argument('--queries', type=int, default=20000)
+    args = ap.parse_args()
+    rnd = random.Random(1)
+
+    names = set()
+    while len(names) < args.places:
+        names.add(word(rnd) if rnd.random() < 0.7 else f'{word(rnd)} {word(rnd)}')
+    names = sorted(names)
+    t = time.perf_counter()
+    index = PlaceIndex.build([(normalize_place(n), n, rnd.randint(1, 5000)) for n in names], codes={})
+    print(f'{len(names)} places indexed in {(time.perf_counter() - t) * 1000:.0f} ms')
+
+    def sample(make):
+        return [make(rnd.choice(names)) for _ in range(args.queries)]
+    cases = [
+        ('prefix', sample(lambda n: rnd.choice(n.split())[:rnd.randint(1, 4)])),
+        ('full', sample(lambda n: n)),
+        ('typo', sample(lambda n: typo(rnd, n.split()[0]) if len(n.split()[0]) >= 6 else typo(rnd, n))),
+        ('miss', [''.join(rnd.choice(LETTERS) for _ in range(rnd.randint(3, 8))) for _ in range(args.queries)]),
+    ]
+    print(f"{'query':<8} {'p50':>8} {'p99':>8}  (us)")
+    for name, queries in cases:
+        p50, p99 = timed(index, queries)
+        print(f'{name:<8} {p50:>8.1f} {p99:>8.1f}')
+
+    client = make_app().test_client()
+    samples = []
+    for q in ['m', 'mum', 'bom', 'dehli', 'york', 'sin'] * 200:
+        t = time.perf_counter()
+        r = client.get(f'/api/flights/autocomplete?q={q}')
+        samples.append(time.perf_counter() - t)
+        assert r.status_code == 200
+    samples.sort()
+    print(f'endpoint p50 {samples[len(samples) // 2] * 1000:.2f} ms, p99 {samples[int(len(samples) * 0.99)] * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Concurrent booking stress test: many threads book the same flight at once.
+
+Checks afterwards that seats sold + seats left == capacity, that no seat label was
+assigned twice, that no balance went negative and that every non-201 answer was a
+clean 409 (or a 503 shed on lock timeout). Exits non-zero on any violation and
+prints bookings/sec.
+
+    python benchmarks/booking_stress.py [--threads 64] [--requests 1000] [--seats 300] [--db-dir /dev/shm]
+        [--pipeline [--batch-size 32]]
+
+Use --db-dir on tmpfs to take disk fsync latency out of the throughput number.
+Lock-timeout 503s are counted as shed load, not failures. --pipeline runs the same
+checks with bookings group-committed (BOOKING_PIPELINE).
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from common import make_app
+from app import db, ledger
+from app.models import Booking, Flight, User
+from app.utils import create_token
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--threads', type=int, default=64)
+    ap.add_argument('--requests', type=int, default=1000)
+    ap.add_argument('--seats', type=int, default=300)
+    ap.add_argument('--users', type=int, default=50)
+    ap.add_argument('--db-dir', default=None)
+    ap.add_argument('--pipeline', action='store_true')
+    ap.add_argument('--batch-size', type=int, default=32)
+    args = ap.parse_args()
+
+    app = make_app(db_dir=args.db_dir, BOOKING_PIPELINE=args.pipeline, BOOKING_BATCH_SIZE=args.batch_size)
+    with app.app_context():
+        dep = datetime.utcnow() + timedelta(days=1)
+        flight = Flight(flight_number='STRESS1', source='Mumbai', destination='Delhi',
+                        departure_time=dep, arrival_time=dep + timedelta(hours=2),
+                        economy_price=1000, business_price=3000,
+                        economy_seats=args.seats, business_seats=0)
+        db.session.add(flight)
+        users = []
+        for i in range(args.users):
+            # Enough for only a few bookings each, so balance races show up too
+            u = User(username=f'stress{i}', role='customer', password_hash='x')
+            db.session.add(u)
+            ledger.open_account(u, 5 * 1500)
+            users.append(u)
+        db.session.commit()
+        flight_id = flight.id
+        tokens = [create_token(u) for u in users]
+        user_ids = [u.id for u in users]
+
+    statuses = Counter()
+    lock = threading.Lock()
+    per_thread = args.requests // args.threads
+    day = (datetime.utcnow() + timedelta(days=1)).date().isoformat()
+
+    def worker(n):
+        client = app.test_client()
+        local = Counter()
+        for i in range(per_thread):
+            token = tokens[(n * per_thread + i) % len(tokens)]
+            r = client.post('/api/bookings/', json={
+                'token': token, 'flight_id': flight_id, 'date_depart': day,
+                'travel_class': 'economy', 'num_passengers': 1 + i % 3, 'meal_preference': ''})
+            local[r.status_code] += 1
+        with lock:
+            statuses.update(local)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    failures = []
+    with app.app_context():
+        left = db.session.get(Flight, flight_id).economy_seats
+        sold = db.session.query(db.func.coalesce(db.func.sum(Booking.num_passengers), 0)) \
+            .filter(Booking.flight_id == flight_id).scalar()
+        spent = db.session.query(db.func.coalesce(db.func.sum(Booking.total_amount), 0)).scalar()
+        balances = [ledger.from_paise(b) for b in ledger.balances_paise(user_ids).values()]
+        problems = ledger.reconcile()['problems']
+        labels = [s for (seats,) in db.session.query(Booking.seats).filter(Booking.flight_id == flight_id)
+                  for s in json.loads(seats)]
+    if left < 0:
+        failures.append(f'seats went negative: {left}')
+    if sold + left != args.seats:
+        failures.append(f'oversold: sold {sold} + left {left} != capacity {args.seats}')
+    if len(labels) != len(set(labels)) or len(labels) != sold:
+        failures.append(f'seat map mismatch: {len(labels)} labels, {len(set(labels))} distinct, {sold} sold')
+    if min(balances) < 0:
+        failures.append(f'negative balance: {min(balances)}')
+    if abs(sum(balances) + spent - 5 * 1500 * args.users) > 1e-6:
+        failures.append('balances do not add up to spend')
+    if problems:
+        failures.append(f'ledger does not reconcile: {problems[:3]}')
+    unexpected = {s: n for s, n in statuses.items() if s not in (201, 409, 503)}
+    if unexpected:
+        failures.append(f'unexpected statuses: {unexpected}')
+
+    total = sum(statuses.values())
+    print(f'{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s, '
+          f'{statuses[201] / elapsed:.0f} bookings/s) statuses={dict(statuses)}')
+    print(f'seats sold={sold} left={left} capacity={args.seats}')
+    if failures:
+        print('FAIL: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK: no oversell, no negative balances')
+
+
+if __name__ == '__main__':
+    main()
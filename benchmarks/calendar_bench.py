@@ -0,0 +1,68 @@
+"""
+Fare calendar vs one flight search per day.
+
+Seeds --flights synthetic flights over the next 365 days and compares, for one route:
+
+    per-day search   GET /api/flights/?source=..&destination=..&date=<day>, once for each of --days days
+                     (the default 'contains' match, as the frontend sends it)
+    calendar         GET /api/flights/calendar?source=..&destination=..&days=<days>, once
+
+The response cache is off, so both paths hit the DB.
+
+    python benchmarks/calendar_bench.py [--flights 100000] [--days 30] [--repeat 20]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from common import make_app
+from app import db
+from app.models import Flight
+from app.seed import seed_synthetic
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--flights', type=int, default=100000)
+    ap.add_argument('--days', type=int, default=30)
+    ap.add_argument('--repeat', type=int, default=20)
+    args = ap.parse_args()
+
+    app = make_app(SEARCH_CACHE_SIZE=0)
+    with app.app_context():
+        seed_synthetic(flights=args.flights, seed=1)
+        src, dest = db.session.execute(db.select(Flight.source, Flight.destination)
+                                       .where(Flight.flight_number.like('SY%')).limit(1)).one()
+    client = app.test_client()
+    today = date.today()
+
+    def per_day():
+        for i in range(args.days):
+            r = client.get(f'/api/flights/?source={src}&destination={dest}&date={today + timedelta(days=i)}')
+            assert r.status_code == 200
+
+    def calendar(days):
+        r = client.get(f'/api/flights/calendar?source={src}&destination={dest}&days={days}')
+        assert r.status_code == 200 and len(r.json['days']) == days
+
+    print(f'{src} -> {dest}, {args.flights} flights')
+    print(f"{'request':<24} {'p50':>8} {'p95':>8}  (ms)")
+    for name, fn in ((f'{args.days} per-day searches', per_day),
+                     (f'calendar, {args.days} days', lambda: calendar(args.days)),
+                     ('calendar, 90 days', lambda: calendar(90))):
+        p50, p95 = timed(fn, args.repeat)
+        print(f'{name:<24} {p50:>8.2f} {p95:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""Shared setup for the benchmark scripts: an app on a throwaway SQLite DB with schema and seed data."""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.seed import seed_database
+from config import Config
+
+
+def make_app(db_dir=None, **overrides):
+    """create_app() on a fresh temp DB (in `db_dir` if given), tables created and demo data seeded."""
+    overrides.setdefault('SQLALCHEMY_DATABASE_URI',
+                         'sqlite:///' + os.path.join(tempfile.mkdtemp(dir=db_dir), 'bench.db'))
+    app = create_app(type('BenchConfig', (Config,), overrides))
+    with app.app_context():
+        db.create_all()
+        seed_database()
+    return app
@@ -0,0 +1,47 @@
+"""
+Connecting-itinerary search latency on a large schedule.
+
+Fills a temp DB with --flights synthetic flights (see search_bench.grow), builds the
+ConnectionIndex and times GET /api/flights/connections for 2- and 3-leg searches.
+
+    python benchmarks/connections_bench.py [--flights 300000] [--repeat 50]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from common import make_app
+from app.connections import get_connection_index
+from search_bench import grow
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--flights', type=int, default=300000)
+    ap.add_argument('--repeat', type=int, default=50)
+    args = ap.parse_args()
+
+    app = make_app()
+    client = app.test_client()
+    with app.app_context():
+        grow(args.flights)
+        t = time.perf_counter()
+        get_connection_index()
+        print(f'flights={args.flights} index build {time.perf_counter() - t:.2f}s')
+
+    day = (datetime.utcnow() + timedelta(days=3)).date().isoformat()
+    for legs, sort in ((2, 'price'), (2, 'duration'), (3, 'price'), (3, 'duration')):
+        url = (f'/api/flights/connections?source=Mumbai&destination=Singapore&date={day}'
+               f'&max_legs={legs}&sort={sort}&limit=10')
+        samples = []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            r = client.get(url)
+            samples.append(time.perf_counter() - t)
+        samples.sort()
+        print(f'legs={legs} sort={sort:<8} results={len(r.json["itineraries"]):>2} '
+              f'p50 {samples[len(samples) // 2] * 1000:.1f} ms  p95 {samples[int(len(samples) * 0.95)] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Concurrent flight search throughput while bookings are being written, per engine profile.
+
+Profiles:
+    default   SQLite's own settings: rollback journal, synchronous=FULL, no mmap
+    wal       the Config defaults: WAL, synchronous=NORMAL, busy_timeout, mmap
+    replica   wal, plus @read_only endpoints served through a read-only engine on the same file
+
+Each profile gets a fresh on-disk DB with --flights synthetic flights. Then --writers
+threads POST /api/bookings/ and --readers threads GET /api/flights/ for --seconds.
+The search response cache is off, so every search reaches the DB. The script
+prints searches/s with p50/p95/p99, bookings/s and the non-2xx statuses.
+
+    python benchmarks/db_profile_bench.py [--profiles default,wal,replica] [--seconds 10]
+        [--readers 4 --writers 4] [--db-dir DIR]
+
+Leave --db-dir on a real disk: fsync and journal behaviour are what is being compared.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from common import make_app
+from app.models import Flight, User
+from app.seed import SYNTHETIC_CITIES, seed_synthetic
+from app.utils import create_token
+
+PROFILES = {
+    'default': {'SQLITE_JOURNAL_MODE': 'delete', 'SQLITE_SYNCHRONOUS': 'full', 'SQLITE_MMAP_SIZE': 0},
+    'wal': {},
+    'replica': {},
+}
+
+
+def run(profile, args):
+    path = os.path.join(tempfile.mkdtemp(dir=args.db_dir), 'bench.db')
+    overrides = dict(PROFILES[profile], SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', SEARCH_CACHE_SIZE=0)
+    if profile == 'replica':
+        overrides['READ_DATABASE_URL'] = f'sqlite:///file:{path}?mode=ro&uri=true'
+    app = make_app(**overrides)
+    days = 30
+    with app.app_context():
+        seed_synthetic(flights=args.flights, users=args.writers * 4, days=days, seed=1)
+        tokens = [create_token(u) for u in User.query.filter_by(role='customer')]
+        tomorrow = datetime.utcnow() + timedelta(days=1)
+        flights = [(f.id, f.departure_time.date().isoformat()) for f in
+                   Flight.query.filter(Flight.departure_time >= tomorrow).limit(2000)]
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    searches, bookings, statuses = [], [0], Counter()
+    today = datetime.utcnow().date()
+
+    def reader(n):
+        client, rnd, samples, local = app.test_client(), random.Random(n), [], Counter()
+        while not stop.is_set():
+            src, dest = rnd.sample(SYNTHETIC_CITIES, 2)
+            day = today + timedelta(days=rnd.randrange(days))
+            url = '/api/flights/?' + urlencode({'source': src, 'destination': dest, 'date': day.isoformat(),
+                                                'match': 'exact'})
+            t = time.perf_counter()
+            r = client.get(url)
+            samples.append(time.perf_counter() - t)
+            if r.status_code != 200:
+                local[f'search {r.status_code}'] += 1
+        with lock:
+            searches.extend(samples)
+            statuses.update(local)
+
+    def writer(n):
+        client, rnd, done, local = app.test_client(), random.Random(1000 + n), 0, Counter()
+        while not stop.is_set():
+            flight_id, day = rnd.choice(flights)
+            r = client.post('/api/bookings/', json={
+                'token': rnd.choice(tokens), 'flight_id': flight_id, 'date_depart': day,
+                'travel_class': 'economy', 'num_passengers': 1})
+            if r.status_code == 201:
+                done += 1
+            else:
+                local[f'book {r.status_code}'] += 1
+        with lock:
+            bookings[0] += done
+            statuses.update(local)
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    searches.sort()
+    pct = lambda p: searches[min(len(searches) - 1, int(len(searches) * p))] * 1000 if searches else 0
+    print(f'{profile:>8} {len(searches) / args.seconds:>10.0f} {pct(0.5):>8.2f} {pct(0.95):>8.2f} {pct(0.99):>8.2f} '
+          f'{bookings[0] / args.seconds:>10.1f}  {dict(statuses) or ""}')
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--profiles', default=','.join(PROFILES))
+    ap.add_argument('--seconds', type=float, default=10)
+    ap.add_argument('--readers', type=int, default=4)
+    ap.add_argument('--writers', type=int, default=4)
+    ap.add_argument('--flights', type=int, default=20000)
+    ap.add_argument('--db-dir', default=None)
+    args = ap.parse_args()
+    print(f"{'profile':>8} {'searches/s':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'bookings/s':>10}  (ms)")
+    for profile in args.profiles.split(','):
+        run(profile, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Login throughput and search latency while both run at the same time.
+
+For each HASH_WORKERS setting (0 = bcrypt inline on the request thread), runs
+--login-threads threads doing POST /api/auth/login and --search-threads threads
+doing GET /api/flights/ for --seconds, then prints logins/sec and search p50/p95.
+
+    python benchmarks/hashing_bench.py [--workers 0,1,2] [--seconds 10]
+"""
+import argparse
+import threading
+import time
+from datetime import datetime
+
+from common import make_app
+
+
+def run(workers, args):
+    app = make_app(HASH_WORKERS=workers, BCRYPT_ROUNDS=args.rounds)
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'bench', 'password': 'pw', 'q1': 1, 'q2': 2, 'q3': 3,
+                                            'a1': 'a', 'a2': 'b', 'a3': 'c'})
+    stop = threading.Event()
+    logins = []
+    searches = []
+    day = datetime.utcnow().date().isoformat()
+
+    def login_worker():
+        c = app.test_client()
+        n = 0
+        while not stop.is_set():
+            assert c.post('/api/auth/login', json={'username': 'bench', 'password': 'pw'}).status_code == 200
+            n += 1
+        logins.append(n)
+
+    def search_worker():
+        c = app.test_client()
+        samples = []
+        while not stop.is_set():
+            t = time.perf_counter()
+            c.get(f'/api/flights/?source=Mumbai&destination=Delhi&date={day}&match=exact')
+            samples.append(time.perf_counter() - t)
+        searches.extend(samples)
+
+    threads = [threading.Thread(target=login_worker) for _ in range(args.login_threads)]
+    threads += [threading.Thread(target=search_worker) for _ in range(args.search_threads)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    searches.sort()
+    p50 = searches[len(searches) // 2] * 1000
+    p95 = searches[int(len(searches) * 0.95)] * 1000
+    print(f'{workers:>8} {sum(logins) / args.seconds:>10.1f} {len(searches) / args.seconds:>12.0f} '
+          f'{p50:>10.2f} {p95:>10.2f}')
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--workers', default='0,1,2')
+    ap.add_argument('--seconds', type=float, default=10)
+    ap.add_argument('--login-threads', type=int, default=16)
+    ap.add_argument('--search-threads', type=int, default=4)
+    ap.add_argument('--rounds', type=int, default=12)
+    args = ap.parse_args()
+    print(f'{"workers":>8} {"logins/s":>10} {"searches/s":>12} {"search p50":>10} {"search p95":>10}  (ms)')
+    for w in args.workers.split(','):
+        run(int(w), args)
+
+
+if __name__ == '__main__':
+    main()
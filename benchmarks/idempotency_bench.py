@@ -0,0 +1,138 @@
+"""
+Booking retries with and without Idempotency-Key.
+
+--threads clients each make --bookings bookings. Every booking is sent with injected
+retries: first a duplicate fired concurrently with the original (a client that timed
+out while the first attempt was still running), then --retries sequential resends
+after it finished. Three runs on fresh apps:
+
+    once       each booking sent once (the baseline)
+    no key     with retries, no Idempotency-Key
+    key        with retries, each booking with its own Idempotency-Key
+
+For each run it reports bookings created, seats taken, SQL statements and write
+statements (INSERT/UPDATE/DELETE) and whether every attempt at one booking got the same
+booking back. With keys, the bookings should match the baseline exactly. The writes should
+match it within 5%, since group-commit batch sizes and background writes vary between runs.
+
+    python benchmarks/idempotency_bench.py [--threads 8] [--bookings 50] [--retries 2] [--pipeline]
+"""
+import argparse
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from common import make_app
+from app import db, ledger
+from app.models import Booking, Flight, User
+from app.utils import create_token
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def run(mode, args):
+    app = make_app(BOOKING_PIPELINE=args.pipeline, ADMISSION_CONTROL=False)
+    seats = args.threads * args.bookings * (args.retries + 2)
+    with app.app_context():
+        dep = datetime.utcnow() + timedelta(days=1)
+        flight = Flight(flight_number='RETRY1', source='Mumbai', destination='Delhi',
+                        departure_time=dep, arrival_time=dep + timedelta(hours=2),
+                        economy_price=1000, business_price=3000, economy_seats=seats, business_seats=0)
+        db.session.add(flight)
+        users = [User(username=f'retry{i}', role='customer', password_hash='x') for i in range(args.threads)]
+        for u in users:
+            db.session.add(u)
+            ledger.open_account(u, seats * 1500)
+        db.session.commit()
+        flight_id, tokens = flight.id, [create_token(u) for u in users]
+        engines = list(db.engines.values())
+    day = (datetime.utcnow() + timedelta(days=1)).date().isoformat()
+
+    statements = Counter()
+    lock = threading.Lock()
+
+    def count(conn, cursor, statement, *rest):
+        with lock:
+            statements['all'] += 1
+            statements['writes'] += statement.lstrip().upper().startswith(WRITES)
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+
+    statuses, mismatched = Counter(), []
+
+    def worker(n):
+        client = app.test_client()
+        for i in range(args.bookings):
+            body = {'flight_id': flight_id, 'date_depart': day, 'travel_class': 'economy', 'num_passengers': 1}
+            headers = {'Authorization': f'Bearer {tokens[n]}'}
+            if mode == 'key':
+                headers['Idempotency-Key'] = str(uuid.uuid4())
+            send = lambda: client.post('/api/bookings/', json=body, headers=headers)  # noqa: E731
+            if mode == 'once':
+                responses = [send()]
+            else:
+                results = []
+                dup = threading.Thread(target=lambda: results.append(app.test_client().post(
+                    '/api/bookings/', json=body, headers=headers)))
+                dup.start()
+                responses = [send()]
+                dup.join()
+                responses += results + [send() for _ in range(args.retries)]
+            ids = {r.get_json()['booking']['id'] for r in responses if r.status_code == 201}
+            with lock:
+                statuses.update(r.status_code for r in responses)
+                if len(ids) > 1:
+                    mismatched.append(ids)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    for engine in engines:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    with app.app_context():
+        booked = db.session.query(db.func.count(Booking.id)).scalar()
+        taken = seats - db.session.get(Flight, flight_id).economy_seats
+        problems = ledger.reconcile()['problems']
+    return booked, taken, statements, statuses, len(mismatched), problems, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--threads', type=int, default=8)
+    ap.add_argument('--bookings', type=int, default=50, help='Distinct bookings per client thread.')
+    ap.add_argument('--retries', type=int, default=2, help='Sequential resends after the concurrent duplicate.')
+    ap.add_argument('--pipeline', action='store_true', help='Run with BOOKING_PIPELINE on.')
+    args = ap.parse_args()
+
+    wanted = args.threads * args.bookings
+    print(f'{wanted} bookings wanted, {args.retries + 1} retries each in the retry runs')
+    print(f"{'mode':<8} {'booked':>7} {'seats':>7} {'sql':>7} {'writes':>7} {'split':>6} {'secs':>6}  statuses")
+    failed = False
+    for mode in ('once', 'no key', 'key'):
+        booked, taken, statements, statuses, split, problems, elapsed = run(mode, args)
+        codes = ' '.join(f'{code}:{n}' for code, n in sorted(statuses.items()))
+        print(f"{mode:<8} {booked:>7} {taken:>7} {statements['all']:>7} {statements['writes']:>7} {split:>6} "
+              f"{elapsed:>6.2f}  {codes}")
+        if mode == 'once':
+            baseline = statements['writes']
+        if mode == 'key' and (booked != wanted or taken != wanted or split
+                              or statements['writes'] > baseline * 1.05):
+            failed = True
+        if problems:
+            print(f'  ledger problems: {problems}')
+            failed = True
+    print('FAIL' if failed else 'OK: with keys, one booking per key and no extra writes')
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
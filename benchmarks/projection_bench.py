@@ -0,0 +1,100 @@
+"""
+List endpoints: column projection vs ORM objects + to_dict().
+
+Serves each list twice from the same app. The first path is the current endpoint. The
+second is a copy of the code it replaced, registered under /legacy: ORM query, to_dict()
+per row and jsonify. It reports median and p95 latency for:
+
+    flights     GET /api/flights/?source=<city>&match=exact, no date (--flights/24 rows each);
+                the response cache is off
+    bookings    GET /api/bookings/?limit=200 as admin (nested flights), plus ?flights=ref
+                and ?fields=id,flight_id,total_amount
+    users       GET /api/admin/users (--users rows, streamed)
+
+    python benchmarks/projection_bench.py [--flights 50000] [--users 20000] [--repeat 20]
+"""
+import argparse
+import time
+
+from flask import Blueprint, jsonify
+from sqlalchemy.orm import selectinload
+
+from common import make_app
+from app import ledger
+from app.models import Booking, Flight, User
+from app.seed import seed_synthetic
+from app.utils import create_token
+
+legacy = Blueprint('legacy', __name__)
+
+
+@legacy.route('/flights/<source>')
+def legacy_flights(source):
+    q = Flight.query.filter(Flight.source_key == source)
+    return jsonify([f.to_dict() for f in q.order_by(Flight.departure_time).all()])
+
+
+@legacy.route('/bookings')
+def legacy_bookings():
+    q = Booking.query.options(selectinload(Booking.flight))
+    bookings = q.order_by(Booking.created_at.desc(), Booking.id.desc()).limit(201).all()
+    return jsonify([b.to_dict() for b in bookings[:200]])
+
+
+@legacy.route('/users')
+def legacy_users():
+    users = User.query.all()
+    balances = ledger.balances_paise(u.id for u in users if u.role == 'customer')
+    out = []
+    for u in users:
+        d = {'id': u.id, 'username': u.username, 'role': u.role, 'created_at': u.created_at.isoformat()}
+        if u.role == 'customer':
+            d.update(balance=ledger.from_paise(balances.get(u.id, 0)), q1=u.q1, q2=u.q2, q3=u.q3)
+        out.append(d)
+    return jsonify(out)
+
+
+def timed(client, url, headers, repeat):
+    samples, size = [], 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        r = client.get(url, headers=headers)
+        size = len(r.get_data())
+        samples.append(time.perf_counter() - t)
+        assert r.status_code == 200, (url, r.status_code)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000, size
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--flights', type=int, default=50000)
+    ap.add_argument('--users', type=int, default=20000)
+    ap.add_argument('--repeat', type=int, default=20)
+    args = ap.parse_args()
+
+    app = make_app(SEARCH_CACHE_SIZE=0)
+    app.register_blueprint(legacy, url_prefix='/legacy')
+    with app.app_context():
+        seed_synthetic(flights=args.flights, users=args.users, bookings=args.flights, seed=1)
+        auth = {'Authorization': 'Bearer ' + create_token(User.query.filter_by(username='admin').first())}
+    client = app.test_client()
+
+    cases = [
+        ('flights', '/legacy/flights/mumbai', '/api/flights/?source=mumbai&match=exact'),
+        ('bookings', '/legacy/bookings', '/api/bookings/?limit=200'),
+        ('bookings ref', '/legacy/bookings', '/api/bookings/?limit=200&flights=ref'),
+        ('bookings fields', '/legacy/bookings', '/api/bookings/?limit=200&fields=id,flight_id,total_amount'),
+        ('users', '/legacy/users', '/api/admin/users'),
+    ]
+    print(f"{'list':<16} {'to_dict p50':>11} {'p95':>8} {'projected p50':>13} {'p95':>8} {'speedup':>8} "
+          f"{'bytes':>10}  (ms)")
+    for name, old_url, new_url in cases:
+        old = timed(client, old_url, auth, args.repeat)
+        new = timed(client, new_url, auth, args.repeat)
+        print(f'{name:<16} {old[0]:>11.2f} {old[1]:>8.2f} {new[0]:>13.2f} {new[1]:>8.2f} {old[0] / new[0]:>7.1f}x '
+              f'{new[2]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Batch fare quotes vs one request per flight.
+
+Seeds --flights synthetic flights (with some bookings, so seat maps and load factors
+vary), then times POST /api/flights/quote for --sizes flight ids, with dynamic fares
+off and on. For comparison it times GET /api/flights/<id> for --per-flight of the
+same flights with the response cache off and scales that up to the batch size. That
+is what a client pricing a result list itself had to do before.
+
+    python benchmarks/quote_bench.py [--flights 20000] [--sizes 100,1000,10000] [--repeat 20]
+"""
+import argparse
+import time
+
+from common import make_app
+from app import db, seatmap
+from app.models import Flight
+from app.seed import seed_synthetic
+
+OPTIONS = {'travel_class': 'economy', 'num_passengers': 2, 'extra_baggage_kg': 5,
+           'meal_preference': 'veg', 'trip_type': 'return'}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--flights', type=int, default=20000)
+    ap.add_argument('--sizes', default='100,1000,10000')
+    ap.add_argument('--repeat', type=int, default=20)
+    ap.add_argument('--per-flight', type=int, default=200)
+    args = ap.parse_args()
+
+    app = make_app(SEARCH_CACHE_SIZE=0)
+    with app.app_context():
+        seed_synthetic(flights=args.flights, users=200, bookings=args.flights // 2, seed=1)
+        ids = [i for i, in db.session.query(Flight.id).order_by(Flight.id)]
+        for flight in Flight.query.filter(Flight.id.in_(ids[::2])):
+            seatmap.ensure(flight)
+
+    client = app.test_client()
+    with app.app_context():
+        per_flight, _ = timed(lambda: [client.get(f'/api/flights/{i}') for i in ids[:args.per_flight]], 3)
+    per_flight /= args.per_flight
+
+    print(f"{'flights':>8} {'quote p50':>10} {'p95':>8} {'dynamic p50':>12} {'p95':>8} {'per-flight GETs':>16}  (ms)")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        body = dict(OPTIONS, flight_ids=ids[:size])
+        row = []
+        for dynamic in (False, True):
+            app.config['DYNAMIC_FARES'] = dynamic
+            r = client.post('/api/flights/quote', json=body)
+            assert r.status_code == 200 and len(r.get_json()['quotes']) == size, r.status_code
+            row += timed(lambda: client.post('/api/flights/quote', json=body), args.repeat)
+        print(f'{size:>8} {row[0]:>10.2f} {row[1]:>8.2f} {row[2]:>12.2f} {row[3]:>8.2f} {per_flight * size:>16.0f}')
+
+
+if __name__ == '__main__':
+    main()
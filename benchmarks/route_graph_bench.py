@@ -0,0 +1,53 @@
+"""
+Route graph build time and memory against a large schedule.
+
+Fills a temp DB with --flights synthetic flights (see search_bench.grow), then builds
+the RouteGraph from it and reports build time, retained memory (tracemalloc) and
+lookup latency for /destinations-style queries.
+
+    python benchmarks/route_graph_bench.py [--flights 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+from common import make_app
+from app.route_graph import RouteGraph, load_rows
+from search_bench import grow
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--flights', type=int, default=1000000)
+    args = ap.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        grow(args.flights)
+        t = time.perf_counter()
+        graph = RouteGraph.build(load_rows())
+        build_s = time.perf_counter() - t
+        # Second build only to measure memory; tracemalloc would distort the timing
+        tracemalloc.start()
+        measured = RouteGraph.build(load_rows())
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del measured
+
+    routes = sum(len(out) for out in graph.out.values())
+    print(f'flights={args.flights} routes={routes} dates={len(graph.by_date)}')
+    print(f'build {build_s:.2f}s ({args.flights / build_s:.0f} rows/s), '
+          f'retained {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB')
+    day = datetime.utcnow().date()
+    for name, fn in (('sources+destinations', lambda: (graph.sources(), graph.destinations())),
+                     ('reachable(mumbai)', lambda: graph.reachable('mumbai')),
+                     ('routes(today)', lambda: graph.routes(day))):
+        t = time.perf_counter()
+        for _ in range(1000):
+            fn()
+        print(f'{name}: {(time.perf_counter() - t):.3f} ms/call')
+
+
+if __name__ == '__main__':
+    main()
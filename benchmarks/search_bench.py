@@ -0,0 +1,58 @@
+"""
+Flight search latency vs schedule size.
+
+Grows the flights table from the seeded 300 rows up to 1M synthetic rows and times
+GET /api/flights/ for a route+date search at each step, in both 'exact' (index) and
+'contains' (scan) mode.
+
+    python benchmarks/search_bench.py [--sizes 300,10000,100000,1000000] [--repeat 200]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from common import make_app
+from app import db
+from app.models import Flight
+from app.seed import seed_synthetic
+
+
+def grow(target):
+    """Insert synthetic flights until the table holds `target` rows."""
+    have = db.session.query(db.func.count(Flight.id)).scalar()
+    if have < target:
+        seed_synthetic(flights=target - have, seed=have)
+
+
+def time_search(client, mode, repeat):
+    day = datetime.utcnow().date().isoformat()
+    url = f'/api/flights/?source=Mumbai&destination=Delhi&date={day}&match={mode}'
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        r = client.get(url)
+        samples.append(time.perf_counter() - t)
+        assert r.status_code == 200
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default='300,10000,100000,1000000')
+    ap.add_argument('--repeat', type=int, default=200)
+    args = ap.parse_args()
+
+    app = make_app(SEARCH_CACHE_SIZE=0)  # measure the query path, not the response cache
+    client = app.test_client()
+    print(f"{'rows':>10} {'exact p50':>10} {'exact p95':>10} {'contains p50':>13} {'contains p95':>13}  (ms)")
+    with app.app_context():
+        for size in [int(s) for s in args.sizes.split(',')]:
+            grow(size)
+            ep50, ep95 = time_search(client, 'exact', args.repeat)
+            cp50, cp95 = time_search(client, 'contains', max(5, args.repeat // 20))
+            print(f'{size:>10} {ep50:>10.2f} {ep95:>10.2f} {cp50:>13.2f} {cp95:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+"""
+Load and benchmark suite for the API hot paths.
+
+Scenarios (each a stream of requests from --threads workers):
+
+    login   POST /api/auth/login
+    search  GET  /api/flights/ for a random route and day (match=exact)
+    book    POST /api/bookings/ for one economy seat on a random future flight
+    list    GET  /api/bookings/ (first page of the customer's own bookings)
+    mixed   70% search, 15% list, 10% book, 5% login
+
+For each scenario it reports throughput, p50/p95/p99 latency, the status codes seen and
+SQL queries per request. By default the app runs in-process (Flask test client) on a
+temp DB filled with a synthetic dataset of --flights/--users/--bookings. With --url, the
+requests go to a running server over HTTP instead. Bench users are registered through
+the API there, and queries per request are not available.
+
+Results can be written with --out. With --baseline, they are compared against a saved
+results file. The run exits 1 if throughput fell or p95 / queries per request rose by
+more than --tolerance.
+
+    python benchmarks/suite.py [--scenarios login,search,book,list,mixed] [--requests 500]
+        [--threads 4] [--flights 20000 --users 1000 --bookings 20000] [--db-dir /dev/shm]
+        [--set HASH_WORKERS=1 ...] [--out results.json] [--baseline baseline.json --tolerance 0.25]
+    python benchmarks/suite.py --url http://127.0.0.1:5000 --scenarios search,mixed
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from common import make_app
+from app import db
+from app.models import User
+from app.seed import SYNTHETIC_CITIES, seed_synthetic
+
+SCENARIOS = ('login', 'search', 'book', 'list', 'mixed')
+MIXED = (('search', 70), ('list', 15), ('book', 10), ('login', 5))
+EXPECTED = {'login': (200,), 'search': (200,), 'book': (201,), 'list': (200,)}
+BENCH_PASSWORD = 'bench-password'
+
+
+# --- Targets: send one request, return (status, parsed body, SQL queries or None) ----
+
+class InProcessTarget:
+    """create_app() on a temp DB, driven through the Flask test client in the calling thread."""
+
+    def __init__(self, args, overrides):
+        self.app = make_app(db_dir=args.db_dir, **overrides)
+        self._local = threading.local()
+        with self.app.app_context():
+            counts = seed_synthetic(flights=args.flights, users=args.users, bookings=args.bookings,
+                                    days=args.days, seed=args.seed)
+            db.event.listen(db.engine, 'before_cursor_execute', self._count_query)
+            self.users = [(name, 'password') for name in db.session.scalars(
+                db.select(User.username).where(User.role == 'customer').order_by(User.id).limit(args.bench_users))]
+        self.dataset = counts
+
+    def _count_query(self, *args):
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+
+    def client(self):
+        return _TestClient(self)
+
+
+class _TestClient:
+    def __init__(self, target):
+        self.target = target
+        self.client = target.app.test_client()
+
+    def call(self, method, path, body=None, token=None):
+        local = self.target._local
+        local.queries = 0
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        r = self.client.open(path, method=method, json=body, headers=headers)
+        return r.status_code, r.get_json(silent=True), local.queries
+
+
+class HttpTarget:
+    """A running server at --url; one keep-alive connection per worker thread."""
+
+    def __init__(self, args):
+        parts = urlsplit(args.url)
+        self.host, self.port = parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.prefix = parts.path.rstrip('/')
+        self.users = []
+        self.dataset = None
+
+    def client(self):
+        return _HttpClient(self)
+
+
+class _HttpClient:
+    def __init__(self, target):
+        self.target = target
+        self.conn = None
+
+    def call(self, method, path, body=None, token=None):
+        t = self.target
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body) if body is not None else None
+        for attempt in (1, 2):
+            if self.conn is None:
+                cls = http.client.HTTPSConnection if t.https else http.client.HTTPConnection
+                self.conn = cls(t.host, t.port, timeout=30)
+            try:
+                self.conn.request(method, t.prefix + path, body=payload, headers=headers)
+                r = self.conn.getresponse()
+                data = r.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # Server closed the keep-alive connection (e.g. worker recycled); reconnect once
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    return 0, None, None
+        try:
+            parsed = json.loads(data) if data else None
+        except ValueError:
+            parsed = None
+        return r.status, parsed, None
+
+
+# --- Scenarios -------------------------------------------------------------------
+
+class Context:
+    """What the scenarios pick from: credentials, tokens and bookable flights."""
+
+    def __init__(self, users, tokens, flights, days, today):
+        self.users, self.tokens, self.flights = users, tokens, flights
+        self.days, self.today = days, today
+
+
+def _search_url(rnd, ctx):
+    src, dest = rnd.sample(SYNTHETIC_CITIES, 2)
+    day = ctx.today + timedelta(days=rnd.randrange(ctx.days))
+    return '/api/flights/?' + urlencode({'source': src, 'destination': dest, 'date': day.isoformat(), 'match': 'exact'})
+
+
+def do_login(client, rnd, ctx):
+    username, password = rnd.choice(ctx.users)
+    return client.call('POST', '/api/auth/login', {'username': username, 'password': password})
+
+
+def do_search(client, rnd, ctx):
+    return client.call('GET', _search_url(rnd, ctx))
+
+
+def do_book(client, rnd, ctx):
+    flight_id, day = rnd.choice(ctx.flights)
+    return client.call('POST', '/api/bookings/', {
+        'flight_id': flight_id, 'date_depart': day, 'travel_class': 'economy', 'num_passengers': 1,
+        'meal_preference': 'veg'}, token=rnd.choice(ctx.tokens))
+
+
+def do_list(client, rnd, ctx):
+    return client.call('GET', '/api/bookings/?limit=20', token=rnd.choice(ctx.tokens))
+
+
+ACTIONS = {'login': do_login, 'search': do_search, 'book': do_book, 'list': do_list}
+
+
+def _mixed_picker():
+    names = [name for name, _ in MIXED]
+    weights = list(itertools.accumulate(w for _, w in MIXED))
+    return lambda rnd: rnd.choices(names, cum_weights=weights)[0]
+
+
+def prepare(target, args):
+    """Log the bench users in (registering them first against a remote server) and collect flights."""
+    client = target.client()
+    if not target.users:
+        tag = f'bench{os.getpid()}'
+        for i in range(args.bench_users):
+            name = f'{tag}_{i}'
+            status, _, _ = client.call('POST', '/api/auth/register', {
+                'username': name, 'password': BENCH_PASSWORD,
+                'q1': 1, 'q2': 2, 'q3': 3, 'a1': 'a', 'a2': 'b', 'a3': 'c'})
+            if status == 201:
+                target.users.append((name, BENCH_PASSWORD))
+    tokens = []
+    for username, password in target.users:
+        status, body, _ = client.call('POST', '/api/auth/login', {'username': username, 'password': password})
+        if status == 200:
+            tokens.append(body['token'])
+    if not tokens:
+        sys.exit('No bench user could log in')
+
+    today = datetime.utcnow().date()
+    ctx = Context(target.users, tokens, [], args.days, today)
+    rnd = random.Random(args.seed)
+    flights = {}
+    # The demo schedule always has Mumbai -> Delhi daily for 30 days; add random synthetic routes on top
+    urls = [f'/api/flights/?source=Mumbai&destination=Delhi&date={today + timedelta(days=d)}&match=exact'
+            for d in range(1, 30)]
+    urls += [_search_url(rnd, ctx) for _ in range(args.flight_pool * 4)]
+    for url in urls:
+        if len(flights) >= args.flight_pool:
+            break
+        status, body, _ = client.call('GET', url)
+        for f in body if status == 200 else []:
+            if f['departure_time'][:10] > today.isoformat() and f['economy_seats'] > 0:
+                flights[f['id']] = f['departure_time'][:10]
+    ctx.flights = list(flights.items())
+    if not ctx.flights:
+        sys.exit('No bookable flights found')
+    return ctx
+
+
+# --- Running and reporting ---------------------------------------------------------
+
+def _percentile(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * p))]
+
+
+def run_scenario(target, ctx, name, requests, args):
+    pick = _mixed_picker() if name == 'mixed' else (lambda rnd: name)
+    # Warm caches, connections and the hashing pool outside the measurement
+    warm = target.client()
+    warm_rnd = random.Random(args.seed)
+    for _ in range(args.warmup):
+        ACTIONS[pick(warm_rnd)](warm, warm_rnd, ctx)
+
+    remaining = itertools.count()
+    latencies, queries, statuses, errors = [], [], Counter(), Counter()
+    lock = threading.Lock()
+
+    def worker(n):
+        client = target.client()
+        rnd = random.Random(f'{args.seed}-{name}-{n}')
+        lat, qs, st, err = [], [], Counter(), Counter()
+        while next(remaining) < requests:
+            action = pick(rnd)
+            t = time.perf_counter()
+            status, _, q = ACTIONS[action](client, rnd, ctx)
+            lat.append(time.perf_counter() - t)
+            st[status] += 1
+            if status not in EXPECTED[action]:
+                err[action] += 1
+            if q is not None:
+                qs.append(q)
+        with lock:
+            latencies.extend(lat)
+            queries.extend(qs)
+            statuses.update(st)
+            errors.update(err)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(_percentile(latencies, 0.50)),
+        'p95_ms': ms(_percentile(latencies, 0.95)),
+        'p99_ms': ms(_percentile(latencies, 0.99)),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'errors': sum(errors.values()),
+        'errors_by_action': dict(errors),
+        'statuses': {str(s): n for s, n in sorted(statuses.items())},
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline` beyond `tolerance` (a fraction), as messages."""
+    problems = []
+    for name, cur in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        if cur['throughput'] < base['throughput'] * (1 - tolerance):
+            problems.append(f"{name}: throughput {cur['throughput']} < baseline {base['throughput']}")
+        if base.get('p95_ms') and cur['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {cur['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if base.get('queries_per_request') is not None and cur['queries_per_request'] is not None \
+                and cur['queries_per_request'] > base['queries_per_request'] * (1 + tolerance):
+            problems.append(f"{name}: {cur['queries_per_request']} queries/request "
+                            f"> baseline {base['queries_per_request']}")
+        if cur['errors'] / max(1, cur['requests']) > base['errors'] / max(1, base['requests']) + tolerance / 10:
+            problems.append(f"{name}: error rate {cur['errors']}/{cur['requests']} "
+                            f"vs baseline {base['errors']}/{base['requests']}")
+    return problems
+
+
+def _overrides(pairs):
+    out = {}
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        try:
+            out[key] = json.loads(value)
+        except ValueError:
+            out[key] = value
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    ap.add_argument('--scenarios', default=','.join(SCENARIOS))
+    ap.add_argument('--requests', type=int, default=500, help='Measured requests per scenario.')
+    ap.add_argument('--login-requests', type=int, default=50, help='Measured requests for login (bcrypt-bound).')
+    ap.add_argument('--warmup', type=int, default=20)
+    ap.add_argument('--threads', type=int, default=4)
+    ap.add_argument('--flights', type=int, default=20000)
+    ap.add_argument('--users', type=int, default=1000)
+    ap.add_argument('--bookings', type=int, default=20000)
+    ap.add_argument('--days', type=int, default=60, help='Spread synthetic departures and searches over N days.')
+    ap.add_argument('--bench-users', type=int, default=20, help='Distinct customers the scenarios act as.')
+    ap.add_argument('--flight-pool', type=int, default=500, help='Distinct flights the book scenario uses.')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--db-dir', default=None, help='Directory for the temp DB, e.g. /dev/shm.')
+    ap.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                    help='Config override for the in-process app (value parsed as JSON if possible).')
+    ap.add_argument('--url', default=None, help='Benchmark a running server instead of an in-process app.')
+    ap.add_argument('--out', default=None, help='Write results JSON here.')
+    ap.add_argument('--baseline', default=None, help='Results JSON to compare against.')
+    ap.add_argument('--tolerance', type=float, default=0.25)
+    args = ap.parse_args()
+
+    names = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    overrides = _overrides(args.set)
+
+    t = time.perf_counter()
+    target = HttpTarget(args) if args.url else InProcessTarget(args, overrides)
+    ctx = prepare(target, args)
+    print(f'setup {time.perf_counter() - t:.1f}s: dataset={target.dataset or "remote"} '
+          f'users={len(ctx.tokens)} flights={len(ctx.flights)}')
+
+    results = {
+        'meta': {
+            'target': args.url or 'in-process',
+            'dataset': target.dataset,
+            'threads': args.threads,
+            'overrides': overrides,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        },
+        'scenarios': {},
+    }
+    print(f"{'scenario':>8} {'reqs':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6} {'errors':>6}  (ms)")
+    for name in names:
+        requests = args.login_requests if name == 'login' else args.requests
+        r = run_scenario(target, ctx, name, requests, args)
+        results['scenarios'][name] = r
+        q = '-' if r['queries_per_request'] is None else r['queries_per_request']
+        print(f"{name:>8} {r['requests']:>6} {r['throughput']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {q:>6} {r['errors']:>6}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('dataset') != results['meta']['dataset']:
+            print('warning: baseline was recorded on a different dataset')
+        problems = compare(results, baseline, args.tolerance)
+        if problems:
+            print('REGRESSION: ' + '; '.join(problems))
+            sys.exit(1)
+        print(f'OK: within {args.tolerance:.0%} of baseline')
+
+
+if __name__ == '__main__':
+    main()
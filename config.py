@@ -4,5 +4,46 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'speed-airlines-secret-key-2026'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///speed_airlines.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    READ_DATABASE_URL = os.environ.get('READ_DATABASE_URL')  # optional replica for @read_only endpoints
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)  # connections kept open per process and engine
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)  # extra connections allowed under bursts
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # seconds before a connection is replaced
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'wal')  # '' keeps SQLite's rollback journal
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)  # writer lock wait
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'normal')  # fsync at checkpoints only under WAL
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)  # bytes; 0 disables
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'speed-airlines-jwt-secret-key-2026-at-least-32-bytes-long'
     DEFAULT_CUSTOMER_BALANCE = 10000000  # INR
+    WEB_THREADS = int(os.environ.get('WEB_THREADS') or 4)  # request threads per worker, as in gunicorn.conf.py
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS') or 12)  # cost for new password/answer hashes
+    HASH_WORKERS = int(os.environ['HASH_WORKERS']) if os.environ.get('HASH_WORKERS') else None  # None = half the CPUs, 0 = inline
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE') or 10000)  # users kept by require_user()
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 60)  # seconds
+    SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE') or 2048)  # cached flight search/detail responses
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE') or 1000)  # rows per transaction in flight imports
+    BOOKING_PIPELINE = os.environ.get('BOOKING_PIPELINE') == '1'  # group-commit bookings (single-writer DBs)
+    BOOKING_BATCH_SIZE = int(os.environ.get('BOOKING_BATCH_SIZE') or 32)  # bookings per transaction at most
+    BOOKING_BATCH_WAIT_MS = int(os.environ.get('BOOKING_BATCH_WAIT_MS') or 2)  # wait for a batch to fill
+    DYNAMIC_FARES = os.environ.get('DYNAMIC_FARES') == '1'  # raise fares as cabins fill up (app.pricing)
+    DYNAMIC_FARE_THRESHOLD = float(os.environ.get('DYNAMIC_FARE_THRESHOLD') or 0.7)  # load factor where surge starts
+    DYNAMIC_FARE_MAX_SURGE = float(os.environ.get('DYNAMIC_FARE_MAX_SURGE') or 0.5)  # +50% of the fare when full
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 1)  # days after departure a flight is archived
+    ARCHIVE_CHUNK_SIZE = int(os.environ.get('ARCHIVE_CHUNK_SIZE') or 500)  # flights per archive transaction
+    SCHEDULE_POLL_MS = int(os.environ.get('SCHEDULE_POLL_MS') or 1000)  # workers check for flask-command flight writes
+    CANCEL_CHUNK_SIZE = int(os.environ.get('CANCEL_CHUNK_SIZE') or 500)  # bookings per transaction in bulk cancels
+    FARE_CALENDAR_REFRESH_MS = int(os.environ.get('FARE_CALENDAR_REFRESH_MS') or 250)  # calendar trails writes by this
+    AIRPORT_CODES_FILE = os.environ.get('AIRPORT_CODES_FILE')  # JSON {"city": "CODE"} added to autocomplete
+    SEAT_HOLD_TTL = int(os.environ.get('SEAT_HOLD_TTL') or 300)  # seconds a seat hold lasts
+    SEAT_HOLDS_PER_USER = int(os.environ.get('SEAT_HOLDS_PER_USER') or 3)  # live holds one user may have
+    ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL') == '1'  # concurrency caps and auth rate limits (opt-in)
+    ADMISSION_LIMITS = os.environ.get('ADMISSION_LIMITS')  # name=limit:queue,...; unset = sized from WEB_THREADS
+    ADMISSION_QUEUE_TIMEOUT_MS = int(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS') or 1000)  # then 503
+    ADMISSION_PROXY_HOPS = int(os.environ.get('ADMISSION_PROXY_HOPS') or 0)  # trusted proxies in X-Forwarded-For
+    AUTH_RATE_PER_IP = os.environ.get('AUTH_RATE_PER_IP', '120/60')  # auth requests per route: burst/seconds
+    AUTH_RATE_PER_ACCOUNT = os.environ.get('AUTH_RATE_PER_ACCOUNT', '10/60')  # per username or token user
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL') or 3600)  # seconds an Idempotency-Key is remembered
+    IDEMPOTENCY_MAX_KEYS = int(os.environ.get('IDEMPOTENCY_MAX_KEYS') or 20000)  # stored responses per process
+    IDEMPOTENCY_WAIT_MS = int(os.environ.get('IDEMPOTENCY_WAIT_MS') or 5000)  # a repeat waits this long for the first
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'  # request/SQL metrics at /metrics
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS') or 100)  # log statements slower than this
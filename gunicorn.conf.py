@@ -0,0 +1,66 @@
+"""
+Production server: gunicorn --config gunicorn.conf.py run:app
+
+The app is created once in the master (preload_app) and forked into WEB_CONCURRENCY
+worker processes, each serving WEB_THREADS requests at a time. A worker is replaced
+after MAX_REQUESTS requests (plus jitter, so they don't all restart together), which
+bounds memory growth. On SIGTERM, workers stop accepting connections and get
+GRACEFUL_TIMEOUT seconds to finish in-flight requests. Load balancers should probe
+GET /readyz (DB reachable) and GET /healthz (process alive).
+
+Run the schema and seed steps first (flask --app run init-db / seed); the server does
+not create tables.
+
+Throughput against the old entry point (python run.py: threaded Werkzeug dev server,
+debug=True). Both were measured with benchmarks/suite.py --url on the same 1 vCPU box,
+with the load generator on that CPU too. Setup: SQLite WAL on disk, seed data,
+4 client threads, 500 requests per scenario.
+
+    scenario    dev server              gunicorn 1 worker x 4 threads   2 workers x 4 threads
+    search      903 req/s p95  6.4ms    1078 req/s p95  7.2ms           660 req/s p95 10.6ms
+    book        302 req/s p95 22.3ms     318 req/s p95 26.4ms           203 req/s p95 50.8ms
+    list        429 req/s p95 13.0ms     536 req/s p95 11.9ms           305 req/s p95 20.2ms
+    mixed        74 req/s                 75 req/s                       72 req/s   (bcrypt-bound)
+
+One worker per core is the default. Extra workers on the same core only add context
+switches and cold caches, as the last column shows. On multi-core hosts, workers
+scale the GIL-bound paths (search, list, JSON) past what threads in one process can.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND') or f"0.0.0.0:{os.environ.get('PORT') or 5000}"
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+threads = int(os.environ.get('WEB_THREADS') or 4)
+worker_class = 'gthread'
+preload_app = True
+max_requests = int(os.environ.get('MAX_REQUESTS') or 10000)
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER') or max_requests // 10)
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT') or 30)
+timeout = int(os.environ.get('WORKER_TIMEOUT') or 60)
+keepalive = 5
+accesslog = os.environ.get('ACCESS_LOG') or None
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    from app import prefork
+    from run import app
+    prefork.share_state(app)
+    try:
+        prefork.warm(app)
+    except Exception as e:
+        # Workers build the indexes lazily instead; /readyz reports a missing DB
+        server.log.warning('Could not warm indexes: %s', e)
+    server.log.info('App preloaded in %.3fs', app.extensions['startup_seconds'])
+
+
+def post_fork(server, worker):
+    from app import prefork
+    from run import app
+    prefork.after_fork(app)
+
+
+def on_exit(server):
+    from app import prefork
+    prefork.shutdown()
@@ -7,4 +7,11 @@ from config import Config
 app = create_app(Config)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Dev server only (single process); production runs gunicorn --config gunicorn.conf.py run:app.
+    # Make sure the local DB has tables and demo data
+    from app import db
+    from app.seed import seed_database
+    with app.app_context():
+        db.create_all()
+        seed_database()
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
@@ -0,0 +1,67 @@
+"""Fixtures: an app on a fresh SQLite DB per test, and helpers to add flights and customers."""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db, ledger
+from app.models import Flight, User
+from app.seed import seed_database
+from app.utils import create_token
+from config import Config
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """create_app() on a DB in tmp_path with tables created and demo data seeded; keyword args override Config."""
+    def make(**overrides):
+        overrides.setdefault('SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "test.db"}')
+        app = create_app(type('TestConfig', (Config,), {'TESTING': True, **overrides}))
+        with app.app_context():
+            db.create_all()
+            seed_database()
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+def add_flight(seats=60, days=1, number='TEST1'):
+    """An economy-only flight departing `days` from now (negative for one that has departed)."""
+    dep = datetime.utcnow() + timedelta(days=days)
+    flight = Flight(flight_number=number, source='Mumbai', destination='Delhi',
+                    departure_time=dep, arrival_time=dep + timedelta(hours=2),
+                    economy_price=1000, business_price=3000, economy_seats=seats, business_seats=0)
+    db.session.add(flight)
+    db.session.commit()
+    return flight
+
+
+def add_customers(n, balance=100000, prefix='customer'):
+    """`n` customers with `balance` INR each; returns (ids, bearer headers)."""
+    users = [User(username=f'{prefix}{i}', role='customer', password_hash='x') for i in range(n)]
+    for u in users:
+        db.session.add(u)
+        ledger.open_account(u, balance)
+    db.session.commit()
+    return [u.id for u in users], [{'Authorization': f'Bearer {create_token(u)}'} for u in users]
+
+
+def admin_headers():
+    return {'Authorization': f'Bearer {create_token(User.query.filter_by(username="admin").one())}'}
+
+
+def book(client, flight_id, headers, num_passengers=1, idempotency_key=None):
+    """POST /api/bookings/ for `num_passengers` economy seats on a flight departing tomorrow."""
+    if idempotency_key:
+        headers = {**headers, 'Idempotency-Key': idempotency_key}
+    return client.post('/api/bookings/', headers=headers, json={
+        'flight_id': flight_id,
+        'date_depart': (datetime.utcnow() + timedelta(days=1)).date().isoformat(),
+        'travel_class': 'economy', 'num_passengers': num_passengers})
@@ -0,0 +1,53 @@
+"""Admission control: the default caps admit normal traffic and explicit caps shed the overflow."""
+import threading
+
+from app.admission import default_limits, parse_limits
+
+
+def _concurrent_logins(app, n):
+    barrier = threading.Barrier(n)
+    statuses = []
+    lock = threading.Lock()
+
+    def login():
+        client = app.test_client()
+        barrier.wait()
+        r = client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin123'})
+        with lock:
+            statuses.append(r.status_code)
+
+    threads = [threading.Thread(target=login) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(statuses)
+
+
+def test_default_caps_follow_threads_and_the_bcrypt_pool():
+    limits = parse_limits(default_limits({'WEB_THREADS': 8, 'HASH_WORKERS': 2}))
+
+    assert (limits['auth.login'].limit, limits['auth.login'].queue) == (2, 5)
+    assert (limits['admin.list_users'].limit, limits['admin.list_users'].queue) == (3, 4)
+    assert 'flights.list_flights' not in limits
+    # Inline hashing runs on the request threads themselves
+    inline = parse_limits(default_limits({'WEB_THREADS': 8, 'HASH_WORKERS': 0}))
+    assert (inline['auth.register'].limit, inline['auth.register'].queue) == (7, 0)
+    single = parse_limits(default_limits({'WEB_THREADS': 1, 'HASH_WORKERS': 4}))
+    assert (single['auth.login'].limit, single['auth.login'].queue) == (1, 0)
+
+
+def test_default_caps_admit_logins_up_to_the_thread_pool(make_app):
+    app = make_app(ADMISSION_CONTROL=True, WEB_THREADS=4, HASH_WORKERS=2)
+
+    assert _concurrent_logins(app, 3) == [200, 200, 200]
+
+
+def test_explicit_cap_sheds_the_overflow(make_app):
+    app = make_app(ADMISSION_CONTROL=True, ADMISSION_LIMITS='auth.login=1:0')
+
+    statuses = _concurrent_logins(app, 3)
+
+    assert statuses[0] == 200
+    assert 503 in statuses
+    assert set(statuses) <= {200, 503}
@@ -0,0 +1,33 @@
+"""Where require_user finds the token: headers, the query string, or a JSON body (also a chunked one)."""
+import io
+import json
+
+from conftest import add_customers
+
+
+def _token(app):
+    with app.app_context():
+        _, (headers,) = add_customers(1)
+    return headers['Authorization'][7:]
+
+
+def test_token_from_header_query_and_body(app):
+    token = _token(app)
+    client = app.test_client()
+
+    assert client.get('/api/bookings/', headers={'X-Auth-Token': token}).status_code == 200
+    assert client.get(f'/api/bookings/?token={token}').status_code == 200
+    assert client.get('/api/bookings/', json={'token': token}).status_code == 200
+    assert client.get('/api/bookings/').status_code == 401
+
+
+def test_token_from_chunked_body(app):
+    token = _token(app)
+    body = json.dumps({'token': token}).encode()
+
+    # Like a chunked request through gunicorn: no Content-Length, input terminated by the server
+    r = app.test_client().get('/api/bookings/', input_stream=io.BytesIO(body),
+                              headers={'Transfer-Encoding': 'chunked', 'Content-Type': 'application/json'},
+                              environ_overrides={'wsgi.input_terminated': True})
+
+    assert r.status_code == 200
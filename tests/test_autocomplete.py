@@ -0,0 +1,75 @@
+"""City autocomplete: trie prefix lookups, typo tolerance, and staying in step with the schedule."""
+from datetime import datetime, timedelta
+
+from conftest import add_flight, admin_headers
+from app.autocomplete import PlaceIndex
+from app.schedule import FlightRow
+
+PLACES = [('mumbai', 'Mumbai', 50), ('delhi', 'Delhi', 40), ('new york', 'New York', 10),
+          ('melbourne', 'Melbourne', 5), ('madrid', 'Madrid', 30)]
+
+
+def _names(suggestions):
+    return [s['name'] for s in suggestions]
+
+
+def _row(source, destination, flight_id=1):
+    dep = datetime(2030, 1, 1, 6)
+    return FlightRow(**dict(dict.fromkeys(FlightRow._fields), id=flight_id, source=source, destination=destination,
+                            source_key=source.lower(), destination_key=destination.lower(),
+                            departure_time=dep, arrival_time=dep + timedelta(hours=2)))
+
+
+def test_prefix_matches_busiest_first():
+    index = PlaceIndex.build(PLACES)
+
+    assert _names(index.suggest('m')) == ['Mumbai', 'Madrid', 'Melbourne']
+    assert _names(index.suggest('M', limit=1)) == ['Mumbai']
+    assert _names(index.suggest('')) == ['Mumbai', 'Delhi', 'Madrid', 'New York', 'Melbourne']
+
+
+def test_later_words_and_codes_match():
+    index = PlaceIndex.build(PLACES)
+
+    assert _names(index.suggest('york')) == ['New York']
+    # An exact airport code ranks above busier places sharing the prefix
+    assert index.suggest('del')[0] == {'name': 'Delhi', 'code': 'DEL', 'flights': 40, 'match': 'prefix'}
+    assert _names(index.suggest('jfk')) == ['New York']
+
+
+def test_typos_are_matched_within_the_edit_budget():
+    index = PlaceIndex.build(PLACES)
+
+    assert [(s['name'], s['match']) for s in index.suggest('mumbia')] == [('Mumbai', 'fuzzy')]
+    assert _names(index.suggest('dehli')) == ['Delhi']
+    assert _names(index.suggest('mdarid')) == ['Madrid']
+    assert index.suggest('xyzzy') == []
+    # Short queries only match by prefix
+    assert index.suggest('dx') == []
+
+
+def test_updates_follow_flight_changes():
+    index = PlaceIndex.build([('mumbai', 'Mumbai', 1), ('delhi', 'Delhi', 1)])
+    flight = _row('Mumbai', 'Delhi')
+
+    index.update(None, _row('Pune', 'Goa', 2))
+    assert _names(index.suggest('pu')) == ['Pune']
+    index.update(flight, _row('Mumbai', 'Kochi'))
+    assert index.suggest('del') == []
+    assert _names(index.suggest('koc')) == ['Kochi']
+
+
+def test_endpoint_sees_new_and_removed_places(app):
+    client = app.test_client()
+    assert client.get('/api/flights/autocomplete?q=zan').get_json()['suggestions'] == []
+
+    with app.app_context():
+        flight_id = add_flight().id
+        headers = admin_headers()
+    r = client.put(f'/api/admin/flights/{flight_id}', headers=headers, json={'destination': 'Zanzibar'})
+    assert r.status_code == 200
+
+    body = client.get('/api/flights/autocomplete?q=zanzi').get_json()
+    assert _names(body['suggestions']) == ['Zanzibar']
+    assert client.delete(f'/api/admin/flights/{flight_id}', headers=headers).status_code == 200
+    assert client.get('/api/flights/autocomplete?q=zan').get_json()['suggestions'] == []
@@ -0,0 +1,47 @@
+"""Bulk cancellation refunds every booking it removes and leaves the ledger consistent."""
+from conftest import add_customers, add_flight, admin_headers, book
+from app import bulk_cancel, db, ledger
+from app.models import Booking, Flight
+
+
+def _book_some(app, seats=60):
+    with app.app_context():
+        flights = [add_flight(seats=seats, number=f'TEST{i}').id for i in range(2)]
+        user_ids, headers = add_customers(4)
+        opening = {uid: ledger.balance_paise(uid) for uid in user_ids}
+    client = app.test_client()
+    for i in range(12):
+        assert book(client, flights[i % 2], headers[i % 4], num_passengers=1 + i % 3).status_code == 201
+    return client, flights, opening
+
+
+def test_cancel_endpoint_refunds_and_reconciles(app):
+    client, (cancelled, kept), opening = _book_some(app)
+    with app.app_context():
+        kept_paid = {uid: sum(ledger.to_paise(b.total_amount) for b in Booking.query.filter_by(
+            user_id=uid, flight_id=kept)) for uid in opening}
+        headers = admin_headers()
+
+    r = client.post('/api/admin/bookings/cancel', headers=headers, json={'flight_ids': [cancelled]})
+
+    assert r.status_code == 200
+    assert r.get_json()['status'] == 'done'
+    with app.app_context():
+        assert Booking.query.filter_by(flight_id=cancelled).count() == 0
+        assert db.session.get(Flight, cancelled).economy_seats == 60
+        for uid, paid in kept_paid.items():
+            assert ledger.balance_paise(uid) == opening[uid] - paid
+        assert ledger.reconcile()['problems'] == []
+
+
+def test_chunked_cancel_reconciles(app):
+    _, flights, opening = _book_some(app)
+    with app.app_context():
+        paid = sum(opening[uid] - ledger.balance_paise(uid) for uid in opening)
+        cancelled, refunded = bulk_cancel.cancel_matching(bulk_cancel.criteria({'flight_ids': flights}), chunk_size=5)
+
+        assert (cancelled, refunded) == (12, paid)
+        assert Booking.query.count() == 0
+        assert all(db.session.get(Flight, fid).economy_seats == 60 for fid in flights)
+        assert {uid: ledger.balance_paise(uid) for uid in opening} == opening
+        assert ledger.reconcile()['problems'] == []
@@ -0,0 +1,87 @@
+"""Bulk flight import from NDJSON, CSV and recurrence rules, with a per-row report."""
+import json
+from datetime import date, timedelta
+
+from conftest import admin_headers
+from app.models import Flight
+
+
+def _import(app, body, mimetype):
+    with app.app_context():
+        headers = admin_headers()
+    r = app.test_client().post('/api/admin/flights/import', headers=headers, data=body, content_type=mimetype)
+    assert r.status_code == 200
+    return r.get_json()
+
+
+def _row(number, **extra):
+    return dict({'flight_number': number, 'source': 'Pune', 'destination': 'Goa',
+                 'departure_time': '2030-01-01T06:00:00', 'arrival_time': '2030-01-01T07:15:00'}, **extra)
+
+
+def test_ndjson_reports_bad_rows_and_keeps_good_ones(app):
+    lines = [json.dumps(_row('IMP1', economy_price=1500)), '{not json', json.dumps(_row('IMP2')),
+             json.dumps(_row('IMP1')), json.dumps(_row('IMP3', arrival_time='2030-01-01T05:00:00'))]
+
+    report = _import(app, '\n'.join(lines), 'application/x-ndjson')
+
+    assert report['inserted'] == 2
+    assert [(e['row'], e['error']) for e in report['errors']] == [
+        (2, 'Invalid JSON'), (4, 'Duplicate flight number in import'),
+        (5, 'arrival_time must be after departure_time')]
+    with app.app_context():
+        imported = Flight.query.filter_by(flight_number='IMP1').one()
+        assert (imported.economy_price, imported.economy_seats, imported.business_seats) == (1500, 60, 20)
+
+
+def test_csv_keeps_zero_seat_cabins_and_rejects_negative_ones(app):
+    body = ('flight_number,source,destination,departure_time,arrival_time,economy_seats,business_seats\n'
+            'CSV1,Pune,Goa,2030-01-01T06:00:00,2030-01-01T07:15:00,120,0\n'
+            'CSV2,Pune,Goa,2030-01-01T08:00:00,2030-01-01T09:15:00,,\n'
+            'CSV3,Pune,Goa,2030-01-01T10:00:00,2030-01-01T11:15:00,-1,8\n')
+
+    report = _import(app, body, 'text/csv')
+
+    assert report['inserted'] == 2
+    assert [(e['row'], e['error']) for e in report['errors']] == [(3, 'Seat counts must not be negative')]
+    with app.app_context():
+        seats = {f.flight_number: (f.economy_seats, f.business_seats)
+                 for f in Flight.query.filter(Flight.flight_number.in_(['CSV1', 'CSV2']))}
+    assert seats == {'CSV1': (120, 0), 'CSV2': (60, 20)}
+
+
+def test_existing_flight_number_is_rejected(app):
+    _import(app, json.dumps(_row('DUP1')), 'application/x-ndjson')
+
+    report = _import(app, json.dumps(_row('DUP1')), 'application/x-ndjson')
+
+    assert report['inserted'] == 0
+    assert report['errors'] == [{'row': 1, 'flight_number': 'DUP1', 'error': 'Flight number already exists'}]
+
+
+def test_recurrence_generates_one_flight_per_matching_day(app):
+    start = date(2030, 1, 7)  # a Monday
+    rule = {'source': 'Pune', 'destination': 'Goa', 'departure': '23:30', 'arrival': '00:45',
+            'days_of_week': ['mon', 'fri'], 'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=13)).isoformat(), 'flight_number_prefix': 'RC',
+            'start_number': 7, 'economy_seats': 0}
+
+    report = _import(app, json.dumps({'recurrence': rule}), 'application/json')
+
+    assert report['inserted'] == 4
+    with app.app_context():
+        flights = Flight.query.filter(Flight.flight_number.like('RC%')).order_by(Flight.departure_time).all()
+    assert [f.flight_number for f in flights] == ['RC007', 'RC008', 'RC009', 'RC010']
+    assert [f.departure_time.weekday() for f in flights] == [0, 4, 0, 4]
+    assert all(f.arrival_time - f.departure_time == timedelta(minutes=75) for f in flights)
+    assert {f.economy_seats for f in flights} == {0}
+
+
+def test_invalid_recurrence_is_a_bad_request(app):
+    with app.app_context():
+        headers = admin_headers()
+    r = app.test_client().post('/api/admin/flights/import', headers=headers, json={'recurrence': {
+        'source': 'Pune', 'destination': 'Goa', 'departure': '06:00', 'start_date': '2030-02-01',
+        'end_date': '2030-01-01', 'duration_minutes': 60}})
+
+    assert r.status_code == 400
@@ -0,0 +1,84 @@
+"""Connecting itineraries: layover bounds, ranking, seat checks and the endpoint."""
+from datetime import date, datetime, timedelta
+
+from app import db
+from app.connections import ConnectionIndex
+from app.models import Flight, normalize_place
+from app.schedule import FlightRow
+
+DAY = date(2030, 1, 1)
+
+
+def _row(flight_id, source, destination, dep, hours=2, price=1000, seats=60):
+    dep = datetime.combine(DAY, datetime.strptime(dep, '%H:%M').time())
+    return FlightRow(**dict(dict.fromkeys(FlightRow._fields), id=flight_id, flight_number=f'CX{flight_id}',
+                            source=source, destination=destination, source_key=normalize_place(source),
+                            destination_key=normalize_place(destination), departure_time=dep,
+                            arrival_time=dep + timedelta(hours=hours), economy_price=price,
+                            business_price=price * 3, economy_seats=seats, business_seats=0))
+
+
+def _index():
+    return ConnectionIndex.build([
+        _row(1, 'Leh', 'Agartala', '06:00', price=1000),
+        _row(2, 'Agartala', 'Imphal', '08:45', price=1000),  # exactly the minimum layover
+        _row(3, 'Agartala', 'Imphal', '16:00', price=500),   # exactly the maximum layover
+        _row(4, 'Agartala', 'Imphal', '16:01', price=100),   # one minute too late
+        _row(5, 'Leh', 'Imphal', '07:00', price=3000, seats=2),
+        _row(6, 'Agartala', 'Leh', '09:00', price=10),       # back to the origin
+    ])
+
+
+def _ids(found):
+    return [[r.id for r in legs] for legs in found]
+
+
+def test_layover_bounds_are_inclusive():
+    found = _index().search('leh', 'imphal', DAY, min_layover=timedelta(minutes=45), max_layover=timedelta(hours=8))
+
+    assert _ids(found) == [[1, 3], [1, 2], [5]]
+
+
+def test_sort_by_duration_and_limit():
+    found = _index().search('leh', 'imphal', DAY, sort='duration', limit=2)
+
+    assert _ids(found) == [[5], [1, 2]]
+
+
+def test_legs_without_enough_seats_are_skipped():
+    found = _index().search('leh', 'imphal', DAY, passengers=3)
+
+    assert _ids(found) == [[1, 3], [1, 2]]
+
+
+def test_updates_move_flights_in_and_out_of_windows():
+    index = _index()
+    late = _row(3, 'Agartala', 'Imphal', '16:00', price=500)
+
+    index.update(late, late._replace(departure_time=late.departure_time + timedelta(minutes=5)))
+    index.update(None, _row(7, 'Agartala', 'Imphal', '12:00', price=200))
+
+    assert _ids(index.search('leh', 'imphal', DAY, max_legs=2)) == [[1, 7], [1, 2], [5]]
+    assert _ids(index.search('leh', 'imphal', DAY, max_legs=1)) == [[5]]
+
+
+def test_endpoint_returns_itineraries(app):
+    tomorrow = (datetime.utcnow() + timedelta(days=1)).date()
+    with app.app_context():
+        for number, source, destination, dep in (('CX1', 'Leh', 'Agartala', 6), ('CX2', 'Agartala', 'Imphal', 10)):
+            dep = datetime.combine(tomorrow, datetime.min.time()) + timedelta(hours=dep)
+            db.session.add(Flight(flight_number=number, source=source, destination=destination,
+                                  departure_time=dep, arrival_time=dep + timedelta(hours=2),
+                                  economy_price=1000, business_price=3000, economy_seats=60, business_seats=0))
+        db.session.commit()
+    client = app.test_client()
+
+    r = client.get(f'/api/flights/connections?source=Leh&destination=Imphal&date={tomorrow}&num_passengers=2')
+    assert r.status_code == 200
+    (itinerary,) = r.get_json()['itineraries']
+    assert [leg['flight_number'] for leg in itinerary['legs']] == ['CX1', 'CX2']
+    assert (itinerary['total_fare'], itinerary['layover_minutes'], itinerary['duration_minutes']) == (4000, [120], 360)
+
+    r = client.get(f'/api/flights/connections?source=Leh&destination=Imphal&date={tomorrow}&max_layover=60')
+    assert r.get_json()['itineraries'] == []
+    assert client.get('/api/flights/connections?source=Leh&destination=Imphal').status_code == 400
@@ -0,0 +1,98 @@
+"""A booking retried with the same Idempotency-Key is created and charged once."""
+import threading
+from multiprocessing.managers import BaseManager
+
+from conftest import add_customers, add_flight, book
+from app import idempotency, ledger
+from app.models import Booking, LedgerEntry
+
+
+def test_replay_debits_once(app):
+    with app.app_context():
+        flight_id = add_flight().id
+        (user_id,), (headers,) = add_customers(1)
+        before = ledger.balance_paise(user_id)
+    client = app.test_client()
+
+    first = book(client, flight_id, headers, num_passengers=2, idempotency_key='trip-1')
+    replays = [book(client, flight_id, headers, num_passengers=2, idempotency_key='trip-1') for _ in range(3)]
+
+    assert first.status_code == 201
+    booking = first.get_json()['booking']
+    assert [r.status_code for r in replays] == [201] * 3
+    assert {r.get_json()['booking']['id'] for r in replays} == {booking['id']}
+    assert all(r.headers.get('Idempotent-Replayed') == 'true' for r in replays)
+    with app.app_context():
+        assert Booking.query.filter_by(user_id=user_id).count() == 1
+        assert LedgerEntry.query.filter_by(booking_id=booking['id']).count() == 1
+        assert before - ledger.balance_paise(user_id) == ledger.to_paise(booking['total_amount'])
+
+
+def test_concurrent_duplicate_debits_once(app):
+    with app.app_context():
+        flight_id = add_flight().id
+        (user_id,), (headers,) = add_customers(1)
+    responses = []
+    lock = threading.Lock()
+
+    def send():
+        r = book(app.test_client(), flight_id, headers, idempotency_key='trip-2')
+        with lock:
+            responses.append(r)
+
+    threads = [threading.Thread(target=send) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # A duplicate that arrives while the first attempt runs waits for it, or gets 409 past IDEMPOTENCY_WAIT_MS
+    assert {r.status_code for r in responses} <= {201, 409}
+    created = [r for r in responses if r.status_code == 201]
+    assert created
+    assert len({r.get_json()['booking']['id'] for r in created}) == 1
+    with app.app_context():
+        assert Booking.query.filter_by(user_id=user_id).count() == 1
+        assert LedgerEntry.query.filter_by(user_id=user_id, kind='booking').count() == 1
+
+
+def test_key_reused_for_another_booking_is_rejected(app):
+    with app.app_context():
+        flight_id = add_flight().id
+        (user_id,), (headers,) = add_customers(1)
+    client = app.test_client()
+
+    assert book(client, flight_id, headers, num_passengers=1, idempotency_key='trip-3').status_code == 201
+    assert book(client, flight_id, headers, num_passengers=3, idempotency_key='trip-3').status_code == 422
+    with app.app_context():
+        assert Booking.query.filter_by(user_id=user_id).count() == 1
+
+
+class _Manager(BaseManager):
+    pass
+
+
+_Manager.register('IdempotencyStore', idempotency.IdempotencyStore)
+
+
+def test_store_shared_through_a_manager(app):
+    """Under prefork the store lives in a manager process (app.prefork); workers reach it through proxies."""
+    manager = _Manager()
+    manager.start()
+    try:
+        app.extensions['idempotency'] = manager.IdempotencyStore(*idempotency.settings(app.config))
+        with app.app_context():
+            flight_id = add_flight().id
+            (user_id,), (headers,) = add_customers(1)
+        client = app.test_client()
+
+        first = book(client, flight_id, headers, idempotency_key='trip-4')
+        replay = book(client, flight_id, headers, idempotency_key='trip-4')
+
+        assert (first.status_code, replay.status_code) == (201, 201)
+        assert replay.headers.get('Idempotent-Replayed') == 'true'
+        assert replay.get_json() == first.get_json()
+        with app.app_context():
+            assert Booking.query.filter_by(user_id=user_id).count() == 1
+    finally:
+        manager.shutdown()
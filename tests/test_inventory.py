@@ -0,0 +1,47 @@
+"""Concurrent bookings never sell more seats than a flight has."""
+import json
+import threading
+
+import pytest
+
+from conftest import add_customers, add_flight, book
+from app import db, ledger
+from app.models import Booking, Flight
+
+SEATS = 40
+
+
+@pytest.mark.parametrize('pipeline', [False, True], ids=['direct', 'pipeline'])
+def test_no_oversell(make_app, pipeline):
+    app = make_app(BOOKING_PIPELINE=pipeline)
+    with app.app_context():
+        flight_id = add_flight(seats=SEATS).id
+        # Each customer can pay for a few seats only, so balance checks race too
+        user_ids, headers = add_customers(8, balance=5 * 1500)
+
+    statuses = []
+    lock = threading.Lock()
+
+    def worker(n):
+        client = app.test_client()
+        for i in range(10):
+            r = book(client, flight_id, headers[(n + i) % len(headers)], num_passengers=1 + i % 3)
+            with lock:
+                statuses.append(r.status_code)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert set(statuses) <= {201, 409, 503}
+    assert 201 in statuses
+    with app.app_context():
+        bookings = Booking.query.filter_by(flight_id=flight_id).all()
+        sold = sum(b.num_passengers for b in bookings)
+        assert sold + db.session.get(Flight, flight_id).economy_seats == SEATS
+        labels = [seat for b in bookings for seat in json.loads(b.seats)]
+        assert len(labels) == len(set(labels)) == sold
+        assert all(ledger.balance_paise(uid) >= 0 for uid in user_ids)
+        assert ledger.reconcile()['problems'] == []
@@ -0,0 +1,78 @@
+"""The balance ledger: snapshots, reconciliation, and closing accounts without losing history."""
+from conftest import add_customers, add_flight, admin_headers, book
+from app import db, ledger
+from app.models import BalanceSnapshot, LedgerEntry, User
+
+
+def test_balance_is_snapshot_plus_later_entries(app):
+    with app.app_context():
+        (user_id, other_id), _ = add_customers(2, balance=1000)
+        ledger.debit(user_id, 25000)
+        db.session.commit()
+
+        assert ledger.snapshot(chunk_size=1) >= 2
+        ledger.post(user_id, 500, ledger.REFUND)
+        db.session.commit()
+
+        snap = db.session.get(BalanceSnapshot, user_id)
+        assert snap.balance_paise == 75000
+        assert ledger.balance_paise(user_id) == 75500
+        assert ledger.balances_paise([user_id, other_id]) == {user_id: 75500, other_id: 100000}
+        # Only the user with new entries moves forward
+        assert ledger.snapshot() == 1
+        assert db.session.get(BalanceSnapshot, user_id).balance_paise == 75500
+        assert ledger.snapshot() == 0
+        assert ledger.reconcile()['problems'] == []
+
+
+def test_set_balance_posts_one_adjustment(app):
+    with app.app_context():
+        (user_id,), _ = add_customers(1, balance=1000)
+        ledger.set_balance(user_id, 1234.5)
+        db.session.commit()
+
+        kinds = [e.kind for e in LedgerEntry.query.filter_by(user_id=user_id).order_by(LedgerEntry.id)]
+        assert kinds == [ledger.OPENING, ledger.ADJUSTMENT]
+        assert ledger.balance_paise(user_id) == 123450
+
+
+def test_reconcile_reports_a_wrong_snapshot_and_a_short_payment(app):
+    with app.app_context():
+        flight_id = add_flight().id
+        (user_id,), (headers,) = add_customers(1)
+    booking = book(app.test_client(), flight_id, headers).get_json()['booking']
+    with app.app_context():
+        ledger.snapshot()
+        db.session.get(BalanceSnapshot, user_id).balance_paise += 1
+        ledger.post(user_id, 100, ledger.REFUND, booking_id=booking['id'])
+        db.session.commit()
+
+        problems = ledger.reconcile()['problems']
+    assert len(problems) == 2
+    assert problems[0].startswith(f'user {user_id}: snapshot')
+    assert problems[1].startswith(f'booking {booking["id"]}: entries net')
+
+
+def test_deleted_account_keeps_its_history(app):
+    with app.app_context():
+        flight_id = add_flight().id
+        (user_id,), (headers,) = add_customers(1, balance=5000)
+        admin = admin_headers()
+    client = app.test_client()
+    booking_id = book(client, flight_id, headers).get_json()['booking']['id']
+    assert client.delete(f'/api/admin/bookings/{booking_id}', headers=admin).status_code == 200
+
+    assert client.delete(f'/api/admin/users/{user_id}', headers=admin).status_code == 200
+
+    with app.app_context():
+        entries = LedgerEntry.query.filter_by(user_id=user_id).order_by(LedgerEntry.id).all()
+        assert [e.kind for e in entries] == [ledger.OPENING, ledger.BOOKING, ledger.REFUND, ledger.CLOSING]
+        assert sum(e.amount_paise for e in entries) == 0
+        ledger.snapshot()
+        assert ledger.reconcile()['problems'] == []
+
+        # A new account never gets the deleted one's id, and so never its entries
+        (new_id,), _ = add_customers(1, prefix='newcomer')
+        assert new_id > user_id
+        assert ledger.balance_paise(new_id) == 10000000
+        assert db.session.get(User, user_id) is None
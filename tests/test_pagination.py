@@ -0,0 +1,103 @@
+"""Keyset pagination over live and archived bookings returns each booking once, in order."""
+from datetime import datetime, timedelta
+
+from conftest import add_customers, add_flight, admin_headers, book
+from app import archive, db
+from app.models import Booking, bookings_archive
+from app.seed import seed_synthetic
+
+
+def _pages(client, headers, limit, cursor=None):
+    """Booking ids from following X-Next-Cursor until the last page."""
+    ids = []
+    while True:
+        r = client.get('/api/bookings/', headers=headers,
+                       query_string={'limit': limit, **({'cursor': cursor} if cursor else {})})
+        assert r.status_code == 200
+        ids += [b['id'] for b in r.get_json()]
+        cursor = r.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids
+
+
+def _expected(user_id=None):
+    """Every booking id in both tiers, newest first by (created_at, id)."""
+    rows = []
+    for table in (Booking.__table__, bookings_archive):
+        stmt = db.select(table.c.created_at, table.c.id)
+        if user_id is not None:
+            stmt = stmt.where(table.c.user_id == user_id)
+        rows += db.session.execute(stmt).all()
+    return [row.id for row in sorted(rows, reverse=True)]
+
+
+def test_pages_cover_every_booking_once(app):
+    with app.app_context():
+        flight_id = add_flight().id
+        user_ids, _ = add_customers(3)
+        # Some bookings share a created_at, so the id breaks the tie
+        same = datetime.utcnow() - timedelta(hours=1)
+        for i in range(30):
+            db.session.add(Booking(user_id=user_ids[i % 3], flight_id=flight_id, trip_type='one_way',
+                                   travel_class='economy', num_passengers=1, date_depart=same.date(),
+                                   total_amount=0, status='confirmed',
+                                   created_at=same if i % 2 else same - timedelta(minutes=i)))
+        db.session.commit()
+        expected = _expected()
+        headers = admin_headers()
+    client = app.test_client()
+
+    for limit in (1, 7, 50):
+        ids = _pages(client, headers, limit)
+        assert len(ids) == len(set(ids))
+        assert ids == expected
+
+
+def test_pages_span_both_tiers(app):
+    with app.app_context():
+        seed_synthetic(flights=60, users=5, bookings=150, days=5, history_days=5, seed=3)
+        moved = archive.archive(archive.cutoff(app.config))
+        assert moved['bookings'] and Booking.query.count()
+        expected = _expected()
+        headers = admin_headers()
+    client = app.test_client()
+
+    for limit in (1, 7, 50):
+        ids = _pages(client, headers, limit)
+        assert len(ids) == len(set(ids))
+        assert ids == expected
+
+
+def test_customer_pages_stable_under_new_bookings(app):
+    with app.app_context():
+        flight_id = add_flight().id
+        (user_id,), (headers,) = add_customers(1, balance=10 ** 6)
+        past = add_flight(days=-3, number='PAST1').id
+    client = app.test_client()
+    for _ in range(6):
+        assert book(client, flight_id, headers).status_code == 201
+    with app.app_context():
+        # Bookings on a flight that has departed, made earlier, then archived with it
+        for i in range(6):
+            db.session.add(Booking(user_id=user_id, flight_id=past, trip_type='one_way', travel_class='economy',
+                                   num_passengers=1, date_depart=datetime.utcnow().date(), seats='[]',
+                                   total_amount=0, status='confirmed',
+                                   created_at=datetime.utcnow() - timedelta(days=5, minutes=i)))
+        db.session.commit()
+        archive.archive(archive.cutoff(app.config))
+        expected = _expected(user_id)
+
+    first = client.get('/api/bookings/', headers=headers, query_string={'limit': 4})
+    # A booking made between pages is newer than the cursor, so later pages neither repeat nor skip
+    assert book(client, flight_id, headers).status_code == 201
+    ids = [b['id'] for b in first.get_json()]
+    ids += _pages(client, headers, 4, first.headers['X-Next-Cursor'])
+
+    assert ids == expected
+
+
+def test_bad_cursor_is_rejected(app):
+    with app.app_context():
+        headers = admin_headers()
+
+    assert app.test_client().get('/api/bookings/?cursor=nonsense', headers=headers).status_code == 400
@@ -0,0 +1,74 @@
+"""Workers catch up with flight writes made by other workers and by flask commands."""
+import multiprocessing
+
+import pytest
+
+from conftest import add_flight
+from app import prefork
+from app.route_graph import get_route_graph
+from app.schedule import flights_changed, snapshot
+
+
+@pytest.fixture
+def worker(app, monkeypatch):
+    """The app as a forked worker sees it: shared counters set up, caught up with the stored generation."""
+    monkeypatch.setattr(prefork, '_schedule', multiprocessing.Value('q', 0))
+    monkeypatch.setattr(prefork, '_seen', 0)
+    monkeypatch.setattr(prefork, '_poll_interval', 0.0)
+    monkeypatch.setattr(prefork, '_next_poll', 0.0)
+    with app.app_context():
+        monkeypatch.setattr(prefork, '_stored', prefork.stored_generation())
+    return app
+
+
+def _catch_up(app):
+    with app.test_request_context():
+        prefork._catch_up()
+
+
+def test_archive_command_reaches_running_workers(worker, monkeypatch):
+    with worker.app_context():
+        add_flight(days=-40, number='OLD1')
+        before = prefork.stored_generation()
+    _catch_up(worker)
+    with worker.app_context():
+        get_route_graph()
+    cleared = []
+    monkeypatch.setattr(worker.extensions['response_cache'], 'clear', lambda: cleared.append(True))
+
+    # The command runs in its own process in production, so only the stored generation tells the workers
+    result = worker.test_cli_runner().invoke(args=['archive', '--days', '30'])
+
+    assert 'Archived 1 flights' in result.output
+    with worker.app_context():
+        assert prefork.stored_generation() == before + 1
+    _catch_up(worker)
+    assert 'route_graph' not in worker.extensions
+    assert cleared == [True]
+
+
+def test_archive_with_nothing_to_move_publishes_nothing(worker):
+    with worker.app_context():
+        before = prefork.stored_generation()
+
+    worker.test_cli_runner().invoke(args=['archive', '--days', '30'])
+
+    with worker.app_context():
+        assert prefork.stored_generation() == before
+
+
+def test_only_schedule_changes_reach_other_workers(worker):
+    with worker.app_context():
+        before = snapshot(add_flight())
+        get_route_graph()
+        flights_changed([(before, before._replace(economy_seats=before.economy_seats - 2))])
+        assert prefork._schedule.value == 0
+        flights_changed([(before, before._replace(economy_price=before.economy_price + 100))])
+        assert prefork._schedule.value == 1
+    # The writer updated its own indexes in place
+    _catch_up(worker)
+    assert 'route_graph' in worker.extensions
+
+    prefork._schedule.value += 1  # a write in another worker
+    _catch_up(worker)
+    assert 'route_graph' not in worker.extensions
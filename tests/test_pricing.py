@@ -0,0 +1,69 @@
+"""Fare quotes: the formula, dynamic fares, and agreement with what a booking is charged."""
+from conftest import add_customers, add_flight, book
+from app import pricing
+
+
+def _quote(client, **body):
+    r = client.post('/api/flights/quote', json=body)
+    assert r.status_code == 200
+    return r.get_json()
+
+
+def test_totals_add_meals_baggage_and_return_leg():
+    options = pricing.options_from({'num_passengers': 2, 'extra_baggage_kg': 5, 'trip_type': 'return'})
+    columns = pricing.FareColumns([(1, 1000.0, 10, 0), (2, 2500.0, 10, 0)])
+
+    assert list(pricing.totals(columns.fares, options)) == [
+        (2 * 1000 + 2 * pricing.MEAL_CHARGE + 5 * pricing.BAGGAGE_CHARGE) * 2,
+        (2 * 2500 + 2 * pricing.MEAL_CHARGE + 5 * pricing.BAGGAGE_CHARGE) * 2]
+
+
+def test_options_are_clamped_like_a_booking():
+    options = pricing.options_from({'num_passengers': 40, 'extra_baggage_kg': -3, 'travel_class': None})
+
+    assert (options.num_passengers, options.extra_baggage_kg, options.travel_class) == (9, 0, 'economy')
+
+
+def test_dynamic_fares_climb_past_the_threshold():
+    # Capacity 100: 90, 70 and 10 seats left, and one flight with no seat map yet
+    columns = pricing.FareColumns([(1, 1000.0, 90, 100), (2, 1000.0, 70, 100), (3, 1000.0, 10, 100), (4, 1000.0, 5, 0)])
+
+    fares = pricing.fares(columns, pricing.surge({'DYNAMIC_FARES': True, 'DYNAMIC_FARE_THRESHOLD': 0.5,
+                                                  'DYNAMIC_FARE_MAX_SURGE': 0.5}))
+
+    assert list(fares) == [1000.0, 1000.0, 1400.0, 1000.0]
+    assert pricing.surge({'DYNAMIC_FARES': False}) is None
+
+
+def test_quote_by_ids_reports_missing_flights(app):
+    with app.app_context():
+        flight_id = add_flight().id
+    body = _quote(app.test_client(), flight_ids=[flight_id, 999999], num_passengers=2)
+
+    assert body['missing'] == [999999]
+    assert body['quotes'] == [{'flight_id': flight_id, 'fare': 1000.0, 'total': 2000.0 + 2 * pricing.MEAL_CHARGE,
+                               'seats_available': 60}]
+
+
+def test_quote_by_search_covers_the_route(app):
+    with app.app_context():
+        ids = [add_flight(days=d, number=f'TEST{d}').id for d in (1, 2, 3)]
+    body = _quote(app.test_client(), source='Mumbai', destination='Delhi', match='exact')
+
+    assert set(ids) <= {q['flight_id'] for q in body['quotes']}
+
+
+def test_quote_matches_the_amount_charged(make_app):
+    app = make_app(DYNAMIC_FARES=True, DYNAMIC_FARE_THRESHOLD=0.2)
+    with app.app_context():
+        flight_id = add_flight(seats=10).id
+        _, (headers,) = add_customers(1)
+    client = app.test_client()
+    assert book(client, flight_id, headers, num_passengers=4).status_code == 201
+
+    quoted = _quote(client, flight_ids=[flight_id], num_passengers=2)['quotes'][0]
+    r = book(client, flight_id, headers, num_passengers=2)
+
+    assert quoted['fare'] > 1000
+    assert r.status_code == 201
+    assert r.get_json()['booking']['total_amount'] == quoted['total']
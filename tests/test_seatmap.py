@@ -0,0 +1,109 @@
+"""Seat maps and seat holds: bookings take adjacent or chosen seats, and held seats are kept for their holder."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import add_customers, add_flight, admin_headers, book
+from app import seatmap
+from app.models import Booking
+from app.seatmap import SeatBitmap
+
+
+@pytest.fixture(autouse=True)
+def fresh_holds(monkeypatch):
+    """Holds are module state; each test's fresh DB reuses flight ids, so start with none."""
+    monkeypatch.setattr(seatmap, 'holds', seatmap.SeatHolds())
+
+
+def _hold(client, flight_id, headers, **body):
+    return client.post(f'/api/flights/{flight_id}/seats/hold', headers=headers, json=body)
+
+
+def _booking_body(flight_id, num_passengers=1):
+    return {'flight_id': flight_id, 'date_depart': (datetime.utcnow() + timedelta(days=1)).date().isoformat(),
+            'travel_class': 'economy', 'num_passengers': num_passengers}
+
+
+def _economy(client, flight_id):
+    return client.get(f'/api/flights/{flight_id}/seats').get_json()['cabins']['economy']
+
+
+def test_find_adjacent_prefers_a_block_in_one_row():
+    sm = SeatBitmap('economy', 1, 'ABCDEF', 12)
+    for label in ('1A', '1C', '1E'):
+        sm.take(sm.index(label))
+
+    assert [sm.label(i) for i in sm.find_adjacent(3)] == ['2A', '2B', '2C']
+    assert [sm.label(i) for i in sm.find_adjacent(3, blocked={sm.index('2B')})] == ['2C', '2D', '2E']
+    assert sm.find_adjacent(10) is None
+    assert sm.available() == 9
+
+
+def test_bookings_take_adjacent_seats(app):
+    with app.app_context():
+        flight_id = add_flight(seats=12).id
+        _, (headers,) = add_customers(1)
+    client = app.test_client()
+
+    assert book(client, flight_id, headers, num_passengers=2).status_code == 201
+    assert book(client, flight_id, headers, num_passengers=3).status_code == 201
+
+    economy = _economy(client, flight_id)
+    assert economy['taken'] == ['1A', '1B', '1C', '1D', '1E']
+    assert economy['available'] == 7
+
+
+def test_held_seats_go_to_the_holder_only(app):
+    with app.app_context():
+        flight_id = add_flight(seats=12).id
+        _, (holder, other) = add_customers(2)
+    client = app.test_client()
+
+    r = _hold(client, flight_id, holder, seats=['1A', '1B'])
+    assert r.status_code == 201
+    hold_id = r.get_json()['hold_id']
+    assert _economy(client, flight_id)['held'] == ['1A', '1B']
+    assert _hold(client, flight_id, other, seats=['1B']).status_code == 409
+
+    r = client.post('/api/bookings/', headers=other, json={**_booking_body(flight_id), 'seats': ['1A']})
+    assert r.status_code == 409
+    r = client.post('/api/bookings/', headers=holder, json={**_booking_body(flight_id, 2), 'hold_id': hold_id})
+    assert r.status_code == 201
+    assert json.loads(r.get_json()['booking']['seats']) == ['1A', '1B']
+    economy = _economy(client, flight_id)
+    assert (economy['taken'], economy['held']) == (['1A', '1B'], [])
+
+
+def test_released_hold_frees_its_seats(app):
+    with app.app_context():
+        flight_id = add_flight(seats=12).id
+        _, (holder, other) = add_customers(2)
+    client = app.test_client()
+    hold_id = _hold(client, flight_id, holder, count=3).get_json()['hold_id']
+
+    assert client.delete(f'/api/flights/{flight_id}/seats/hold/{hold_id}', headers=other).status_code == 404
+    assert client.delete(f'/api/flights/{flight_id}/seats/hold/{hold_id}', headers=holder).status_code == 200
+    assert _economy(client, flight_id)['held'] == []
+    assert _hold(client, flight_id, other, seats=['1A', '1B', '1C']).status_code == 201
+
+
+def test_holds_survive_a_cabin_shrink(app):
+    with app.app_context():
+        flight_id = add_flight(seats=12).id
+        _, (holder, other) = add_customers(2)
+        admin = admin_headers()
+    client = app.test_client()
+    assert _hold(client, flight_id, holder, seats=['2E', '2F']).status_code == 201
+
+    r = client.put(f'/api/admin/flights/{flight_id}', headers=admin, json={'economy_seats': 6})
+    assert r.status_code == 200
+
+    # The held seats are gone from the cabin; holding and booking the rest still work
+    r = _hold(client, flight_id, other, count=2)
+    assert r.status_code == 201
+    assert r.get_json()['seats'] == ['1A', '1B']
+    assert book(client, flight_id, other, num_passengers=4).status_code == 201
+    with app.app_context():
+        assert Booking.query.filter_by(flight_id=flight_id).count() == 1
+